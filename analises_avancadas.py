@@ -5,6 +5,7 @@ Tela de analises com multiplas abas e Oportunidades de Lucro
 import flet as ft
 import pandas as pd
 from db_client import ler_planilha
+from db_async import em_segundo_plano
 from oportunidades_ia import analisar_gap_lucro
 
 def criar_tela_analises(page: ft.Page, is_dark: list):
@@ -529,13 +530,31 @@ def criar_tela_analises(page: ft.Page, is_dark: list):
     
     tabs.on_change = on_tab_change
     
+    def criar_carregando():
+        return ft.Container(
+            content=ft.Row([
+                ft.ProgressRing(width=20, height=20),
+                ft.Text("Carregando dados...", color=get_text_color()),
+            ], spacing=10),
+            padding=20,
+        )
+    
+    def mostrar_erro(ex):
+        tabs.tabs[tabs.selected_index].content = ft.Container(
+            content=ft.Text(f"Erro ao carregar dados: {ex}", color=ft.Colors.RED_400),
+            padding=20,
+        )
+        page.update()
+    
     def atualizar(e):
-        carregar_dados()
-        on_tab_change(None)
+        tabs.tabs[tabs.selected_index].content = criar_carregando()
+        page.update()
+        # Leitura na thread do banco; a aba atual é remontada quando os dados chegam
+        em_segundo_plano(carregar_dados, ao_concluir=lambda df: on_tab_change(None), ao_falhar=mostrar_erro)
     
-    # Carregar dados e primeira aba
-    carregar_dados()
-    tabs.tabs[0].content = criar_aba_resumo()
+    # Carregar dados (em segundo plano) e primeira aba
+    tabs.tabs[0].content = criar_carregando()
+    em_segundo_plano(carregar_dados, ao_concluir=lambda df: on_tab_change(None), ao_falhar=mostrar_erro)
     
     header = ft.Row([
         ft.Text("Analises Avancadas", size=22, weight=ft.FontWeight.BOLD, color=get_text_color()),
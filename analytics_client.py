@@ -0,0 +1,143 @@
+# analytics_client.py — Motor analítico (DuckDB) para relatórios pesados
+"""
+Conexão DuckDB opcional que lê o banco da aplicação direto (o arquivo SQLite
+ou o servidor MySQL), para que os relatórios façam group-by e funções de
+janela no motor colunar em vez de trazer tabelas inteiras para o pandas.
+
+Opcional: sem o pacote duckdb (pip install duckdb) ou sem a extensão
+sqlite/mysql do DuckDB, get_connection() retorna None e os relatórios seguem
+pelo caminho pandas.
+
+Views disponíveis na conexão:
+- historico: o histórico vivo mais o arquivo Parquet (meses fora da retenção,
+  ver arquivo_historico), com coletado_em em TIMESTAMP
+- historico_ofertas: uma linha por (coleta, posição) com vendedor, preço e frete em reais
+- produtos, historico_diario, historico_diario_buybox, historico_latest, ofertas
+"""
+import threading
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import duckdb
+    DUCKDB_DISPONIVEL = True
+except ImportError:
+    DUCKDB_DISPONIVEL = False
+
+TABELAS = ["produtos", "historico_diario", "historico_diario_buybox", "historico_latest", "ofertas"]
+
+_conexao = None
+_conexao_tipo = None
+_arquivos_na_view = None  # Arquivos Parquet incluídos na view historico
+_conexao_lock = threading.Lock()
+_indisponivel = False  # Falhou uma vez (extensão ausente, banco inacessível): não tentar de novo
+
+
+def _anexar_banco(conn, db_type: str):
+    """ATTACH do banco da aplicação como 'banco' (somente leitura)"""
+    if db_type == "mysql":
+        from mysql_client import _load_mysql_config
+        config = _load_mysql_config()
+        conn.execute("INSTALL mysql")
+        conn.execute("LOAD mysql")
+        dsn = " ".join(f"{chave}={valor}" for chave, valor in config.items() if valor != "")
+        conn.execute(f"ATTACH '{dsn}' AS banco (TYPE MYSQL, READ_ONLY)")
+    else:
+        from sqlite_client import _get_db_path
+        conn.execute("INSTALL sqlite")
+        conn.execute("LOAD sqlite")
+        caminho = _get_db_path().replace("'", "''")
+        conn.execute(f"ATTACH '{caminho}' AS banco (TYPE SQLITE, READ_ONLY)")
+
+
+def _arquivos_parquet(db_type: str) -> list:
+    """Arquivos do histórico arquivado pela retenção (vazio sem pyarrow ou sem arquivo)"""
+    import arquivo_historico
+    if db_type == "mysql":
+        from mysql_client import _pasta_arquivo
+    else:
+        from sqlite_client import _pasta_arquivo
+    return [str(c) for c in arquivo_historico.arquivos(_pasta_arquivo())]
+
+
+def _criar_view_historico(conn, arquivos: list):
+    """historico = vivo + arquivo Parquet, como consultar_historico_com_arquivo"""
+    global _arquivos_na_view
+    sql = "SELECT * REPLACE (TRY_CAST(coletado_em AS TIMESTAMP) AS coletado_em) FROM banco.historico"
+    if arquivos:
+        lista = ", ".join("'" + a.replace("'", "''") + "'" for a in arquivos)
+        sql += f" UNION ALL BY NAME SELECT * FROM read_parquet([{lista}])"
+    conn.execute(f"CREATE OR REPLACE VIEW historico AS {sql}")
+    _arquivos_na_view = arquivos
+
+
+def _criar_views(conn, db_type: str):
+    """Views sobre as tabelas anexadas, com os tipos que os relatórios esperam"""
+    _criar_view_historico(conn, _arquivos_parquet(db_type))
+    # Preços e fretes gravados em centavos inteiros
+    selects = " UNION ALL ".join(
+        f"SELECT codigo_produto, coletado_em, {pos} AS posicao, vendedor_{pos} AS vendedor, "
+        f"preco_{pos} / 100.0 AS preco, frete_{pos} / 100.0 AS frete, frete_tipo_{pos} AS frete_tipo "
+        f"FROM historico"
+        for pos in (1, 2, 3)
+    )
+    conn.execute(f"CREATE OR REPLACE VIEW historico_ofertas AS {selects}")
+    for tabela in TABELAS:
+        try:
+            conn.execute(f"CREATE OR REPLACE VIEW {tabela} AS SELECT * FROM banco.{tabela}")
+        except Exception:
+            pass  # Tabela ainda não existe neste banco
+
+
+def get_connection(db_type: str):
+    """
+    Conexão DuckDB (uma por processo) com o banco anexado, ou None se o motor
+    analítico não estiver disponível. Para usar em outra thread, chame .cursor().
+    """
+    global _conexao, _conexao_tipo, _indisponivel
+    if not DUCKDB_DISPONIVEL or _indisponivel:
+        return None
+    if _conexao is not None and _conexao_tipo == db_type:
+        return _conexao
+    
+    with _conexao_lock:
+        if _conexao is not None and _conexao_tipo == db_type:
+            return _conexao
+        try:
+            conn = duckdb.connect()
+            _anexar_banco(conn, db_type)
+            _criar_views(conn, db_type)
+        except Exception as e:
+            print(f"[ANALYTICS] Motor analítico indisponível, usando pandas: {e}")
+            _indisponivel = True
+            return None
+        _conexao, _conexao_tipo = conn, db_type
+        return conn
+
+
+def consultar(db_type: str, sql: str, params: Optional[list] = None) -> Optional[pd.DataFrame]:
+    """Executa a consulta no DuckDB e retorna o DataFrame (None se o motor não estiver disponível)"""
+    conn = get_connection(db_type)
+    if conn is None:
+        return None
+    # A retenção (em outro processo) pode ter arquivado meses depois que a view foi criada
+    arquivos = _arquivos_parquet(db_type)
+    if arquivos != _arquivos_na_view:
+        with _conexao_lock:
+            if arquivos != _arquivos_na_view:
+                _criar_view_historico(conn, arquivos)
+    cursor = conn.cursor()  # Cursor próprio: a chamada pode vir de qualquer thread
+    try:
+        return cursor.execute(sql, params or []).df()
+    finally:
+        cursor.close()
+
+
+def fechar():
+    """Fecha a conexão (a próxima consulta anexa o banco de novo)"""
+    global _conexao, _conexao_tipo, _indisponivel, _arquivos_na_view
+    with _conexao_lock:
+        if _conexao is not None:
+            _conexao.close()
+        _conexao, _conexao_tipo, _indisponivel, _arquivos_na_view = None, None, False, None
@@ -0,0 +1,154 @@
+# arquivo_historico.py — Arquivo do histórico em Parquet (meses fora da retenção)
+"""
+Os meses que saem da retenção do histórico são gravados em arquivos Parquet
+comprimidos (zstd), um por mês, em vez de irem para historico_backup dentro
+do próprio banco: o banco vivo fica pequeno e leituras de longo prazo leem só
+as colunas e os meses pedidos.
+
+    <pasta>/historico_AAAAMM.parquet          mês arquivado pela retenção
+    <pasta>/historico_AAAAMM_<parte>.parquet  partes extras do mesmo mês
+
+Colunas como no banco: preços e fretes em centavos inteiros, frete_tipo_N e
+coletado_em (timestamp). Opcional: sem pyarrow (pip install pyarrow),
+PARQUET_DISPONIVEL é False e a retenção continua usando historico_backup.
+"""
+import operator
+import os
+from datetime import datetime
+from functools import reduce
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+import esquema
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+COMPRESSAO = "zstd"
+PREFIXO = "historico_"
+MES_SEM_DATA = "000000"
+
+COLUNAS = ["id"] + esquema.colunas("historico")
+COLUNAS_INTEIRAS = ["id"] + esquema.colunas_do_tipo("historico", "centavos")
+
+
+def _esquema():
+    return pa.schema([
+        (c, pa.int64() if c in COLUNAS_INTEIRAS else pa.timestamp("s") if c == "coletado_em" else pa.string())
+        for c in COLUNAS
+    ])
+
+
+def _para_tabela(df: pd.DataFrame):
+    """DataFrame do banco -> tabela Arrow no esquema do arquivo"""
+    df = df.reindex(columns=COLUNAS)
+    for c in COLUNAS:
+        serie = df[c]
+        if c in COLUNAS_INTEIRAS:
+            df[c] = pd.to_numeric(serie, errors="coerce").astype("Int64")
+        elif c == "coletado_em":
+            df[c] = pd.to_datetime(serie, errors="coerce")
+        else:
+            df[c] = serie.astype(str).where(serie.notna(), None)
+    return pa.Table.from_pandas(df, schema=_esquema(), preserve_index=False)
+
+
+def chave_mes(momento: datetime) -> str:
+    return momento.strftime("%Y%m")
+
+
+def arquivar_mes(pasta, chave: str, blocos: Iterable[pd.DataFrame], parte: str = "") -> int:
+    """
+    Grava os blocos (DataFrames com as colunas do histórico) no arquivo do mês,
+    em streaming (um row group por bloco). O arquivo só aparece completo:
+    grava em .tmp e renomeia no fim. Regravar o mesmo mês/parte substitui o
+    arquivo, então repetir uma retenção interrompida não duplica linhas.
+    Retorna o número de linhas gravadas.
+    """
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    destino = pasta / f"{PREFIXO}{chave}{'_' + parte if parte else ''}.parquet"
+    temporario = destino.with_name(destino.name + ".tmp")
+    
+    total = 0
+    writer = None
+    try:
+        for bloco in blocos:
+            if bloco.empty:
+                continue
+            if writer is None:
+                writer = pq.ParquetWriter(temporario, _esquema(), compression=COMPRESSAO)
+            writer.write_table(_para_tabela(bloco))
+            total += len(bloco)
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(temporario, destino)
+    finally:
+        if writer is not None:
+            writer.close()
+        if temporario.exists():
+            os.remove(temporario)
+    return total
+
+
+def arquivos(pasta, data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None) -> list:
+    """Arquivos dos meses que podem ter linhas em data_inicio <= coletado_em < data_fim"""
+    pasta = Path(pasta)
+    if not pasta.is_dir():
+        return []
+    selecionados = []
+    for caminho in sorted(pasta.glob(f"{PREFIXO}*.parquet")):
+        chave = caminho.stem[len(PREFIXO):len(PREFIXO) + 6]
+        if chave == MES_SEM_DATA:
+            if data_inicio is None and data_fim is None:
+                selecionados.append(caminho)
+            continue
+        if data_inicio is not None and chave < chave_mes(data_inicio):
+            continue
+        if data_fim is not None and chave > chave_mes(data_fim):
+            continue
+        selecionados.append(caminho)
+    return selecionados
+
+
+def ler(pasta, colunas: Optional[list] = None,
+        data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+        skus: Optional[list] = None, vendedores: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lê o arquivo com os mesmos filtros de consultar_historico: só os arquivos
+    dos meses do período e só as colunas pedidas. Preços em centavos (Int64).
+    """
+    caminhos = arquivos(pasta, data_inicio, data_fim) if PARQUET_DISPONIVEL else []
+    if not caminhos:
+        return pd.DataFrame(columns=colunas or COLUNAS)
+    
+    condicoes = []
+    if data_inicio is not None:
+        condicoes.append(ds.field("coletado_em") >= pa.scalar(data_inicio, type=pa.timestamp("s")))
+    if data_fim is not None:
+        condicoes.append(ds.field("coletado_em") < pa.scalar(data_fim, type=pa.timestamp("s")))
+    if skus:
+        condicoes.append(ds.field("codigo_produto").isin(list(skus)))
+    if vendedores:
+        vendedores = list(vendedores)
+        condicoes.append(ds.field("vendedor_1").isin(vendedores) | ds.field("vendedor_2").isin(vendedores)
+                         | ds.field("vendedor_3").isin(vendedores))
+    filtro = reduce(operator.and_, condicoes) if condicoes else None
+    
+    dataset = ds.dataset([str(c) for c in caminhos], format="parquet", schema=_esquema())
+    tabela = dataset.to_table(columns=list(colunas) if colunas else None, filter=filtro)
+    return tabela.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def tamanho_total(pasta) -> int:
+    """Bytes ocupados pelos arquivos do histórico arquivado"""
+    pasta = Path(pasta)
+    return sum(c.stat().st_size for c in pasta.glob(f"{PREFIXO}*.parquet")) if pasta.is_dir() else 0
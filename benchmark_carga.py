@@ -0,0 +1,136 @@
+# benchmark_carga.py — Mede a carga em massa do histórico
+"""
+Compara os caminhos de inserção do histórico com N linhas sintéticas
+(padrão: 100.000) e imprime linhas/segundo de cada um.
+
+    python benchmark_carga.py              # SQLite (banco temporário)
+    python benchmark_carga.py --mysql      # MySQL do server_config.json (tabela temporária)
+    python benchmark_carga.py --linhas 50000
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+COLUNAS = ["codigo_produto", "nome_esperado", "link", "site_disponivel",
+           "vendedor_1", "preco_1", "frete_1",
+           "vendedor_2", "preco_2", "frete_2",
+           "vendedor_3", "preco_3", "frete_3",
+           "status_final", "data_verificacao", "data_coleta", "coletado_em"]
+
+
+def gerar_historico(linhas: int) -> pd.DataFrame:
+    """Histórico sintético com o formato gravado por atualizar_historico"""
+    rng = np.random.default_rng(42)
+    agora = datetime.now()
+    skus = np.array([f"NS-{i:06d}" for i in range(max(1, linhas // 10))])
+    vendedores = np.array(["Color Sports", "Loja A", "Loja B", "Loja C", "-"])
+
+    df = pd.DataFrame({
+        "codigo_produto": skus[rng.integers(0, len(skus), linhas)],
+        "nome_esperado": "Bola de Futebol Campo Oficial",
+        "link": "https://www.netshoes.com.br/p/produto",
+        "site_disponivel": "Sim",
+        "status_final": "OK",
+        "data_verificacao": agora.strftime("%d/%m/%Y %H:%M:%S"),
+        "data_coleta": agora.strftime("%d/%m/%Y %H:%M:%S"),
+        "coletado_em": agora.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    for pos in (1, 2, 3):
+        df[f"vendedor_{pos}"] = vendedores[rng.integers(0, len(vendedores), linhas)]
+        df[f"preco_{pos}"] = np.round(rng.uniform(50, 500, linhas), 2).astype(str)
+        df[f"frete_{pos}"] = np.where(rng.random(linhas) < 0.5, "Gratis", "Pago")
+    return df[COLUNAS]
+
+
+def medir(nome: str, funcao, linhas: int):
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    print(f"  {nome:<48} {duracao:8.2f} s  {linhas / duracao:12,.0f} linhas/s")
+
+
+def benchmark_sqlite(df: pd.DataFrame):
+    import sqlite3
+    import sqlite_client
+
+    print(f"\n[SQLITE] {len(df)} linhas")
+    pasta = tempfile.mkdtemp()
+    ddl = f"CREATE TABLE historico ({', '.join(f'{c} TEXT' for c in COLUNAS)})"
+
+    def conexao(nome):
+        conn = sqlite3.connect(os.path.join(pasta, nome))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(ddl)
+        return conn
+
+    conn = conexao("to_sql.db")
+    medir("DataFrame.to_sql (anterior)",
+          lambda: (df.to_sql("historico", conn, if_exists="append", index=False), conn.commit()), len(df))
+    conn.close()
+
+    conn = conexao("massa.db")
+    medir("inserir_em_massa (executemany, 1 transação)",
+          lambda: (sqlite_client.inserir_em_massa(conn, "historico", df), conn.commit()), len(df))
+    conn.close()
+
+    # Caminho completo da coleta: partição do mês + rollup diário + historico_latest
+    sqlite_client.USE_NETWORK_CONFIG = False
+    sqlite_client.DB_PATH = os.path.join(pasta, "completo.db")
+    sqlite_client.criar_tabelas()
+    df_coleta = df.drop(columns=["data_coleta", "coletado_em"])  # Preenchidas pelo próprio atualizar_historico
+    medir("atualizar_historico (partição+rollup+latest)",
+          lambda: sqlite_client.atualizar_historico(df_coleta, retencao=False), len(df))
+
+
+def benchmark_mysql(df: pd.DataFrame):
+    import mysql_client
+
+    print(f"\n[MYSQL] {len(df)} linhas")
+    mysql_client.get_connection().close()  # Cria o pool (e lê a configuração de carga)
+    conn = mysql_client.get_connection()
+    cursor = conn.cursor()
+
+    def recriar():
+        cursor.execute("DROP TABLE IF EXISTS historico_benchmark")
+        cursor.execute(f"CREATE TABLE historico_benchmark ({', '.join(f'{c} VARCHAR(255)' for c in COLUNAS)}) "
+                       "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+
+    def executemany_anterior():
+        placeholders = ", ".join(["%s"] * len(COLUNAS))
+        cursor.executemany(f"INSERT INTO historico_benchmark ({', '.join(COLUNAS)}) VALUES ({placeholders})",
+                           [tuple(row) for row in df.values])
+        conn.commit()
+
+    try:
+        recriar()
+        medir("executemany (anterior)", executemany_anterior, len(df))
+        recriar()
+        medir("INSERT multi-valores em lotes",
+              lambda: (mysql_client.inserir_em_massa(cursor, "historico_benchmark", df, "insert"), conn.commit()), len(df))
+        recriar()
+        medir("LOAD DATA LOCAL INFILE",
+              lambda: (mysql_client.inserir_em_massa(cursor, "historico_benchmark", df, "load_data"), conn.commit()), len(df))
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS historico_benchmark")
+        cursor.close()
+        conn.close()
+
+
+def main():
+    linhas = 100000
+    if "--linhas" in sys.argv:
+        linhas = int(sys.argv[sys.argv.index("--linhas") + 1])
+
+    df = gerar_historico(linhas)
+    benchmark_sqlite(df)
+    if "--mysql" in sys.argv:
+        benchmark_mysql(df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# benchmark_gap_lucro.py — Mede analisar_gap_lucro (oportunidades_ia)
+"""
+Compara a versão vetorizada de analisar_gap_lucro com a anterior (iterrows,
+mantida aqui como referência) em N produtos sintéticos no formato de
+ler_planilha (padrão: 100.000), confere que o resultado é idêntico e imprime
+o tempo de cada uma.
+
+    python benchmark_gap_lucro.py
+    python benchmark_gap_lucro.py --linhas 20000
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from oportunidades_ia import analisar_gap_lucro
+
+
+def analisar_gap_lucro_anterior(df_atual):
+    """analisar_gap_lucro antes da vetorização (linha a linha)"""
+    if df_atual is None or df_atual.empty:
+        return pd.DataFrame()
+    
+    df = df_atual.copy()
+    
+    cols_req = ["codigo_produto", "Vendedor 1", "Preco 1"]
+    if not all(c in df.columns for c in cols_req):
+        return pd.DataFrame()
+    
+    def parse_preco(val):
+        if pd.isna(val) or val == "-" or val == "":
+            return 0.0
+        try:
+            return float(str(val).replace(",", ".").replace("R$", "").strip())
+        except:
+            return 0.0
+    
+    def parse_frete(val):
+        if pd.isna(val) or val == "-" or val == "" or str(val).lower() == "gratis":
+            return 0.0
+        try:
+            return float(str(val).replace(",", ".").replace("R$", "").strip())
+        except:
+            return 0.0
+    
+    df["Preco 1 Num"] = df["Preco 1"].apply(parse_preco)
+    df["Frete 1 Num"] = df.get("Frete 1", 0).apply(parse_frete) if "Frete 1" in df.columns else 0
+    df["Total 1"] = df["Preco 1 Num"] + df["Frete 1 Num"]
+    
+    df["Preco 2 Num"] = df.get("Preco 2", 0).apply(parse_preco) if "Preco 2" in df.columns else 0
+    df["Frete 2 Num"] = df.get("Frete 2", 0).apply(parse_frete) if "Frete 2" in df.columns else 0
+    df["Total 2"] = df["Preco 2 Num"] + df["Frete 2 Num"]
+    
+    df["Preco 3 Num"] = df.get("Preco 3", 0).apply(parse_preco) if "Preco 3" in df.columns else 0
+    df["Frete 3 Num"] = df.get("Frete 3", 0).apply(parse_frete) if "Frete 3" in df.columns else 0
+    df["Total 3"] = df["Preco 3 Num"] + df["Frete 3 Num"]
+    
+    mask_color = df["Vendedor 1"].astype(str).str.lower().str.contains("color", na=False)
+    df_color = df[mask_color].copy()
+    
+    if df_color.empty:
+        return pd.DataFrame()
+    
+    results = []
+    for idx, row in df_color.iterrows():
+        concorrentes = []
+        
+        v2 = row.get("Vendedor 2", "-")
+        total_2 = row["Total 2"]
+        if v2 != "-" and pd.notna(v2) and total_2 > 0:
+            concorrentes.append({"vendedor": v2, "preco": row["Preco 2 Num"], "frete": row["Frete 2 Num"],
+                                 "total": total_2, "posicao": 2})
+        
+        v3 = row.get("Vendedor 3", "-")
+        total_3 = row["Total 3"]
+        if v3 != "-" and pd.notna(v3) and total_3 > 0:
+            concorrentes.append({"vendedor": v3, "preco": row["Preco 3 Num"], "frete": row["Frete 3 Num"],
+                                 "total": total_3, "posicao": 3})
+        
+        if not concorrentes:
+            continue
+        
+        melhor_concorrente = min(concorrentes, key=lambda x: x["total"])
+        preco_concorrente = melhor_concorrente["preco"]
+        preco_ideal = preco_concorrente - 0.10
+        ganho_potencial = preco_ideal - row["Preco 1 Num"]
+        
+        if ganho_potencial >= 1.00:
+            results.append({
+                "codigo_produto": row["codigo_produto"],
+                "sku_seller": row.get("sku_seller", "-"),
+                "nome_esperado": row.get("nome_esperado", "-"),
+                "Vendedor 1": row["Vendedor 1"],
+                "Preco 1": row["Preco 1 Num"],
+                "Frete 1": row["Frete 1 Num"] if "Frete 1" in df.columns else 0,
+                "Concorrente": melhor_concorrente["vendedor"],
+                "Posicao Concorrente": melhor_concorrente["posicao"],
+                "Preco Concorrente": melhor_concorrente["preco"],
+                "Frete Concorrente": melhor_concorrente["frete"],
+                "Total Concorrente": melhor_concorrente["total"],
+                "Preco 2": row.get("Preco 2 Num", 0),
+                "Vendedor 2": row.get("Vendedor 2", "-"),
+                "Gap": preco_concorrente - row["Preco 1 Num"],
+                "Preco Ideal": preco_ideal,
+                "Ganho Potencial": ganho_potencial,
+            })
+    
+    if not results:
+        return pd.DataFrame()
+    
+    df_final = pd.DataFrame(results)
+    return df_final.sort_values("Ganho Potencial", ascending=False)
+
+
+def gerar_produtos(linhas: int) -> pd.DataFrame:
+    """
+    Produtos sintéticos como ler_planilha os devolve: preços em reais (float)
+    ou "-", fretes em reais, "Gratis" ou "Pago", e alguns textos da planilha
+    antiga ("R$ 12,90", vazio, nulo) para cobrir a conversão.
+    """
+    rng = np.random.default_rng(42)
+    vendedores = np.array(["Color Sports", "Loja A", "Loja B", "Loja C", "-"], dtype=object)
+    textos = np.array(["R$ 129,90", "", None, "abc", "-"], dtype=object)
+    
+    df = pd.DataFrame({
+        "codigo_produto": [f"NS-{i:06d}" for i in range(linhas)],
+        "sku_seller": [f"CS-{i:06d}" for i in range(linhas)],
+        "nome_esperado": "Bola de Futebol Campo Oficial",
+    })
+    for pos in (1, 2, 3):
+        precos = np.round(rng.uniform(50, 500, linhas), 2).astype(object)
+        sorteio = rng.random(linhas)
+        precos[sorteio < 0.05] = "-"
+        troca = sorteio > 0.98
+        precos[troca] = textos[rng.integers(0, len(textos), troca.sum())]
+        
+        fretes = np.round(rng.uniform(0, 40, linhas), 2).astype(object)
+        sorteio = rng.random(linhas)
+        fretes[sorteio < 0.4] = "Gratis"
+        fretes[(sorteio >= 0.4) & (sorteio < 0.5)] = "Pago"
+        fretes[(sorteio >= 0.5) & (sorteio < 0.55)] = "-"
+        
+        df[f"Vendedor {pos}"] = vendedores[rng.integers(0, len(vendedores) - (pos == 1), linhas)]
+        df[f"Preco {pos}"] = precos
+        df[f"Frete {pos}"] = fretes
+    return df
+
+
+def medir(nome: str, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+    print(f"  {nome:<36} {duracao:8.3f} s")
+    return resultado, duracao
+
+
+def main():
+    linhas = 100000
+    if "--linhas" in sys.argv:
+        linhas = int(sys.argv[sys.argv.index("--linhas") + 1])
+    
+    df = gerar_produtos(linhas)
+    print(f"[GAP LUCRO] {linhas} produtos")
+    anterior, t_anterior = medir("iterrows (anterior)", lambda: analisar_gap_lucro_anterior(df))
+    atual, t_atual = medir("vetorizada (NumPy)", lambda: analisar_gap_lucro(df))
+    
+    pd.testing.assert_frame_equal(atual, anterior)
+    # Sem colunas opcionais (sku_seller, Frete N, Vendedor/Preco 3) o resultado também tem que bater
+    reduzido = df.drop(columns=["sku_seller", "Frete 1", "Frete 2", "Vendedor 3", "Preco 3"])
+    pd.testing.assert_frame_equal(analisar_gap_lucro(reduzido), analisar_gap_lucro_anterior(reduzido))
+    print(f"  Resultado idêntico ({len(atual)} oportunidades); {t_anterior / t_atual:.0f}x mais rápida")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# db_async.py — Acesso assíncrono ao banco (coleta e telas)
+"""
+Executa as operações de db_client em uma thread dedicada ao banco e devolve
+futures, para que a coleta (asyncio) e as telas Flet não fiquem paradas
+esperando o banco.
+
+- Coleta (asyncio):  df = await db_async.ler_planilha()
+- Telas (Flet):      db_async.em_segundo_plano(ler_planilha, ao_concluir=montar_tela)
+
+No SQLite há uma única thread do banco: a conexão da thread é reaproveitada
+e as escritas ficam naturalmente em fila. No MySQL, algumas threads
+compartilham o pool de conexões; no modo serviço, cada uma tem sua conexão HTTP.
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import db_client
+
+THREADS_MYSQL = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Cria as threads do banco na primeira chamada"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                threads = THREADS_MYSQL if db_client.DB_TYPE in ("mysql", "servico") else 1
+                _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="banco")
+    return _executor
+
+
+def submeter(funcao, *args, **kwargs) -> Future:
+    """Agenda funcao(*args, **kwargs) na thread do banco e retorna o Future"""
+    return _get_executor().submit(funcao, *args, **kwargs)
+
+
+async def executar(funcao, *args, **kwargs):
+    """Versão aguardável de submeter (para código asyncio)"""
+    return await asyncio.wrap_future(submeter(funcao, *args, **kwargs))
+
+
+def em_segundo_plano(funcao, *args, ao_concluir=None, ao_falhar=None, **kwargs) -> Future:
+    """
+    Para as telas: roda funcao na thread do banco e chama ao_concluir(resultado)
+    ou ao_falhar(exceção) quando terminar. Os callbacks rodam fora da thread da
+    tela (como os handlers do Flet), então podem montar controles e chamar
+    page.update().
+    """
+    futuro = submeter(funcao, *args, **kwargs)
+
+    def concluir(f: Future):
+        erro = f.exception()
+        if erro is not None:
+            if ao_falhar:
+                ao_falhar(erro)
+            else:
+                print(f"[DB] Erro em {getattr(funcao, '__name__', funcao)}: {erro}")
+        elif ao_concluir:
+            ao_concluir(f.result())
+
+    futuro.add_done_callback(concluir)
+    return futuro
+
+
+def encerrar():
+    """Aguarda as operações pendentes e encerra as threads do banco"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+atexit.register(encerrar)
+
+
+# ============================================================
+# MESMAS OPERAÇÕES DE db_client, EM VERSÃO ASSÍNCRONA
+# ============================================================
+
+def _assincrona(funcao):
+    async def operacao(*args, **kwargs):
+        return await executar(funcao, *args, **kwargs)
+    operacao.__name__ = funcao.__name__
+    operacao.__doc__ = funcao.__doc__
+    return operacao
+
+
+criar_tabelas = _assincrona(db_client.criar_tabelas)
+criar_usuario_padrao = _assincrona(db_client.criar_usuario_padrao)
+ler_planilha = _assincrona(db_client.ler_planilha)
+salvar_planilha = _assincrona(db_client.salvar_planilha)
+contar_produtos = _assincrona(db_client.contar_produtos)
+atualizar_produtos_lote = _assincrona(db_client.atualizar_produtos_lote)
+ler_aba = _assincrona(db_client.ler_aba)
+ler_historico = _assincrona(db_client.ler_historico)
+ler_historico_diario = _assincrona(db_client.ler_historico_diario)
+ler_buybox_diario = _assincrona(db_client.ler_buybox_diario)
+ler_historico_latest = _assincrona(db_client.ler_historico_latest)
+ler_ofertas = _assincrona(db_client.ler_ofertas)
+atualizar_historico = _assincrona(db_client.atualizar_historico)
+aplicar_retencao_historico = _assincrona(db_client.aplicar_retencao_historico)
+ler_usuarios = _assincrona(db_client.ler_usuarios)
+verificar_usuario = _assincrona(db_client.verificar_usuario)
+adicionar_usuario = _assincrona(db_client.adicionar_usuario)
+listar_usuarios = _assincrona(db_client.listar_usuarios)
+atualizar_usuario = _assincrona(db_client.atualizar_usuario)
+atualizar_usuarios_lote = _assincrona(db_client.atualizar_usuarios_lote)
+excluir_usuario = _assincrona(db_client.excluir_usuario)
+salvar_aba = _assincrona(db_client.salvar_aba)
+consultar_historico_com_arquivo = _assincrona(db_client.consultar_historico_com_arquivo)
+
+
+async def consultar_historico(*args, **kwargs):
+    """consultar_historico de db_client, sem chunksize (use consultar_historico_em_blocos)"""
+    if kwargs.get("chunksize"):
+        raise ValueError("Para leitura em blocos use consultar_historico_em_blocos")
+    return await executar(db_client.consultar_historico, *args, **kwargs)
+
+
+async def _iterar(criar_gerador, *args, **kwargs):
+    """Consome um gerador de db_client item a item na thread do banco"""
+    gerador = await executar(criar_gerador, *args, **kwargs)
+    try:
+        while True:
+            item = await executar(next, gerador, None)
+            if item is None:
+                return
+            yield item
+    finally:
+        # Interrompido no meio: fechar o gerador (e sua conexão/cursor) na thread do banco
+        await executar(gerador.close)
+
+
+def ler_produtos_paginado(tamanho_pagina: int = 1000):
+    """Gerador assíncrono das páginas de produtos (async for)"""
+    return _iterar(db_client.ler_produtos_paginado, tamanho_pagina)
+
+
+def consultar_historico_em_blocos(chunksize: int, **filtros):
+    """Gerador assíncrono de consultar_historico(chunksize=...) (async for)"""
+    return _iterar(db_client.consultar_historico, chunksize=chunksize, **filtros)
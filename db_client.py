@@ -8,6 +8,8 @@ Permite alternar entre bancos sem modificar os arquivos que importam as funçõe
 import os
 import sys
 import json
+import threading
+from functools import wraps
 from pathlib import Path
 
 def _get_db_type():
@@ -38,47 +40,256 @@ def _get_db_type():
     return "mysql"  # Padrão agora é MySQL
 
 
-# Determinar tipo de banco e importar módulo correto
-_db_type = _get_db_type()
-
-if _db_type == "mysql":
-    print("[DB] Usando MySQL como banco de dados")
-    from mysql_client import (
-        get_connection,
-        criar_tabelas,
-        criar_usuario_padrao,
-        ler_planilha,
-        salvar_planilha,
-        ler_aba,
-        ler_historico,
-        atualizar_historico,
-        ler_usuarios,
-        verificar_usuario,
-        adicionar_usuario,
-        listar_usuarios,
-        atualizar_usuario,
-        excluir_usuario,
-        salvar_aba,
-    )
-else:
-    print("[DB] Usando SQLite como banco de dados")
-    from sqlite_client import (
-        get_connection,
-        criar_tabelas,
-        criar_usuario_padrao,
-        ler_planilha,
-        salvar_planilha,
-        ler_aba,
-        ler_historico,
-        atualizar_historico,
-        ler_usuarios,
-        verificar_usuario,
-        adicionar_usuario,
-        listar_usuarios,
-        atualizar_usuario,
-        excluir_usuario,
-        salvar_aba,
-    )
-
-# Exportar também o tipo de banco para verificações
-DB_TYPE = _db_type
+# Funções com a mesma assinatura nos dois backends (sqlite_client e mysql_client)
+FUNCOES_BACKEND = [
+    "get_connection",
+    "criar_tabelas",
+    "criar_usuario_padrao",
+    "ler_planilha",
+    "salvar_planilha",
+    "contar_produtos",
+    "ler_produtos_paginado",
+    "ler_pagina_produtos",
+    "atualizar_produtos_lote",
+    "ler_aba",
+    "ler_historico",
+    "consultar_historico",
+    "consultar_historico_com_arquivo",
+    "ler_historico_diario",
+    "ler_buybox_diario",
+    "ler_historico_latest",
+    "ler_ofertas",
+    "atualizar_historico",
+    "aplicar_retencao_historico",
+    "ler_usuarios",
+    "verificar_usuario",
+    "adicionar_usuario",
+    "listar_usuarios",
+    "atualizar_usuario",
+    "atualizar_usuarios_lote",
+    "excluir_usuario",
+    "salvar_aba",
+    "versao_dados",
+    "manutencao_banco",
+    "registrar_alteracao",
+    "sessao_em_massa",
+    "aplicar_sessao",
+]
+
+_db_type = None
+
+
+def _tipo_banco() -> str:
+    """Tipo de banco da configuração (lido uma vez, sem importar o driver)"""
+    global _db_type
+    if _db_type is None:
+        _db_type = _get_db_type()
+    return _db_type
+
+
+class _Backend:
+    """
+    Módulo do banco (sqlite_client ou mysql_client) importado só no primeiro
+    acesso: importar db_client não lê a configuração nem carrega pandas e o
+    driver, o que deixa rápida a abertura das telas e da coleta.
+    """
+    
+    def __init__(self):
+        self._modulo = None
+        self._lock = threading.Lock()
+    
+    def _carregar(self):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    if _tipo_banco() == "mysql":
+                        print("[DB] Usando MySQL como banco de dados")
+                        import mysql_client as modulo
+                    elif _tipo_banco() == "servico":
+                        print("[DB] Usando o serviço de dados (servico_dados.py) como banco de dados")
+                        import servico_client as modulo
+                    else:
+                        print("[DB] Usando SQLite como banco de dados")
+                        import sqlite_client as modulo
+                    self._modulo = modulo
+        return self._modulo
+    
+    @property
+    def carregado(self) -> bool:
+        return self._modulo is not None
+    
+    def __getattr__(self, nome):
+        return getattr(self._carregar(), nome)
+
+
+backend = _Backend()
+
+
+def _adiada(nome: str):
+    """Função de db_client que repassa a chamada ao backend (importado nessa hora)"""
+    def funcao(*args, **kwargs):
+        return getattr(backend, nome)(*args, **kwargs)
+    funcao.__name__ = funcao.__qualname__ = nome
+    return funcao
+
+
+# Uma por nome de FUNCOES_BACKEND, explícitas para IDEs e linters enxergarem a API
+get_connection = _adiada("get_connection")
+criar_tabelas = _adiada("criar_tabelas")
+criar_usuario_padrao = _adiada("criar_usuario_padrao")
+ler_planilha = _adiada("ler_planilha")
+salvar_planilha = _adiada("salvar_planilha")
+contar_produtos = _adiada("contar_produtos")
+ler_produtos_paginado = _adiada("ler_produtos_paginado")
+ler_pagina_produtos = _adiada("ler_pagina_produtos")
+atualizar_produtos_lote = _adiada("atualizar_produtos_lote")
+ler_aba = _adiada("ler_aba")
+ler_historico = _adiada("ler_historico")
+consultar_historico = _adiada("consultar_historico")
+consultar_historico_com_arquivo = _adiada("consultar_historico_com_arquivo")
+ler_historico_diario = _adiada("ler_historico_diario")
+ler_buybox_diario = _adiada("ler_buybox_diario")
+ler_historico_latest = _adiada("ler_historico_latest")
+ler_ofertas = _adiada("ler_ofertas")
+atualizar_historico = _adiada("atualizar_historico")
+aplicar_retencao_historico = _adiada("aplicar_retencao_historico")
+ler_usuarios = _adiada("ler_usuarios")
+verificar_usuario = _adiada("verificar_usuario")
+adicionar_usuario = _adiada("adicionar_usuario")
+listar_usuarios = _adiada("listar_usuarios")
+atualizar_usuario = _adiada("atualizar_usuario")
+atualizar_usuarios_lote = _adiada("atualizar_usuarios_lote")
+excluir_usuario = _adiada("excluir_usuario")
+salvar_aba = _adiada("salvar_aba")
+versao_dados = _adiada("versao_dados")
+manutencao_banco = _adiada("manutencao_banco")
+registrar_alteracao = _adiada("registrar_alteracao")
+sessao_em_massa = _adiada("sessao_em_massa")
+aplicar_sessao = _adiada("aplicar_sessao")
+
+
+def __getattr__(nome):
+    # DB_TYPE só é resolvido quando alguém o consulta
+    if nome == "DB_TYPE":
+        return _tipo_banco()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+# ============================================================
+# CACHE DE LEITURA
+# ============================================================
+# Dashboard, análises, relatórios e importação chamam ler_planilha() cada um
+# por conta própria. O último DataFrame de cada consulta fica guardado com a
+# versão dos dados em que foi lido (versao_dados: PRAGMA data_version no
+# SQLite, contador em alteracoes_dados no MySQL) e só é relido se ela mudou.
+
+CACHE_LEITURAS = True
+MAX_CONSULTAS_CACHE = 16
+
+_cache_leituras = {}
+_cache_lock = threading.Lock()
+
+
+def limpar_cache_leituras():
+    """Descarta os DataFrames guardados (a próxima leitura vai ao banco)"""
+    with _cache_lock:
+        _cache_leituras.clear()
+
+
+def _com_cache(funcao, tabelas: list):
+    """Envolve uma leitura para reaproveitar o resultado enquanto as tabelas não mudarem"""
+    @wraps(funcao)
+    def leitura(*args, **kwargs):
+        if not CACHE_LEITURAS:
+            return funcao(*args, **kwargs)
+        chave = (funcao.__name__, args, tuple(sorted(kwargs.items())))
+        
+        # Versão lida ANTES da consulta: uma gravação concorrente invalida o resultado
+        try:
+            versao = versao_dados(tabelas)
+        except Exception as e:
+            print(f"[DB] Cache de leitura indisponível: {e}")
+            return funcao(*args, **kwargs)
+        
+        with _cache_lock:
+            guardado = _cache_leituras.get(chave)
+        if guardado is not None and guardado[0] == versao:
+            return guardado[1].copy()
+        
+        df = funcao(*args, **kwargs)
+        if df is None or df.empty:
+            return df  # Vazio (ou erro de leitura): não guardar
+        with _cache_lock:
+            _cache_leituras.pop(chave, None)
+            _cache_leituras[chave] = (versao, df)
+            while len(_cache_leituras) > MAX_CONSULTAS_CACHE:
+                _cache_leituras.pop(next(iter(_cache_leituras)))
+        # Cópia: quem chamou pode alterar o DataFrame à vontade
+        return df.copy()
+    
+    leitura.sem_cache = funcao
+    return leitura
+
+
+ler_planilha = _com_cache(ler_planilha, ["produtos"])
+ler_historico = _com_cache(ler_historico, ["historico"])
+
+
+# ============================================================
+# MOTOR ANALÍTICO (opcional, DuckDB)
+# ============================================================
+
+def get_analytics_connection():
+    """
+    Conexão DuckDB lendo o banco atual (ver analytics_client), para group-by e
+    funções de janela fora do pandas. None se o duckdb não estiver disponível
+    ou no modo serviço (SQL livre não passa pela rede: os relatórios usam pandas).
+    """
+    if _tipo_banco() == "servico":
+        return None
+    import analytics_client
+    return analytics_client.get_connection(_tipo_banco())
+
+
+def consulta_analitica(sql: str, params: list = None):
+    """DataFrame com o resultado da consulta no motor analítico, ou None se indisponível"""
+    if _tipo_banco() == "servico":
+        return None
+    import analytics_client
+    return analytics_client.consultar(_tipo_banco(), sql, params)
+
+
+
+# ============================================================
+# ORÇAMENTO DE IMPORTAÇÃO
+# ============================================================
+# python db_client.py  verifica, em processos novos, que importar db_client
+# continua barato: nenhum módulo pesado carregado e tempo dentro do limite.
+
+ORCAMENTO_IMPORTACAO_MS = 50
+MODULOS_ADIADOS = ["pandas", "mysql.connector", "duckdb", "sqlite_client", "mysql_client", "servico_client",
+                   "analytics_client"]
+
+
+def verificar_orcamento_importacao(execucoes: int = 3) -> bool:
+    """Melhor tempo de `import db_client` em processos novos x ORCAMENTO_IMPORTACAO_MS"""
+    import subprocess
+    codigo = ("import json, sys, time; inicio = time.perf_counter(); import db_client; "
+              "print(json.dumps({'ms': (time.perf_counter() - inicio) * 1000, "
+              f"'modulos': [m for m in {MODULOS_ADIADOS!r} if m in sys.modules]}}))")
+    medicoes = []
+    for _ in range(execucoes):
+        saida = subprocess.run([sys.executable, "-c", codigo], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True)
+        medicoes.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    
+    tempo = min(m["ms"] for m in medicoes)
+    carregados = sorted({modulo for m in medicoes for modulo in m["modulos"]})
+    print(f"[DB] import db_client: {tempo:.1f} ms (limite {ORCAMENTO_IMPORTACAO_MS} ms)")
+    if carregados:
+        print(f"[ERRO] Módulos carregados na importação: {', '.join(carregados)}")
+    return tempo <= ORCAMENTO_IMPORTACAO_MS and not carregados
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verificar_orcamento_importacao() else 1)
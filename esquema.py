@@ -0,0 +1,164 @@
+# esquema.py — Registro único das colunas de produtos e histórico
+"""
+Cada coluna de produtos e historico é descrita uma vez: nome no banco, tipo
+lógico (de onde saem o tipo SQLite, o tipo MySQL e o dtype do DataFrame),
+nome na planilha da coleta (entrada) e nome nas leituras (exibição).
+
+sqlite_client e mysql_client montam o DDL, os mapeamentos de nomes e os
+DataFrames das leituras a partir daqui, em vez de repetir listas e col_map.
+"""
+from collections import namedtuple
+
+import pandas as pd
+
+FRETE_GRATIS = "gratis"
+FRETE_PAGO = "pago"
+FRETE_DESCONHECIDO = "desconhecido"
+
+# tipo lógico: (SQLite, MySQL, dtype nas leituras em centavos; None = o que o pandas inferir)
+TIPOS = {
+    "sku": ("TEXT", "VARCHAR(100)", None),
+    "texto": ("TEXT", "TEXT", None),
+    "curto": ("TEXT", "VARCHAR(50)", None),
+    "status": ("TEXT", "VARCHAR(100)", None),
+    "vendedor": ("TEXT", "VARCHAR(255)", None),
+    "centavos": ("INTEGER", "INT NULL", "Int64"),
+    "frete_tipo": (f"TEXT NOT NULL DEFAULT '{FRETE_DESCONHECIDO}'",
+                   f"ENUM('{FRETE_GRATIS}', '{FRETE_PAGO}', '{FRETE_DESCONHECIDO}') "
+                   f"NOT NULL DEFAULT '{FRETE_DESCONHECIDO}'", None),
+    "momento": ("TEXT", "DATETIME NULL", None),  # MySQL devolve datetime: vira datetime64
+}
+BACKENDS = {"sqlite": 0, "mysql": 1}
+
+Coluna = namedtuple("Coluna", ["nome", "tipo", "entrada", "exibicao"])
+
+
+def _ofertas() -> list:
+    """vendedor_N, preco_N, frete_N e frete_tipo_N das três posições"""
+    colunas = []
+    for pos in (1, 2, 3):
+        colunas += [
+            Coluna(f"vendedor_{pos}", "vendedor", f"Vendedor {pos}", f"Vendedor {pos}"),
+            Coluna(f"preco_{pos}", "centavos", f"Preco {pos}", f"Preco {pos}"),
+            Coluna(f"frete_{pos}", "centavos", f"Frete {pos}", f"Frete {pos}"),
+            Coluna(f"frete_tipo_{pos}", "frete_tipo", None, None),  # Só existe no banco
+        ]
+    return colunas
+
+
+PRODUTOS = [
+    Coluna("codigo_produto", "sku", "codigo_produto", "codigo_produto"),
+    Coluna("sku_seller", "sku", "sku_seller", "sku_seller"),
+    Coluna("nome_esperado", "texto", "nome_esperado", "nome_esperado"),
+    Coluna("link", "texto", "link", "link"),
+    Coluna("site_disponivel", "curto", "Site Disponivel", "Site Disponivel"),
+    *_ofertas(),
+    Coluna("status_final", "status", "Status Final", "Status Final"),
+    Coluna("data_verificacao", "curto", "Data Verificacao", "Data Verificacao"),
+]
+
+# As leituras do histórico mantêm os nomes do banco, exceto os da planilha antiga
+HISTORICO = [
+    Coluna("codigo_produto", "sku", "codigo_produto", "SKU Color"),
+    Coluna("nome_esperado", "texto", "nome_esperado", "nome_esperado"),
+    Coluna("link", "texto", "link", "link"),
+    Coluna("site_disponivel", "curto", "Site Disponivel", "site_disponivel"),
+    *[c._replace(exibicao=c.nome) for c in _ofertas()],
+    Coluna("status_final", "status", "Status Final", "status_final"),
+    Coluna("data_verificacao", "curto", "Data Verificacao", "Data Verificação"),
+    Coluna("data_coleta", "curto", "Data Coleta", "Data Coleta"),
+    Coluna("coletado_em", "momento", "coletado_em", "coletado_em"),
+]
+
+TABELAS = {"produtos": PRODUTOS, "historico": HISTORICO}
+
+
+def colunas(tabela: str, legado: bool = False) -> list:
+    """Nomes das colunas no banco (sem id); legado: layout anterior aos centavos (sem frete_tipo_N)"""
+    return [c.nome for c in TABELAS[tabela] if not (legado and c.tipo == "frete_tipo")]
+
+
+def conferir_colunas(tabela: str, nomes) -> None:
+    """
+    ValueError se a tabela não está no registro ou se algum nome não é coluna
+    dela (nem id). Para nomes que vão montados no SQL (chave, colunas de um
+    DataFrame): os valores seguem como parâmetros, os nomes não.
+    """
+    if tabela not in TABELAS:
+        raise ValueError(f"Tabela fora do registro de colunas: {tabela}")
+    permitidas = set(colunas(tabela)) | {"id"}
+    invalidas = [n for n in nomes if n not in permitidas]
+    if invalidas:
+        raise ValueError(f"Colunas inexistentes em {tabela}: {invalidas}")
+
+
+def colunas_do_tipo(tabela: str, tipo: str) -> list:
+    return [c.nome for c in TABELAS[tabela] if c.tipo == tipo]
+
+
+def definicoes(tabela: str, backend: str, legado: bool = False, sem: tuple = ()) -> list:
+    """(coluna, tipo SQL) no backend ("sqlite" ou "mysql"); legado: preços/fretes em texto"""
+    indice = BACKENDS[backend]
+    resultado = []
+    for c in TABELAS[tabela]:
+        if c.nome in sem or (legado and c.tipo == "frete_tipo"):
+            continue
+        tipo = "TEXT" if legado and c.tipo == "centavos" else TIPOS[c.tipo][indice]
+        resultado.append((c.nome, tipo))
+    return resultado
+
+
+def ddl(tabela: str, backend: str, legado: bool = False, sem: tuple = (), recuo: str = "            ") -> str:
+    """Lista de colunas para o CREATE TABLE (uma por linha, separadas por vírgula)"""
+    return f",\n{recuo}".join(f"{nome} {tipo}" for nome, tipo in definicoes(tabela, backend, legado, sem))
+
+
+def mapa_entrada(tabela: str) -> dict:
+    """Nome na planilha da coleta -> nome no banco"""
+    return {c.entrada: c.nome for c in TABELAS[tabela] if c.entrada}
+
+
+def mapa_exibicao(tabela: str) -> dict:
+    """Nome no banco -> nome nas leituras (só os que mudam)"""
+    return {c.nome: c.exibicao for c in TABELAS[tabela] if c.exibicao and c.exibicao != c.nome}
+
+
+def para_banco(df: pd.DataFrame, tabela: str, extras: tuple = ("id",)) -> pd.DataFrame:
+    """
+    DataFrame com os nomes do banco montado direto das colunas conhecidas
+    da planilha (mais extras, como id), sem copiar nem renomear o resto.
+    """
+    dados = {}
+    for c in TABELAS[tabela]:
+        for nome in (c.entrada, c.nome):
+            if nome and nome in df.columns and c.nome not in dados:
+                dados[c.nome] = df[nome]
+    for nome in extras:
+        if nome in df.columns:
+            dados[nome] = df[nome]
+    return pd.DataFrame(dados, index=df.index)
+
+
+def frame(linhas, nomes: list, tabela: str) -> pd.DataFrame:
+    """
+    DataFrame das linhas de um cursor, com nomes do banco e dtypes do registro
+    (preços e fretes em centavos como Int64).
+    """
+    tipos = {c.nome: TIPOS[c.tipo][2] for c in TABELAS[tabela]}
+    valores = list(zip(*linhas)) or [()] * len(nomes)
+    return pd.DataFrame({
+        nome: pd.Series(coluna, dtype=tipos.get(nome)) for nome, coluna in zip(nomes, valores)
+    }, columns=nomes)
+
+
+def ler_cursor(cursor, tabela: str, linhas=None) -> pd.DataFrame:
+    """frame() do resultado do cursor (linhas: as já buscadas, ex. por fetchmany)"""
+    nomes = [d[0] for d in cursor.description]
+    return frame(cursor.fetchall() if linhas is None else linhas, nomes, tabela)
+
+
+def exibir(df: pd.DataFrame, tabela: str) -> pd.DataFrame:
+    """Troca, no próprio DataFrame, os nomes do banco pelos de exibição"""
+    mapa = mapa_exibicao(tabela)
+    df.columns = [mapa.get(c, c) for c in df.columns]
+    return df
@@ -11,6 +11,7 @@ from pathlib import Path
 from datetime import datetime, timedelta
 
 from oportunidades_ia import detectar_oportunidades
+from db_client import ler_historico_diario, ler_buybox_diario
 
 # ---------------- PDF ----------------
 from reportlab.lib.pagesizes import A4
@@ -201,6 +202,25 @@ def _aggressiveness_delta(df_hist):
     return agg.sort_values("delta_mean")
 
 
+def _aggressiveness_delta_diario(df_diario):
+    """
+    _aggressiveness_delta a partir do rollup (ler_historico_diario): diferença
+    do preço de cada vendedor para a média do SKU no dia, ponderada pelas ofertas.
+    """
+    if df_diario is None or df_diario.empty:
+        return pd.DataFrame()
+    
+    df = df_diario.dropna(subset=["preco_medio"])
+    df = df.assign(soma=df["preco_medio"] * df["ofertas"])
+    dia_sku = df.groupby(["dia", "codigo_produto"])[["soma", "ofertas"]].transform("sum")
+    df = df.assign(delta_peso=(df["preco_medio"] - dia_sku["soma"] / dia_sku["ofertas"]) * df["ofertas"])
+    
+    agg = df.groupby("vendedor")[["delta_peso", "ofertas"]].sum()
+    agg = (agg["delta_peso"] / agg["ofertas"]).reset_index(name="delta_mean")
+    agg = agg.rename(columns={"vendedor": COL_VENDEDOR})
+    return agg.sort_values("delta_mean")
+
+
 def _buybox_stats(df_hist, vendor_name="Color Sports"):
     if COL_PRECO not in df_hist.columns or COL_SKU not in df_hist.columns:
         return pd.DataFrame(), {"losses": 0, "recovers": 0, "loss_events": []}
@@ -249,6 +269,17 @@ def _top_volatile_skus(df_hist, top_n=200):
     return agg.sort_values("amp", ascending=False).head(top_n)
 
 
+def _top_volatile_skus_diario(df_buybox, top_n=200):
+    """_top_volatile_skus a partir do preço do buybox por dia (ler_buybox_diario)"""
+    if df_buybox is None or df_buybox.empty:
+        return pd.DataFrame()
+    
+    agg = df_buybox.groupby("codigo_produto")["preco"].agg(["min", "max"]).reset_index()
+    agg = agg.rename(columns={"codigo_produto": COL_SKU})
+    agg["amp"] = agg["max"] - agg["min"]
+    return agg.sort_values("amp", ascending=False).head(top_n)
+
+
 # ---------------------------------------------------------------------
 # GERAR XLSX + PDF
 # ---------------------------------------------------------------------
@@ -281,6 +312,16 @@ def gerar_relatorio(df_hist, start_date, end_date, include, out_dir):
 
     filename = out_dir / f"relatorio_color_sports_{sd_txt}_ate_{ed_txt}.xlsx"
 
+    # Rollup diário do período: volatilidade, agressividade e IA leem milhares
+    # de linhas agregadas em vez do histórico bruto (bancos sem rollup: df)
+    fim_rollup = end_date + timedelta(days=1) if end_date else None
+    df_diario = ler_historico_diario(data_inicio=start_date, data_fim=fim_rollup) if "concorrencia" in include else None
+    df_buybox = None
+    if "produtos" in include or "ia" in include:
+        df_buybox = ler_buybox_diario(data_inicio=start_date, data_fim=fim_rollup)
+    tem_diario = df_diario is not None and not df_diario.empty
+    tem_buybox = df_buybox is not None and not df_buybox.empty
+
     # ---------------------- CRIA XLSX ----------------------
     with pd.ExcelWriter(filename, engine="openpyxl") as writer:
 
@@ -306,7 +347,7 @@ def gerar_relatorio(df_hist, start_date, end_date, include, out_dir):
 
         # CONCORRÊNCIA
         if "concorrencia" in include:
-            agg = _aggressiveness_delta(df)
+            agg = _aggressiveness_delta_diario(df_diario) if tem_diario else _aggressiveness_delta(df)
             _df_to_excel(writer, agg, "Agressividade")
 
         # SUBSTITUIÇÕES
@@ -316,7 +357,7 @@ def gerar_relatorio(df_hist, start_date, end_date, include, out_dir):
 
         # VOLATILIDADE
         if "produtos" in include:
-            vol = _top_volatile_skus(df)
+            vol = _top_volatile_skus_diario(df_buybox) if tem_buybox else _top_volatile_skus(df)
             _df_to_excel(writer, vol, "Volatilidade")
 
         # BRUTOS
@@ -326,7 +367,7 @@ def gerar_relatorio(df_hist, start_date, end_date, include, out_dir):
         # IA
         df_ia = None
         if "ia" in include:
-            df_ia = detectar_oportunidades(df)
+            df_ia = detectar_oportunidades(df_buybox if tem_buybox else df)
             _df_to_excel(writer, df_ia, "Oportunidades IA")
 
     # ---------------------- PDF IA ----------------------
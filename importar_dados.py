@@ -4,7 +4,7 @@ Importa dados do Google Sheets ou CSV para o SQLite
 Execute uma vez para migrar os dados existentes
 """
 import pandas as pd
-from db_client import get_connection, criar_tabelas
+from db_client import salvar_planilha
 
 def importar_do_google_sheets():
     """Importa dados do Google Sheets para o SQLite (uma vez)"""
@@ -20,34 +20,10 @@ def importar_do_google_sheets():
         
         print(f"[IMPORT] {len(df)} registros encontrados no Google Sheets")
         
-        # Salvar no SQLite
-        criar_tabelas()
-        conn = get_connection()
-        
-        # Mapear colunas
-        col_map = {
-            "codigo_produto": "codigo_produto",
-            "nome_esperado": "nome_esperado",
-            "link": "link",
-            "Site Disponivel": "site_disponivel",
-            "Vendedor": "vendedor",
-            "Preco": "preco",
-            "Status Final": "status_final",
-            "Data Verificacao": "data_verificacao"
-        }
-        
-        df_save = df.copy()
-        df_save = df_save.rename(columns=col_map)
-        
-        colunas_validas = ["codigo_produto", "nome_esperado", "link", "site_disponivel", 
-                          "vendedor", "preco", "status_final", "data_verificacao"]
-        colunas_presentes = [c for c in colunas_validas if c in df_save.columns]
-        df_save = df_save[colunas_presentes]
-        
-        conn.execute("DELETE FROM produtos")
-        df_save.to_sql("produtos", conn, if_exists="append", index=False)
-        conn.commit()
-        conn.close()
+        # salvar_planilha mapeia as colunas pelo registro (esquema.py) e
+        # grava preços/fretes em centavos
+        df_save = df.drop(columns=["id"], errors="ignore")
+        salvar_planilha(df_save)
         
         print(f"[OK] {len(df_save)} produtos importados para o SQLite!")
         return True
@@ -99,44 +75,10 @@ def importar_do_csv(caminho_csv: str):
         return False
 
     
-    criar_tabelas()
-    conn = get_connection()
-    
-    # Mapear colunas se necessario (novo schema com 3 vendedores)
-    col_map = {
-        "codigo_produto": "codigo_produto",
-        "sku_seller": "sku_seller",
-        "nome_esperado": "nome_esperado", 
-        "link": "link",
-        "Site Disponivel": "site_disponivel",
-        "Vendedor 1": "vendedor_1",
-        "Preco 1": "preco_1",
-        "Frete 1": "frete_1",
-        "Vendedor 2": "vendedor_2",
-        "Preco 2": "preco_2",
-        "Frete 2": "frete_2",
-        "Vendedor 3": "vendedor_3",
-        "Preco 3": "preco_3",
-        "Frete 3": "frete_3",
-        "Status Final": "status_final",
-        "Data Verificacao": "data_verificacao"
-    }
-    
-    df_save = df.copy()
-    df_save = df_save.rename(columns=col_map)
-    
-    colunas_validas = ["codigo_produto", "sku_seller", "nome_esperado", "link", "site_disponivel", 
-                      "vendedor_1", "preco_1", "frete_1",
-                      "vendedor_2", "preco_2", "frete_2",
-                      "vendedor_3", "preco_3", "frete_3",
-                      "status_final", "data_verificacao"]
-    colunas_presentes = [c for c in colunas_validas if c in df_save.columns]
-    df_save = df_save[colunas_presentes]
-    
-    conn.execute("DELETE FROM produtos")
-    df_save.to_sql("produtos", conn, if_exists="append", index=False)
-    conn.commit()
-    conn.close()
+    # salvar_planilha mapeia as colunas (novo schema com 3 vendedores) e grava
+    # preços/fretes em centavos
+    df_save = df.drop(columns=["id"], errors="ignore")
+    salvar_planilha(df_save)
     
     print(f"[OK] {len(df_save)} produtos importados para o SQLite!")
     return True
@@ -275,8 +275,7 @@ def criar_dialogo_importar_skus(page: ft.Page, is_dark: list, on_complete=None):
     
     def executar_importacao(df, novos, atualizacoes):
         """Executa a importação dos SKUs"""
-        from db_client import get_connection
-        from db_client import DB_TYPE
+        from db_client import sessao_em_massa
         
         status_container.controls.clear()
         status_container.controls.append(
@@ -288,46 +287,17 @@ def criar_dialogo_importar_skus(page: ft.Page, is_dark: list, on_complete=None):
         page.update()
         
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
+            colunas = ['codigo_produto', 'sku_seller', 'nome_esperado', 'link']
+            dados = df.reindex(columns=colunas, fill_value='').astype(str)
+            dados = dados[(dados['codigo_produto'] != '') & (dados['sku_seller'] != '')]
+            # Mesmo sku_seller repetido no arquivo: vale a última linha
+            dados = dados.drop_duplicates('sku_seller', keep='last')
             
-            # Placeholder depends on DB type
-            ph = "%s" if DB_TYPE == "mysql" else "?"
-            
-            novos_count = 0
-            atualizados_count = 0
-            
-            for _, row in df.iterrows():
-                codigo = str(row.get('codigo_produto', ''))
-                sku_seller = str(row.get('sku_seller', ''))
-                nome = str(row.get('nome_esperado', ''))
-                link = str(row.get('link', ''))
-                
-                if not codigo or not sku_seller:
-                    continue
-                
-                # Verificar se já existe
-                cursor.execute(f"SELECT id FROM produtos WHERE sku_seller = {ph}", (sku_seller,))
-                existe = cursor.fetchone()
-                
-                if existe:
-                    # Atualizar
-                    cursor.execute(f"""
-                        UPDATE produtos 
-                        SET codigo_produto = {ph}, nome_esperado = {ph}, link = {ph}
-                        WHERE sku_seller = {ph}
-                    """, (codigo, nome, link, sku_seller))
-                    atualizados_count += 1
-                else:
-                    # Inserir novo
-                    cursor.execute(f"""
-                        INSERT INTO produtos (codigo_produto, sku_seller, nome_esperado, link, status_final)
-                        VALUES ({ph}, {ph}, {ph}, {ph}, 'PENDENTE')
-                    """, (codigo, sku_seller, nome, link))
-                    novos_count += 1
-            
-            conn.commit()
-            conn.close()
+            # Uma transação: atualiza pelo sku_seller os existentes e insere os novos
+            with sessao_em_massa() as sessao:
+                resultado = sessao.upsert("produtos", dados, chave="sku_seller",
+                                          ao_inserir={"status_final": "PENDENTE"})
+            atualizados_count, novos_count = resultado or (len(atualizacoes), len(novos))
             
             # Limpar arquivo temporário
             if excel_path[0] and os.path.exists(excel_path[0]):
@@ -5,10 +5,13 @@ import pandas as pd
 import random
 import re
 import hashlib
+import sys
 import time
 from datetime import datetime
 from tqdm.asyncio import tqdm
-from db_client import ler_planilha, salvar_planilha, atualizar_historico
+import db_async
+import db_client
+import manutencao
 
 BACKUP_CSV = "backup_netshoes_temp.csv"
 REQ_POR_LOTE = 500          # Lotes de 500
@@ -16,6 +19,18 @@ PAUSA_ENTRE_LOTES = 3       # Pausa entre lotes
 REQ_CONCORRENTES = 50       # 50 concorrentes
 MAX_TENTATIVAS = 3
 TIMEOUT_API = 15
+DIAS_HISTORICO = 60
+# Acima deste numero de SKUs a coleta roda em modo streaming (paginas do banco,
+# memoria constante). Tambem pode ser forcado com: python main.py --streaming
+LIMITE_MODO_STREAMING = 50000
+# Manutencao do banco (VACUUM/ANALYZE/checkpoint) ao fim da coleta, no maximo
+# uma vez a cada manutencao.INTERVALO_HORAS. Desligar: python main.py --sem-manutencao
+MANUTENCAO_APOS_COLETA = True
+STATUS_PARA_RETENTAR = ["", "TIMEOUT", "ERRO", "FALHA"]
+COLUNAS_RESULTADO = ["Site Disponivel", "Status Final", "Data Verificacao",
+                     "Vendedor 1", "Preco 1", "Frete 1",
+                     "Vendedor 2", "Preco 2", "Frete 2",
+                     "Vendedor 3", "Preco 3", "Frete 3"]
 
 # ==================== ANTI-DETECTION: ADAPTIVE RATE LIMITING ====================
 class AdaptiveRateLimiter:
@@ -168,6 +183,16 @@ def _format_price(centavos):
         return "-"
 
 
+def _centavos(valor):
+    """Valor da API (centavos) como inteiro, ou None"""
+    if not valor:
+        return None
+    try:
+        return int(round(float(valor)))
+    except (TypeError, ValueError):
+        return None
+
+
 async def _random_delay():
     """
     Delay aleatorio com distribuicao GAUSSIANA (mais natural)
@@ -240,11 +265,12 @@ async def coletar_dados_pdp(session: aiohttp.ClientSession, sku: str, session_id
                     
                     # Contador separado para ofertas disponiveis
                     available_count = 0
+                    # Todas as ofertas disponiveis (tabela ofertas); as 3 primeiras
+                    # tambem preenchem as colunas Vendedor/Preco/Frete 1..3
+                    ofertas = []
+                    resultado["Ofertas"] = ofertas
                     
                     for idx, offer in enumerate(prices):
-                        if available_count >= 3:  # Maximo 3 vendedores
-                            break
-                            
                         if not isinstance(offer, dict):
                             continue
                         
@@ -266,13 +292,15 @@ async def coletar_dados_pdp(session: aiohttp.ClientSession, sku: str, session_id
                             seller_name = offer.get("sellerName", "") or str(seller_data)
                             seller_id = ""
                         
-                        if seller_name:
+                        if seller_name and num <= 3:
                             resultado[f"Vendedor {num}"] = str(seller_name)[:50]
                         
                         # BUSCAR PRECO REAL NA API POR VENDEDOR
                         # A API /frdmprcsts retorna o preco final correto com todos os descontos
+                        # (apenas para os 3 primeiros: os demais usam o preco da API principal,
+                        # sem requisicoes extras)
                         price = None
-                        if seller_id and sku:
+                        if seller_id and sku and num <= 3:
                             try:
                                 seller_api_url = f"https://www.netshoes.com.br/frdmprcsts/{sku}/{seller_id}/lazy"
                                 await _random_delay()  # Delay antes de cada requisicao
@@ -289,19 +317,30 @@ async def coletar_dados_pdp(session: aiohttp.ClientSession, sku: str, session_id
                         if not price:
                             price = offer.get("finalPriceWithoutPaymentBenefitDiscount") or offer.get("saleInCents") or offer.get("listInCents")
                         
+                        # Frete
+                        free_shipping = offer.get("freeShipping", False)
+                        shipping = None if free_shipping else (offer.get("shipping") or offer.get("shippingCost"))
+                        
+                        ofertas.append({
+                            "posicao": num,
+                            "vendedor_id": str(seller_id) if seller_id else None,
+                            "vendedor": str(seller_name)[:255] if seller_name else None,
+                            "preco_centavos": _centavos(price),
+                            "frete_centavos": 0 if free_shipping else _centavos(shipping),
+                            "frete_tipo": "gratis" if free_shipping else "pago",
+                        })
+                        if num > 3:
+                            continue
+                        
                         if price:
                             resultado[f"Preco {num}"] = _format_price(price)
                         
-                        # Frete
-                        free_shipping = offer.get("freeShipping", False)
                         if free_shipping:
                             resultado[f"Frete {num}"] = "Gratis"
+                        elif shipping:
+                            resultado[f"Frete {num}"] = _format_price(shipping)
                         else:
-                            shipping = offer.get("shipping") or offer.get("shippingCost")
-                            if shipping:
-                                resultado[f"Frete {num}"] = _format_price(shipping)
-                            else:
-                                resultado[f"Frete {num}"] = "Pago"
+                            resultado[f"Frete {num}"] = "Pago"
                     
                     if resultado["Vendedor 1"] != "-" and resultado["Preco 1"] != "-":
                         resultado["Status Final"] = "OK"
@@ -356,35 +395,215 @@ async def verificar_produto(session: aiohttp.ClientSession, i: int, row: pd.Seri
     return i, resultado
 
 
-async def processar_lote(df: pd.DataFrame, session: aiohttp.ClientSession, indices: list[int], tentativa: int, sem_conc: asyncio.Semaphore, session_id: str):
-    tasks = [verificar_produto(session, i, df.loc[i], session_id) for i in indices]
-    async def sem_task(coro):
-        async with sem_conc:
-            return await coro
-    coros = [sem_task(t) for t in tasks]
-    resultados = []
-    for coro in tqdm(asyncio.as_completed(coros), total=len(coros), desc=f"Tentativa {tentativa} - Lote {indices[0]}>{indices[-1]}"):
-        try:
-            i, result = await coro
-            resultados.append((i, result))
-        except Exception as e:
-            pass
-    for i, result in resultados:
-        for k, v in result.items():
-            df.at[i, k] = v
+async def processar_lote(df: pd.DataFrame, session: aiohttp.ClientSession, indices: list[int], tentativa: int, sem_conc: asyncio.Semaphore, session_id: str,
+                         ofertas: dict | None = None):
+    """
+    Processa os indices com uma janela limitada de requisicoes em voo.
+    Em vez de criar todas as corrotinas de uma vez, REQ_CONCORRENTES workers
+    consomem os indices de um iterador compartilhado; cada resultado eh gravado
+    no DataFrame assim que chega.
+    ofertas (indice -> lista de ofertas) recebe todas as ofertas de cada produto.
+    """
+    if not indices:
+        return
+    
+    pendentes = iter(indices)
+    barra = tqdm(total=len(indices), desc=f"Tentativa {tentativa} - Lote {indices[0]}>{indices[-1]}")
+    
+    async def worker():
+        for idx in pendentes:
+            try:
+                async with sem_conc:
+                    i, result = await verificar_produto(session, idx, df.loc[idx], session_id)
+                lista = result.pop("Ofertas", None)
+                if ofertas is not None:
+                    ofertas[i] = lista or []
+                for k, v in result.items():
+                    df.at[i, k] = v
+            except Exception:
+                pass
+            barra.update(1)
+    
+    await asyncio.gather(*(worker() for _ in range(min(REQ_CONCORRENTES, len(indices)))))
+    barra.close()
+
+
+def _montar_ofertas(df: pd.DataFrame, ofertas: dict) -> pd.DataFrame:
+    """Uma linha por oferta (todos os vendedores), com o codigo_produto de cada indice"""
+    linhas = [
+        {"codigo_produto": df.at[i, "codigo_produto"], **oferta}
+        for i, lista in ofertas.items() if i in df.index
+        for oferta in lista
+    ]
+    return pd.DataFrame(linhas, columns=["codigo_produto", "posicao", "vendedor_id", "vendedor",
+                                         "preco_centavos", "frete_centavos", "frete_tipo"])
+
+
+def _criar_sessao_http():
+    """Cria a sessao aiohttp com os mesmos parametros anti-deteccao da coleta completa"""
+    # Connector com limites conservadores
+    connector = aiohttp.TCPConnector(
+        limit=REQ_CONCORRENTES,
+        limit_per_host=REQ_CONCORRENTES,
+        ssl=False,
+        ttl_dns_cache=300,
+        use_dns_cache=True,
+    )
+    
+    # Timeout global mais generoso
+    timeout = aiohttp.ClientTimeout(total=30, connect=10)
+    
+    # Cookie jar para persistencia de sessao (simula navegador real)
+    cookie_jar = aiohttp.CookieJar(unsafe=True)
+    
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=cookie_jar)
+
+
+def _gravar_coleta(df: pd.DataFrame, df_ofertas: pd.DataFrame, data_coleta: datetime,
+                   produtos_completos: bool = False):
+    """
+    Produtos + historico (com rollups) + ofertas em uma unica transacao:
+    ou a coleta inteira fica gravada, ou nada (a retencao roda depois, a parte).
+    produtos_completos: df eh a tabela produtos inteira (salvar_planilha) e
+    nao so os resultados de uma pagina (atualizar_produtos_lote).
+    """
+    try:
+        with db_client.sessao_em_massa() as sessao:
+            if produtos_completos:
+                sessao.salvar_planilha(df)
+            else:
+                sessao.atualizar_produtos_lote(df)
+            sessao.atualizar_historico(df, data_coleta=data_coleta, ofertas=df_ofertas)
+    except Exception as e:
+        print(f"[ERRO] Falha ao gravar a coleta (nada foi gravado): {e}")
+        return False
+    print(f"[OK] Coleta gravada: {len(df)} produtos e historico")
+    return True
+
 
+async def _gravar_pagina(df: pd.DataFrame, df_ofertas: pd.DataFrame, data_coleta: datetime):
+    """Grava uma pagina da coleta (produtos + historico + ofertas) na thread do banco"""
+    await db_async.executar(_gravar_coleta, df, df_ofertas, data_coleta)
 
-async def main():
-    df = ler_planilha()
+
+async def main_streaming(tamanho_pagina: int = REQ_POR_LOTE):
+    """
+    Coleta em modo streaming para catalogos muito grandes.
+    Le os produtos do banco em paginas, mantem no maximo REQ_CONCORRENTES
+    requisicoes em voo e grava cada pagina (produtos + historico) assim que
+    termina. Apenas a pagina atual fica em memoria, entao o consumo eh
+    constante independente do tamanho do catalogo.
+    O banco roda na thread do db_async: a proxima pagina eh lida e a anterior
+    gravada enquanto a pagina atual eh coletada.
+    """
+    total = await db_async.contar_produtos()
+    
+    if total == 0:
+        print("[AVISO] Nenhum produto encontrado no banco. Importe produtos primeiro.")
+        return
+    
+    print(f"[INFO] Total de produtos a verificar: {total}")
+    print(f"[INFO] Modo: STREAMING (paginas de {tamanho_pagina}) - PDP API com protecao anti-deteccao")
+    print(f"[INFO] Concorrencia: {REQ_CONCORRENTES}")
+    
+    session_id = _generate_session_id()
+    print(f"[INFO] Session ID: {session_id}")
+    
+    sem_conc = asyncio.Semaphore(REQ_CONCORRENTES)
+    data_coleta = datetime.now()
+    paginas = db_async.ler_produtos_paginado(tamanho_pagina)
+    proxima = asyncio.ensure_future(anext(paginas, None))
+    gravacao = None  # Gravacao da pagina anterior, em andamento na thread do banco
+    
+    contagem = {"OK": 0, "SEM ESTOQUE": 0, "FALHA": 0, "Vendedor 2": 0, "Vendedor 3": 0, "Frete Gratis": 0}
+    processados = 0
+    num_pagina = 0
+    
+    async with _criar_sessao_http() as session:
+        while True:
+            df = await proxima
+            if df is None:
+                break
+            # Ja pedir a proxima pagina enquanto esta eh coletada
+            proxima = asyncio.ensure_future(anext(paginas, None))
+            num_pagina += 1
+            
+            for col in COLUNAS_RESULTADO:
+                if col not in df.columns:
+                    df[col] = ""
+            df = df.reset_index(drop=True)
+            
+            print(f"[PAGINA] {num_pagina} ({processados + len(df)}/{total})")
+            
+            indices = list(df.index)
+            random.shuffle(indices)
+            ofertas = {}
+            tentativa = 1
+            while tentativa <= MAX_TENTATIVAS and indices:
+                await processar_lote(df, session, indices, tentativa, sem_conc, session_id, ofertas)
+                indices = df.index[df["Status Final"].astype(str).str.strip().isin(STATUS_PARA_RETENTAR)].tolist()
+                tentativa += 1
+                if indices and tentativa <= MAX_TENTATIVAS:
+                    print(f"[RETRY] {len(indices)} itens da pagina para nova tentativa, aguardando 15s...")
+                    await asyncio.sleep(15)
+            
+            # Gravar pagina sem esperar (uma gravacao por vez, na ordem das paginas)
+            if gravacao is not None:
+                await gravacao
+            gravacao = asyncio.ensure_future(_gravar_pagina(df, _montar_ofertas(df, ofertas), data_coleta))
+            df.to_csv(BACKUP_CSV, mode="w" if num_pagina == 1 else "a", header=num_pagina == 1, index=False)
+            
+            status = df["Status Final"]
+            contagem["OK"] += int((status == "OK").sum())
+            contagem["SEM ESTOQUE"] += int((status == "SEM ESTOQUE").sum())
+            contagem["FALHA"] += int(status.isin(["FALHA", "ERRO", "TIMEOUT"]).sum())
+            contagem["Vendedor 2"] += int((df["Vendedor 2"] != "-").sum())
+            contagem["Vendedor 3"] += int((df["Vendedor 3"] != "-").sum())
+            contagem["Frete Gratis"] += int((df["Frete 1"] == "Gratis").sum())
+            processados += len(df)
+            del df, ofertas
+            
+            pausa = PAUSA_ENTRE_LOTES + random.uniform(0, 3)
+            print(f"[PAUSA] Aguardando {pausa:.1f}s antes da proxima pagina...")
+            await asyncio.sleep(pausa)
+    
+    if gravacao is not None:
+        await gravacao
+    
+    print("\n=== Resumo final ===")
+    print(f"   Processados..... {processados}")
+    print(f"   OK.............. {contagem['OK']}")
+    print(f"   Sem estoque..... {contagem['SEM ESTOQUE']}")
+    print(f"   Falhas.......... {contagem['FALHA']}")
+    print(f"   Com Vendedor 2.. {contagem['Vendedor 2']}")
+    print(f"   Com Vendedor 3.. {contagem['Vendedor 3']}")
+    print(f"   Frete Gratis.... {contagem['Frete Gratis']}")
+    
+    print("\n[HIST] Aplicando retencao do historico...")
+    await db_async.aplicar_retencao_historico(DIAS_HISTORICO)
+    print("[HIST] Historico atualizado com sucesso!")
+
+
+async def _manutencao_apos_coleta():
+    if MANUTENCAO_APOS_COLETA and "--sem-manutencao" not in sys.argv:
+        await db_async.executar(manutencao.executar_se_devida)
+
+
+async def main(streaming: bool | None = None):
+    if streaming is None:
+        streaming = "--streaming" in sys.argv or await db_async.contar_produtos() > LIMITE_MODO_STREAMING
+    if streaming:
+        await main_streaming()
+        await _manutencao_apos_coleta()
+        return
+    
+    df = await db_async.ler_planilha()
     
     if df.empty:
         print("[AVISO] Nenhum produto encontrado no banco. Importe produtos primeiro.")
         return
     
-    for col in ["Site Disponivel", "Status Final", "Data Verificacao",
-                "Vendedor 1", "Preco 1", "Frete 1",
-                "Vendedor 2", "Preco 2", "Frete 2",
-                "Vendedor 3", "Preco 3", "Frete 3"]:
+    for col in COLUNAS_RESULTADO:
         if col not in df.columns:
             df[col] = ""
     
@@ -398,23 +617,10 @@ async def main():
     session_id = _generate_session_id()
     print(f"[INFO] Session ID: {session_id}")
     
-    # Connector com limites conservadores
-    connector = aiohttp.TCPConnector(
-        limit=REQ_CONCORRENTES,
-        limit_per_host=REQ_CONCORRENTES,
-        ssl=False,
-        ttl_dns_cache=300,
-        use_dns_cache=True,
-    )
     sem_conc = asyncio.Semaphore(REQ_CONCORRENTES)
+    ofertas = {}
     
-    # Timeout global mais generoso
-    timeout = aiohttp.ClientTimeout(total=30, connect=10)
-    
-    # Cookie jar para persistencia de sessao (simula navegador real)
-    cookie_jar = aiohttp.CookieJar(unsafe=True)
-    
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=cookie_jar) as session:
+    async with _criar_sessao_http() as session:
         tentativa = 1
         indices_para_tentar = indices_all.copy()
         
@@ -429,7 +635,7 @@ async def main():
                 lote_num = start // REQ_POR_LOTE + 1
                 print(f"[LOTE] Processando lote {lote_num} ({len(subset)} itens)...")
                 
-                await processar_lote(df, session, subset, tentativa, sem_conc, session_id)
+                await processar_lote(df, session, subset, tentativa, sem_conc, session_id, ofertas)
                 df.to_csv(BACKUP_CSV, index=False)
                 
                 # Pausa entre lotes com variacao
@@ -439,7 +645,7 @@ async def main():
                     await asyncio.sleep(pausa)
             
             indices_para_tentar = [i for i, row in df.iterrows() 
-                                   if str(row.get("Status Final", "")).strip() in ["", "TIMEOUT", "ERRO", "FALHA"]]
+                                   if str(row.get("Status Final", "")).strip() in STATUS_PARA_RETENTAR]
             print(f"[RETRY] Itens para proxima tentativa: {len(indices_para_tentar)}")
             
             if indices_para_tentar:
@@ -449,7 +655,8 @@ async def main():
             
             tentativa += 1
     
-    salvar_planilha(df)
+    print("\n[HIST] Gravando produtos e historico...")
+    await db_async.executar(_gravar_coleta, df, _montar_ofertas(df, ofertas), datetime.now(), True)
     df.to_csv(BACKUP_CSV, index=False)
     
     ok = int((df["Status Final"] == "OK").sum())
@@ -468,9 +675,10 @@ async def main():
     print(f"   Com Vendedor 3.. {v3}")
     print(f"   Frete Gratis.... {frete_gratis}")
     
-    print("\n[HIST] Salvando historico no SQLite...")
-    await asyncio.to_thread(atualizar_historico, df, 60)
+    print("\n[HIST] Aplicando retencao do historico...")
+    await db_async.aplicar_retencao_historico(DIAS_HISTORICO)
     print("[HIST] Historico atualizado com sucesso!")
+    await _manutencao_apos_coleta()
 
 
 if __name__ == "__main__":
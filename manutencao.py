@@ -0,0 +1,105 @@
+# manutencao.py — Manutenção periódica do banco
+"""
+Depois dos ciclos de exclusão e reinserção (salvar_planilha, retenção do
+histórico) o banco guarda páginas vazias e estatísticas velhas. A manutenção
+roda db_client.manutencao_banco e imprime tamanho e tempo das consultas de
+referência antes e depois:
+
+- SQLite: incremental_vacuum, ANALYZE e wal_checkpoint(TRUNCATE)
+- MySQL: ANALYZE TABLE e OPTIMIZE TABLE nas tabelas com muito espaço livre
+
+    python manutencao.py              # roda agora
+    python manutencao.py --completa   # VACUUM completo / OPTIMIZE de todas as tabelas
+    python manutencao.py --se-devida  # só se a última foi há mais de INTERVALO_HORAS
+
+A coleta (main.py) chama executar_se_devida() ao terminar.
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+INTERVALO_HORAS = 24
+ARQUIVO_ESTADO = os.path.join("data", "manutencao.json")
+
+
+def _ler_estado() -> dict:
+    try:
+        with open(ARQUIVO_ESTADO, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_estado(estado: dict):
+    try:
+        os.makedirs(os.path.dirname(ARQUIVO_ESTADO), exist_ok=True)
+        with open(ARQUIVO_ESTADO, "w", encoding="utf-8") as f:
+            json.dump(estado, f, indent=2, ensure_ascii=False)
+    except OSError as e:
+        print(f"[AVISO] Não foi possível gravar {ARQUIVO_ESTADO}: {e}")
+
+
+def _mb(tamanho: int) -> str:
+    return f"{tamanho / 1024 / 1024:.1f} MB"
+
+
+def _ms(tempo) -> str:
+    return "-" if tempo is None else f"{tempo:.1f}"
+
+
+def imprimir_relatorio(relatorio: dict, duracao: float):
+    print(f"[MANUTENCAO] {relatorio['banco']}: concluída em {duracao:.1f}s")
+    print(f"  Tamanho do banco.... {_mb(relatorio['tamanho_antes'])} -> {_mb(relatorio['tamanho_depois'])}")
+    if relatorio.get("arquivo_parquet"):
+        print(f"  Arquivo Parquet..... {_mb(relatorio['arquivo_parquet'])}")
+    print("  Etapas: " + " | ".join(f"{nome} {segundos:.2f}s" for nome, segundos in relatorio["etapas"].items()))
+    print("  Consultas de referência (ms, antes -> depois):")
+    for nome, antes in relatorio["consultas_antes"].items():
+        print(f"    - {nome}: {_ms(antes)} -> {_ms(relatorio['consultas_depois'].get(nome))}")
+
+
+def executar(completa: bool = False) -> dict:
+    """Roda a manutenção agora, imprime o relatório e registra o horário"""
+    from db_client import manutencao_banco
+    
+    inicio = time.perf_counter()
+    relatorio = manutencao_banco(completa=completa)
+    imprimir_relatorio(relatorio, time.perf_counter() - inicio)
+    
+    estado = _ler_estado()
+    estado["ultima_execucao"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    estado["tamanho_depois"] = relatorio["tamanho_depois"]
+    _gravar_estado(estado)
+    return relatorio
+
+
+def manutencao_devida() -> bool:
+    """A última manutenção foi há mais de INTERVALO_HORAS (ou nunca rodou)"""
+    ultima = _ler_estado().get("ultima_execucao")
+    if not ultima:
+        return True
+    try:
+        return datetime.now() - datetime.strptime(ultima, "%Y-%m-%d %H:%M:%S") >= timedelta(hours=INTERVALO_HORAS)
+    except ValueError:
+        return True
+
+
+def executar_se_devida(completa: bool = False):
+    """Gancho pós-coleta: roda a manutenção se estiver no prazo; falhas só são avisadas"""
+    if not manutencao_devida():
+        return None
+    try:
+        return executar(completa=completa)
+    except Exception as e:
+        print(f"[AVISO] Manutenção do banco falhou: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    completa = "--completa" in sys.argv
+    if "--se-devida" in sys.argv:
+        executar_se_devida(completa)
+    else:
+        executar(completa)
@@ -1,148 +1,355 @@
 # migrate_auto.py - Script de migração automática (sem input)
+"""
+Migração SQLite → MySQL em streaming, retomável e verificada.
+
+- Cada tabela é lida em lotes pelo rowid (memória constante, mesmo para um
+  histórico de milhões de linhas) e gravada em uma tabela de preparo
+  (<tabela>__migracao); a tabela de verdade só é trocada no final, com
+  RENAME TABLE, depois da verificação. Uma falha no meio não esvazia o MySQL.
+- O progresso de cada origem (tabela ou partição mensal do histórico) fica em
+  migracao_progresso, confirmado na mesma transação de cada lote: rodar de
+  novo continua de onde parou.
+- Origens diferentes são copiadas em paralelo.
+- No fim, contagem de linhas e checksum (CRC32 das colunas inteiras/texto)
+  da origem e do destino precisam bater para a troca acontecer.
+  
+    python migrate_auto.py                       # migra (ou retoma) tudo
+    python migrate_auto.py historico produtos    # só estas tabelas
+    python migrate_auto.py --reiniciar           # descarta o progresso e recomeça
+    python migrate_auto.py --paralelo 4 --lote 50000
+
+Rode com a coleta parada: o que for gravado no MySQL durante a migração é
+substituído na troca.
+"""
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 
-def migrate_all():
-    print("=" * 60)
-    print("  MIGRAÇÃO SQLite → MySQL")
-    print("=" * 60)
+TABELAS = ["produtos", "usuarios", "historico", "historico_backup",
+           "historico_diario", "historico_diario_buybox", "historico_latest", "ofertas"]
+TAMANHO_LOTE = 20000
+PARALELO = 3
+SUFIXO_PREPARO = "__migracao"
+SUFIXO_ANTIGA = "__antiga"
+
+# Colunas que entram no checksum (DATA_TYPE do MySQL); datas e DOUBLE ficam
+# de fora porque o texto gerado pelo MySQL difere do gravado no SQLite
+TIPOS_CHECKSUM = {"tinyint", "smallint", "mediumint", "int", "bigint",
+                  "char", "varchar", "text", "mediumtext", "longtext", "enum"}
+
+# Colunas NOT NULL no MySQL que podem vir nulas do SQLite
+VALOR_PADRAO = {("historico", "coletado_em"): "1970-01-01 00:00:00"}
+
+
+# ============================================================
+# ORIGEM (SQLite)
+# ============================================================
+
+def _origens(sqlite_conn, tabela: str) -> list:
+    """Tabelas do SQLite que alimentam a tabela: o histórico vem das partições mensais"""
+    if tabela == "historico":
+        rows = sqlite_conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name GLOB 'historico_[0-9][0-9][0-9][0-9][0-9][0-9]'
+            ORDER BY name
+        """).fetchall()
+        if rows:
+            return [row[0] for row in rows]
+    existe = sqlite_conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (tabela,)).fetchone()
+    return [tabela] if existe else []
+
+
+def _colunas_sqlite(sqlite_conn, origem: str) -> list:
+    return [row[1] for row in sqlite_conn.execute(f"PRAGMA table_info({origem})").fetchall()]
+
+
+def _checksum(linhas, indices: list) -> int:
+    """Soma dos CRC32 de cada linha, como SUM(CRC32(CONCAT_WS('|', ...))) no MySQL"""
+    total = 0
+    for linha in linhas:
+        texto = "|".join(str(linha[i]) for i in indices if linha[i] is not None)
+        total += zlib.crc32(texto.encode("utf-8"))
+    return total
+
+
+# ============================================================
+# DESTINO (MySQL)
+# ============================================================
+
+def _criar_tabela_progresso(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS migracao_progresso (
+            origem VARCHAR(128) NOT NULL PRIMARY KEY,
+            tabela VARCHAR(64) NOT NULL,
+            ultimo_rowid BIGINT NOT NULL DEFAULT 0,
+            linhas BIGINT NOT NULL DEFAULT 0,
+            checksum DECIMAL(30, 0) NOT NULL DEFAULT 0,
+            etapa VARCHAR(20) NOT NULL DEFAULT 'copiando',
+            atualizado_em DATETIME NOT NULL
+        ) ENGINE=InnoDB
+    """)
+
+
+def _tabela_existe(cursor, tabela: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (tabela,))
+    return cursor.fetchone()[0] > 0
+
+
+def _colunas_mysql(cursor, tabela: str) -> list:
+    """(coluna, DATA_TYPE) na ordem da tabela"""
+    cursor.execute("""
+        SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+    """, (tabela,))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def _progresso(cursor, tabela: str) -> dict:
+    """{origem: {ultimo_rowid, linhas, checksum, etapa}} da tabela"""
+    cursor.execute("""
+        SELECT origem, ultimo_rowid, linhas, checksum, etapa FROM migracao_progresso WHERE tabela = %s
+    """, (tabela,))
+    return {row[0]: {"ultimo_rowid": row[1], "linhas": row[2], "checksum": int(row[3]), "etapa": row[4]}
+            for row in cursor.fetchall()}
+
+
+def _salvar_progresso(cursor, origem: str, tabela: str, ultimo_rowid: int, linhas: int,
+                      checksum: int, etapa: str = "copiando"):
+    cursor.execute("""
+        INSERT INTO migracao_progresso (origem, tabela, ultimo_rowid, linhas, checksum, etapa, atualizado_em)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE ultimo_rowid = VALUES(ultimo_rowid), linhas = VALUES(linhas),
+            checksum = VALUES(checksum), etapa = VALUES(etapa), atualizado_em = NOW()
+    """, (origem, tabela, ultimo_rowid, linhas, checksum, etapa))
+
+
+def _criar_tabela_preparo(cursor, tabela: str, origens: list):
+    """<tabela>__migracao vazia com a estrutura da tabela (e partições cobrindo a origem)"""
+    import mysql_client
+    from datetime import datetime
+    
+    preparo = tabela + SUFIXO_PREPARO
+    cursor.execute(f"DROP TABLE IF EXISTS {preparo}")
+    cursor.execute(f"CREATE TABLE {preparo} LIKE {tabela}")
     
+    if tabela == "historico" and mysql_client._particoes_historico(cursor):
+        agora = mysql_client._chave_particao(datetime.now())
+        meses = [o[len("historico_"):] for o in origens if o != "historico"]
+        meses = [m for m in meses if m != mysql_client.PARTICAO_SEM_DATA] or [agora]
+        cursor.execute(f"""
+            ALTER TABLE {preparo} PARTITION BY RANGE COLUMNS(coletado_em) (
+                {mysql_client.clausulas_particoes(min(meses[0], agora), mysql_client._proximo_mes(max(meses[-1], agora)))}
+            )
+        """)
+
+
+# ============================================================
+# CÓPIA
+# ============================================================
+
+def _copiar_origem(tabela: str, origem: str, colunas: list, indices_checksum: list,
+                   inicio: dict, tamanho_lote: int) -> int:
+    """Copia uma origem em lotes a partir do último rowid confirmado. Retorna as linhas copiadas."""
     import sqlite_client
     import mysql_client
     
-    # Migrar PRODUTOS
-    print("[1/4] Migrando PRODUTOS...")
+    sqlite_conn = sqlite_client.get_connection()
+    mysql_conn = mysql_client.get_connection()
+    ultimo_rowid, linhas, checksum = inicio["ultimo_rowid"], inicio["linhas"], inicio["checksum"]
+    selecao = ", ".join(
+        f"COALESCE({c}, '{VALOR_PADRAO[(tabela, c)]}')" if (tabela, c) in VALOR_PADRAO else c
+        for c in colunas
+    )
+    
     try:
-        sqlite_conn = sqlite_client.get_connection()
-        df = pd.read_sql_query("SELECT * FROM produtos", sqlite_conn)
-        sqlite_conn.close()
-        
-        if not df.empty:
-            if 'id' in df.columns:
-                df = df.drop('id', axis=1)
-            
-            mysql_conn = mysql_client.get_connection()
-            cursor = mysql_conn.cursor()
-            cursor.execute("DELETE FROM produtos")
-            
-            columns = list(df.columns)
-            placeholders = ", ".join(["%s"] * len(columns))
-            col_str = ", ".join(columns)
-            insert_query = f"INSERT INTO produtos ({col_str}) VALUES ({placeholders})"
+        cursor = mysql_conn.cursor()
+        while True:
+            lote = sqlite_conn.execute(
+                f"SELECT rowid, {selecao} FROM {origem} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (ultimo_rowid, tamanho_lote)
+            ).fetchall()
+            if not lote:
+                break
             
-            data = [tuple(None if pd.isna(v) else v for v in row) for row in df.values]
-            cursor.executemany(insert_query, data)
+            dados = [tuple(row)[1:] for row in lote]
+            mysql_client.inserir_em_massa(cursor, tabela + SUFIXO_PREPARO,
+                                          pd.DataFrame(dados, columns=colunas, dtype=object))
+            ultimo_rowid = lote[-1][0]
+            linhas += len(dados)
+            checksum += _checksum(dados, indices_checksum)
+            # Progresso confirmado junto com o lote
+            _salvar_progresso(cursor, origem, tabela, ultimo_rowid, linhas, checksum)
             mysql_conn.commit()
-            cursor.close()
-            mysql_conn.close()
-            print(f"      OK: {len(df)} produtos migrados")
-        else:
-            print("      Vazio")
-    except Exception as e:
-        print(f"      ERRO: {e}")
-    
-    # Migrar HISTORICO
-    print("[2/4] Migrando HISTORICO...")
-    try:
-        sqlite_conn = sqlite_client.get_connection()
-        df = pd.read_sql_query("SELECT * FROM historico", sqlite_conn)
-        sqlite_conn.close()
         
-        if not df.empty:
-            if 'id' in df.columns:
-                df = df.drop('id', axis=1)
-            
-            mysql_conn = mysql_client.get_connection()
-            cursor = mysql_conn.cursor()
-            cursor.execute("DELETE FROM historico")
-            
-            columns = list(df.columns)
-            placeholders = ", ".join(["%s"] * len(columns))
-            col_str = ", ".join(columns)
-            insert_query = f"INSERT INTO historico ({col_str}) VALUES ({placeholders})"
-            
-            data = [tuple(None if pd.isna(v) else v for v in row) for row in df.values]
-            cursor.executemany(insert_query, data)
-            mysql_conn.commit()
-            cursor.close()
-            mysql_conn.close()
-            print(f"      OK: {len(df)} registros migrados")
-        else:
-            print("      Vazio")
-    except Exception as e:
-        print(f"      ERRO: {e}")
-    
-    # Migrar USUARIOS
-    print("[3/4] Migrando USUARIOS...")
-    try:
-        sqlite_conn = sqlite_client.get_connection()
-        df = pd.read_sql_query("SELECT * FROM usuarios", sqlite_conn)
+        _salvar_progresso(cursor, origem, tabela, ultimo_rowid, linhas, checksum, "copiada")
+        mysql_conn.commit()
+        cursor.close()
+        return linhas
+    except Exception:
+        mysql_conn.rollback()
+        raise
+    finally:
+        mysql_conn.close()
         sqlite_conn.close()
+
+
+def _verificar(cursor, sqlite_conn, tabela: str, origens: list, colunas_checksum: list) -> bool:
+    """Contagem e checksum da origem (SQLite) contra a tabela de preparo"""
+    esperado_linhas = sum(sqlite_conn.execute(f"SELECT COUNT(*) FROM {o}").fetchone()[0] for o in origens)
+    esperado_checksum = sum(p["checksum"] for p in _progresso(cursor, tabela).values())
+    
+    concat = f"CONCAT_WS('|', {', '.join(colunas_checksum)})" if colunas_checksum else "''"
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(CRC32({concat})), 0) FROM {tabela + SUFIXO_PREPARO}")
+    linhas, checksum = cursor.fetchone()
+    
+    if linhas != esperado_linhas or int(checksum) != esperado_checksum:
+        print(f"      ERRO: verificação de {tabela} falhou "
+              f"(linhas {linhas}/{esperado_linhas}, checksum {int(checksum)}/{esperado_checksum})")
+        return False
+    print(f"      {tabela}: {linhas} linhas, checksum OK")
+    return True
+
+
+def _trocar(cursor, conn, tabela: str):
+    """Troca a tabela pela de preparo (RENAME atômico) e descarta a antiga"""
+    import mysql_client
+    
+    antiga = tabela + SUFIXO_ANTIGA
+    cursor.execute(f"DROP TABLE IF EXISTS {antiga}")
+    cursor.execute(f"RENAME TABLE {tabela} TO {antiga}, {tabela + SUFIXO_PREPARO} TO {tabela}")
+    cursor.execute("UPDATE migracao_progresso SET etapa = 'trocada', atualizado_em = NOW() WHERE tabela = %s",
+                   (tabela,))
+    mysql_client.registrar_alteracao(cursor, tabela)
+    conn.commit()
+    cursor.execute(f"DROP TABLE IF EXISTS {antiga}")
+
+
+def migrar(tabelas: list = None, tamanho_lote: int = TAMANHO_LOTE, paralelo: int = PARALELO,
+           reiniciar: bool = False) -> bool:
+    """
+    Migra (ou retoma a migração de) as tabelas do SQLite para o MySQL.
+    Retorna True se todas foram copiadas, verificadas e trocadas.
+    """
+    import sqlite_client
+    import mysql_client
+    
+    tabelas = tabelas or TABELAS
+    sqlite_client.criar_tabelas()
+    mysql_client.criar_tabelas()
+    
+    sqlite_conn = sqlite_client.get_connection()
+    conn = mysql_client.get_connection()
+    cursor = conn.cursor()
+    _criar_tabela_progresso(cursor)
+    conn.commit()
+    
+    # Preparar cada tabela e listar as origens que faltam copiar
+    planos = {}
+    pendentes = []
+    for tabela in tabelas:
+        origens = _origens(sqlite_conn, tabela)
+        if not origens:
+            print(f"  {tabela}: não existe no SQLite")
+            continue
         
-        if not df.empty:
-            if 'id' in df.columns:
-                df = df.drop('id', axis=1)
-            
-            mysql_conn = mysql_client.get_connection()
-            cursor = mysql_conn.cursor()
-            cursor.execute("DELETE FROM usuarios")
-            
-            columns = list(df.columns)
-            placeholders = ", ".join(["%s"] * len(columns))
-            col_str = ", ".join(columns)
-            insert_query = f"INSERT INTO usuarios ({col_str}) VALUES ({placeholders})"
-            
-            data = [tuple(None if pd.isna(v) else v for v in row) for row in df.values]
-            cursor.executemany(insert_query, data)
-            mysql_conn.commit()
-            cursor.close()
-            mysql_conn.close()
-            print(f"      OK: {len(df)} usuarios migrados")
-        else:
-            print("      Vazio")
-    except Exception as e:
-        print(f"      ERRO: {e}")
-    
-    # Migrar HISTORICO_BACKUP
-    print("[4/4] Migrando HISTORICO_BACKUP...")
-    try:
-        sqlite_conn = sqlite_client.get_connection()
-        cursor_check = sqlite_conn.cursor()
-        cursor_check.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='historico_backup'")
-        if cursor_check.fetchone():
-            df = pd.read_sql_query("SELECT * FROM historico_backup", sqlite_conn)
-            sqlite_conn.close()
-            
-            if not df.empty:
-                if 'id' in df.columns:
-                    df = df.drop('id', axis=1)
-                
-                mysql_conn = mysql_client.get_connection()
-                cursor = mysql_conn.cursor()
-                cursor.execute("DELETE FROM historico_backup")
-                
-                columns = list(df.columns)
-                placeholders = ", ".join(["%s"] * len(columns))
-                col_str = ", ".join(columns)
-                insert_query = f"INSERT INTO historico_backup ({col_str}) VALUES ({placeholders})"
-                
-                data = [tuple(None if pd.isna(v) else v for v in row) for row in df.values]
-                cursor.executemany(insert_query, data)
-                mysql_conn.commit()
-                cursor.close()
-                mysql_conn.close()
-                print(f"      OK: {len(df)} registros migrados")
-            else:
-                print("      Vazio")
-        else:
-            sqlite_conn.close()
-            print("      Tabela nao existe no SQLite")
-    except Exception as e:
-        print(f"      ERRO: {e}")
+        if reiniciar:
+            cursor.execute("DELETE FROM migracao_progresso WHERE tabela = %s", (tabela,))
+            conn.commit()
+        progresso = _progresso(cursor, tabela)
+        etapas = {p["etapa"] for p in progresso.values()}
+        
+        if etapas == {"trocada"}:
+            print(f"  {tabela}: já migrada (use --reiniciar para migrar de novo)")
+            continue
+        preparo_existe = _tabela_existe(cursor, tabela + SUFIXO_PREPARO)
+        if not preparo_existe and etapas == {"copiada"}:
+            # Interrompida logo depois do RENAME: só falta registrar a troca
+            cursor.execute("UPDATE migracao_progresso SET etapa = 'trocada' WHERE tabela = %s", (tabela,))
+            conn.commit()
+            cursor.execute(f"DROP TABLE IF EXISTS {tabela + SUFIXO_ANTIGA}")
+            print(f"  {tabela}: já migrada")
+            continue
+        if not preparo_existe or not progresso:
+            # Começo do zero: tabela de preparo nova e vazia
+            cursor.execute("DELETE FROM migracao_progresso WHERE tabela = %s", (tabela,))
+            conn.commit()
+            _criar_tabela_preparo(cursor, tabela, origens)
+            progresso = {}
+        
+        colunas_destino = _colunas_mysql(cursor, tabela)
+        colunas_origem = set(_colunas_sqlite(sqlite_conn, origens[0]))
+        planos[tabela] = {
+            "origens": origens,
+            "colunas_checksum": [c for c, t in colunas_destino if c in colunas_origem and t in TIPOS_CHECKSUM],
+            "erro": False,
+        }
+        
+        for origem in origens:
+            p = progresso.get(origem, {"ultimo_rowid": 0, "linhas": 0, "checksum": 0, "etapa": "copiando"})
+            if p["etapa"] == "copiada":
+                continue
+            colunas = [c for c, _ in colunas_destino if c in set(_colunas_sqlite(sqlite_conn, origem))]
+            indices = [colunas.index(c) for c in planos[tabela]["colunas_checksum"] if c in colunas]
+            pendentes.append((tabela, origem, colunas, indices, p))
+            if p["linhas"]:
+                print(f"  {origem}: retomando após {p['linhas']} linhas")
+    
+    # Copiar as origens em paralelo
+    with ThreadPoolExecutor(max_workers=max(1, paralelo), thread_name_prefix="migracao") as executor:
+        futuros = {
+            executor.submit(_copiar_origem, tabela, origem, colunas, indices, inicio, tamanho_lote): (tabela, origem)
+            for tabela, origem, colunas, indices, inicio in pendentes
+        }
+        for futuro in as_completed(futuros):
+            tabela, origem = futuros[futuro]
+            try:
+                print(f"  {origem}: {futuro.result()} linhas copiadas")
+            except Exception as e:
+                planos[tabela]["erro"] = True
+                print(f"  {origem}: ERRO: {e} (rode de novo para continuar)")
+    
+    # Verificar e trocar
+    sucesso = True
+    print("[VERIFICAÇÃO]")
+    for tabela, plano in planos.items():
+        if plano["erro"] or not _verificar(cursor, sqlite_conn, tabela, plano["origens"], plano["colunas_checksum"]):
+            sucesso = False
+            continue
+        _trocar(cursor, conn, tabela)
+    
+    cursor.close()
+    conn.close()
+    sqlite_conn.close()
+    return sucesso
+
+
+def migrate_all():
+    print("=" * 60)
+    print("  MIGRAÇÃO SQLite → MySQL")
+    print("=" * 60)
+    
+    args = sys.argv[1:]
+    opcoes = {"reiniciar": "--reiniciar" in args}
+    for nome, chave in (("--paralelo", "paralelo"), ("--lote", "tamanho_lote")):
+        if nome in args:
+            opcoes[chave] = int(args[args.index(nome) + 1])
+    tabelas = [a for i, a in enumerate(args)
+               if not a.startswith("--") and (i == 0 or args[i - 1] not in ("--paralelo", "--lote"))]
+    
+    sucesso = migrar(tabelas or None, **opcoes)
     
     print()
     print("=" * 60)
-    print("  MIGRAÇÃO CONCLUÍDA!")
+    print("  MIGRAÇÃO CONCLUÍDA!" if sucesso else "  MIGRAÇÃO INCOMPLETA - rode novamente para continuar")
     print("=" * 60)
+    return sucesso
 
 if __name__ == "__main__":
-    migrate_all()
+    sys.exit(0 if migrate_all() else 1)
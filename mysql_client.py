@@ -4,11 +4,19 @@ Substitui sqlite_client.py com armazenamento MySQL Community
 Compatível com a mesma API do sqlite_client.py
 """
 import os
+import time
+import tempfile
+import threading
 import warnings
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional
 
+import arquivo_historico
+import esquema
+
 # Suprimir aviso do pandas sobre conexão DBAPI2 (funciona normalmente com mysql-connector)
 warnings.filterwarnings("ignore", message=".*pandas only supports SQLAlchemy.*")
 
@@ -22,9 +30,29 @@ except ImportError:
 
 # Pool de conexões global
 _connection_pool = None
+_pool_timeout = 0
 
-def _load_mysql_config():
-    """Carrega configuração MySQL do arquivo de configuração"""
+# Padrões do pool (sobrescritos pela seção "mysql" do server_config.json)
+POOL_PADRAO = {
+    "pool_size": 10,              # Máximo do mysql-connector: 32
+    "pool_reset_session": True,   # False evita um round-trip a cada conexão devolvida
+    "pool_timeout": 10,           # Segundos esperando uma conexão livre quando o pool está esgotado
+    "connection_timeout": 10,     # Segundos para abrir a conexão TCP
+    "read_timeout": None,         # Segundos (None = sem limite; requer connector com suporte)
+    "write_timeout": None,
+}
+
+# Padrões da carga em massa (mesma seção do server_config.json)
+CARGA_PADRAO = {
+    "tamanho_lote_insert": 1000,   # Linhas por INSERT multi-valores
+    "load_data_local": False,      # Usar LOAD DATA LOCAL INFILE (exige local_infile=ON no servidor)
+    "minimo_load_data": 5000,      # Abaixo disso o INSERT multi-valores é mais barato que o arquivo temporário
+}
+_carga_config = dict(CARGA_PADRAO)
+
+
+def _ler_secao_mysql() -> dict:
+    """Lê a seção "mysql" do server_config.json (vazia se não houver arquivo)"""
     import json
     import sys
     from pathlib import Path
@@ -48,27 +76,39 @@ def _load_mysql_config():
             try:
                 with open(config_path, 'r', encoding='utf-8') as f:
                     config = json.load(f)
-                    mysql_config = config.get("mysql", {})
-                    return {
-                        "host": mysql_config.get("host", "localhost"),
-                        "port": mysql_config.get("port", 3306),
-                        "user": mysql_config.get("user", "root"),
-                        "password": mysql_config.get("password", ""),
-                        "database": mysql_config.get("database", "netshoes_nivia"),
-                    }
+                    return config.get("mysql", {})
             except Exception as e:
                 print(f"[AVISO] Erro ao carregar config MySQL: {e}")
     
-    # Configuração padrão
+    return {}
+
+
+def _load_mysql_config():
+    """Carrega configuração MySQL do arquivo de configuração"""
+    mysql_config = _ler_secao_mysql()
     return {
-        "host": "localhost",
-        "port": 3306,
-        "user": "root",
-        "password": "",
-        "database": "netshoes_nivia",
+        "host": mysql_config.get("host", "localhost"),
+        "port": mysql_config.get("port", 3306),
+        "user": mysql_config.get("user", "root"),
+        "password": mysql_config.get("password", ""),
+        "database": mysql_config.get("database", "netshoes_nivia"),
     }
 
 
+def _load_carga_config():
+    """Carrega os parâmetros da carga em massa"""
+    mysql_config = _ler_secao_mysql()
+    return {chave: mysql_config.get(chave, padrao) for chave, padrao in CARGA_PADRAO.items()}
+
+
+def _load_pool_config():
+    """Carrega tamanho, reset de sessão e timeouts do pool"""
+    mysql_config = _ler_secao_mysql()
+    pool_config = {chave: mysql_config.get(chave, padrao) for chave, padrao in POOL_PADRAO.items()}
+    pool_config["pool_size"] = max(1, min(int(pool_config["pool_size"]), pooling.CNX_POOL_MAXSIZE))
+    return pool_config
+
+
 def _ensure_database_exists():
     """Garante que o banco de dados existe"""
     if not MYSQL_AVAILABLE:
@@ -97,7 +137,7 @@ def _ensure_database_exists():
 
 def _get_connection_pool():
     """Retorna o pool de conexões (cria se necessário)"""
-    global _connection_pool
+    global _connection_pool, _pool_timeout, _carga_config
     
     if _connection_pool is None:
         if not MYSQL_AVAILABLE:
@@ -105,15 +145,26 @@ def _get_connection_pool():
         
         _ensure_database_exists()
         config = _load_mysql_config()
+        pool_config = _load_pool_config()
+        
+        config["connection_timeout"] = pool_config["connection_timeout"]
+        for chave in ("read_timeout", "write_timeout"):
+            if pool_config[chave]:
+                config[chave] = pool_config[chave]
+        
+        _carga_config = _load_carga_config()
+        if _carga_config["load_data_local"]:
+            config["allow_local_infile"] = True
         
         try:
             _connection_pool = pooling.MySQLConnectionPool(
                 pool_name="netshoes_pool",
-                pool_size=5,
-                pool_reset_session=True,
+                pool_size=pool_config["pool_size"],
+                pool_reset_session=bool(pool_config["pool_reset_session"]),
                 **config
             )
-            print("[OK] Pool de conexões MySQL criado")
+            _pool_timeout = pool_config["pool_timeout"]
+            print(f"[OK] Pool de conexões MySQL criado ({pool_config['pool_size']} conexões)")
         except Error as e:
             print(f"[ERRO] Falha ao criar pool de conexões: {e}")
             raise
@@ -122,67 +173,185 @@ def _get_connection_pool():
 
 
 def get_connection():
-    """Retorna conexão com o banco MySQL"""
+    """
+    Retorna conexão com o banco MySQL.
+    Com o pool esgotado, espera até pool_timeout segundos por uma conexão livre
+    em vez de falhar na hora.
+    """
     try:
         pool = _get_connection_pool()
-        conn = pool.get_connection()
-        return conn
+        limite = time.monotonic() + _pool_timeout
+        while True:
+            try:
+                return pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                if time.monotonic() >= limite:
+                    raise
+                time.sleep(0.05)
     except Error as e:
         print(f"[MYSQL] Erro ao obter conexão: {e}")
         raise
 
 
+# Versão do schema registrada em schema_versao
+# 1: coletado_em no histórico | 2: histórico particionado por mês | 3: rollup diário
+# 4: historico_latest | 5: preços e fretes em centavos (INT) + frete_tipo_N
+# 6: ofertas normalizadas + view ofertas_top3 | 7: contador de alterações (cache de leitura)
+SCHEMA_VERSAO = 7
+
+_schema_verificado = False
+_schema_lock = threading.Lock()
+
+
+# ============================================================
+# CARGA EM MASSA
+# ============================================================
+
+def _linhas_para_insert(df: pd.DataFrame):
+    """
+    Tuplas prontas para o driver (NaN -> None, tipos numpy -> Python).
+    Converte coluna a coluna para arrays de objetos e monta as linhas sob demanda.
+    """
+    colunas = [serie.to_numpy(dtype=object, na_value=None) for _, serie in df.items()]
+    return zip(*colunas)
+
+
+def _inserir_multi_valores(cursor, tabela: str, colunas: list, linhas, tamanho_lote: int) -> int:
+    """INSERT ... VALUES (...), (...), ... com tamanho_lote linhas por comando"""
+    uma_linha = "(" + ", ".join(["%s"] * len(colunas)) + ")"
+    prefixo = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES "
+    total = 0
+    lote = []
+    
+    def enviar():
+        cursor.execute(prefixo + ", ".join([uma_linha] * len(lote)), [v for linha in lote for v in linha])
+    
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            enviar()
+            total += len(lote)
+            lote = []
+    if lote:
+        enviar()
+        total += len(lote)
+    return total
+
+
+def _escapar_tsv(valor) -> str:
+    """Valor no formato padrão do LOAD DATA (tab, escape com barra, NULL = \\N)"""
+    if valor is None:
+        return "\\N"
+    texto = str(valor)
+    return (texto.replace("\\", "\\\\").replace("\t", "\\t")
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _inserir_load_data(cursor, tabela: str, colunas: list, df: pd.DataFrame) -> int:
+    """Grava um TSV temporário e carrega com LOAD DATA LOCAL INFILE"""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n", suffix=".tsv", delete=False) as f:
+        caminho = f.name
+        for linha in _linhas_para_insert(df):
+            f.write("\t".join(_escapar_tsv(v) for v in linha) + "\n")
+    
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{caminho.replace(os.sep, "/")}'
+            INTO TABLE {tabela} CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(colunas)})
+        """)
+        return cursor.rowcount
+    finally:
+        os.remove(caminho)
+
+
+def inserir_em_massa(cursor, tabela: str, df: pd.DataFrame, metodo: Optional[str] = None) -> int:
+    """
+    Insere o DataFrame na transação corrente do cursor (não faz commit).
+    metodo: "load_data" (LOAD DATA LOCAL INFILE de um TSV temporário),
+            "insert" (INSERT multi-valores em lotes) ou None para escolher
+            pelo tamanho do lote e pela configuração (load_data_local).
+    Se o LOAD DATA for recusado pelo servidor, cai para o INSERT multi-valores.
+    Retorna o número de linhas inseridas.
+    """
+    if df.empty:
+        return 0
+    colunas = list(df.columns)
+    
+    if metodo is None:
+        usar_arquivo = _carga_config["load_data_local"] and len(df) >= _carga_config["minimo_load_data"]
+        metodo = "load_data" if usar_arquivo else "insert"
+    
+    if metodo == "load_data":
+        try:
+            return _inserir_load_data(cursor, tabela, colunas, df)
+        except Error as e:
+            print(f"[AVISO] LOAD DATA indisponível, usando INSERT em lotes: {e}")
+    
+    return _inserir_multi_valores(cursor, tabela, colunas, _linhas_para_insert(df),
+                                  int(_carga_config["tamanho_lote_insert"]))
+
+
 def criar_tabelas():
-    """Cria as tabelas se não existirem"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """
+    Cria as tabelas se não existirem.
+    Roda uma vez por processo: se schema_versao já registra SCHEMA_VERSAO,
+    nenhum DDL é enviado ao servidor.
+    """
+    global _schema_verificado
+    if _schema_verificado:
+        return
     
+    with _schema_lock:
+        if _schema_verificado:
+            return
+        
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_versao (
+                    versao INT NOT NULL PRIMARY KEY,
+                    aplicado_em DATETIME NOT NULL
+                ) ENGINE=InnoDB
+            """)
+            cursor.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_versao")
+            versao = cursor.fetchone()[0]
+            
+            if versao < SCHEMA_VERSAO:
+                _criar_tabelas(cursor, versao)
+                cursor.execute("INSERT INTO schema_versao (versao, aplicado_em) VALUES (%s, NOW())", (SCHEMA_VERSAO,))
+                conn.commit()
+                print("[OK] Tabelas MySQL criadas/verificadas.")
+            
+            cursor.close()
+        finally:
+            conn.close()
+        
+        _schema_verificado = True
+
+
+def _criar_tabelas(cursor, versao: int = 0):
+    """DDL completo do schema (tabelas + migrações a partir de versao)"""
     # Tabela produtos (dados atuais - equivale a Pagina1)
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS produtos (
             id INT AUTO_INCREMENT PRIMARY KEY,
-            codigo_produto VARCHAR(100),
-            sku_seller VARCHAR(100),
-            nome_esperado TEXT,
-            link TEXT,
-            site_disponivel VARCHAR(50),
-            vendedor_1 VARCHAR(255),
-            preco_1 VARCHAR(50),
-            frete_1 VARCHAR(50),
-            vendedor_2 VARCHAR(255),
-            preco_2 VARCHAR(50),
-            frete_2 VARCHAR(50),
-            vendedor_3 VARCHAR(255),
-            preco_3 VARCHAR(50),
-            frete_3 VARCHAR(50),
-            status_final VARCHAR(100),
-            data_verificacao VARCHAR(50),
+            {esquema.ddl("produtos", "mysql")},
             INDEX idx_codigo_produto (codigo_produto)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
     """)
     
     # Tabela historico (equivale a Pagina2)
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS historico (
             id INT AUTO_INCREMENT PRIMARY KEY,
-            codigo_produto VARCHAR(100),
-            nome_esperado TEXT,
-            link TEXT,
-            site_disponivel VARCHAR(50),
-            vendedor_1 VARCHAR(255),
-            preco_1 VARCHAR(50),
-            frete_1 VARCHAR(50),
-            vendedor_2 VARCHAR(255),
-            preco_2 VARCHAR(50),
-            frete_2 VARCHAR(50),
-            vendedor_3 VARCHAR(255),
-            preco_3 VARCHAR(50),
-            frete_3 VARCHAR(50),
-            status_final VARCHAR(100),
-            data_verificacao VARCHAR(50),
-            data_coleta VARCHAR(50),
+            {esquema.ddl("historico", "mysql")},
             INDEX idx_codigo_produto (codigo_produto),
-            INDEX idx_data_coleta (data_coleta)
+            INDEX idx_data_coleta (data_coleta),
+            INDEX idx_coletado_em (coletado_em)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
     """)
     
@@ -199,38 +368,187 @@ def criar_tabelas():
     """)
     
     # Tabela de backup do histórico
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS historico_backup (
             id INT AUTO_INCREMENT PRIMARY KEY,
-            codigo_produto VARCHAR(100),
-            nome_esperado TEXT,
-            link TEXT,
-            site_disponivel VARCHAR(50),
-            vendedor_1 VARCHAR(255),
-            preco_1 VARCHAR(50),
-            frete_1 VARCHAR(50),
-            vendedor_2 VARCHAR(255),
-            preco_2 VARCHAR(50),
-            frete_2 VARCHAR(50),
-            vendedor_3 VARCHAR(255),
-            preco_3 VARCHAR(50),
-            frete_3 VARCHAR(50),
-            status_final VARCHAR(100),
-            data_verificacao VARCHAR(50),
-            data_coleta VARCHAR(50),
+            {esquema.ddl("historico", "mysql", sem=("coletado_em",))},
             data_backup VARCHAR(50),
+            coletado_em DATETIME NULL,
             INDEX idx_data_coleta (data_coleta)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
     """)
     
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("[OK] Tabelas MySQL criadas/verificadas.")
+    _migrar_coletado_em(cursor)
+    
+    try:
+        _particionar_historico(cursor)
+    except Exception as e:
+        # Servidores sem suporte a particionamento seguem com a tabela única
+        print(f"[AVISO] Não foi possível particionar o histórico: {e}")
+    
+    # Antes dos preenchimentos abaixo, que já leem os preços em centavos
+    _migrar_precos_centavos(cursor)
+    
+    # Rollup diário do histórico
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS historico_diario (
+            codigo_produto VARCHAR(100) NOT NULL,
+            vendedor VARCHAR(255) NOT NULL,
+            dia DATE NOT NULL,
+            preco_min DOUBLE,
+            preco_max DOUBLE,
+            preco_soma DOUBLE,
+            ofertas INT,
+            vezes_buybox INT,
+            preco_ultimo DOUBLE,
+            coletado_em DATETIME,
+            PRIMARY KEY (codigo_produto, vendedor, dia),
+            INDEX idx_dia (dia)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS historico_diario_buybox (
+            codigo_produto VARCHAR(100) NOT NULL,
+            dia DATE NOT NULL,
+            vendedor VARCHAR(255),
+            preco DOUBLE,
+            coletado_em DATETIME,
+            PRIMARY KEY (codigo_produto, dia),
+            INDEX idx_dia (dia)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    if versao < 3:
+        _preencher_historico_diario(cursor)
+    
+    # Último registro por SKU
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS historico_latest (
+            codigo_produto VARCHAR(100) NOT NULL PRIMARY KEY,
+            {esquema.ddl("historico", "mysql", sem=("codigo_produto",))}
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    if versao < 4:
+        _preencher_historico_latest(cursor)
+    
+    # Ofertas normalizadas (todos os vendedores de cada coleta)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS ofertas (
+            coleta_id BIGINT NOT NULL,
+            codigo_produto VARCHAR(100) NOT NULL,
+            posicao SMALLINT NOT NULL,
+            vendedor_id VARCHAR(100),
+            vendedor VARCHAR(255),
+            preco_centavos INT NULL,
+            frete_centavos INT NULL,
+            frete_tipo {TIPO_FRETE_SQL},
+            coletado_em DATETIME NOT NULL,
+            PRIMARY KEY (coleta_id, codigo_produto, posicao),
+            INDEX idx_vendedor_coletado_em (vendedor, coletado_em),
+            INDEX idx_codigo_coletado_em (codigo_produto, coletado_em),
+            INDEX idx_coletado_em (coletado_em)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    _criar_view_ofertas_top3(cursor)
+    
+    # Contador de alterações por tabela (validação do cache de leitura do db_client)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes_dados (
+            tabela VARCHAR(64) NOT NULL PRIMARY KEY,
+            versao BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+    """)
+
+
+def _coluna_existe(cursor, tabela: str, coluna: str) -> bool:
+    """Verifica no information_schema se a coluna existe no banco atual"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (tabela, coluna))
+    return cursor.fetchone()[0] > 0
+
+
+def _migrar_coletado_em(cursor):
+    """
+    Migração: adiciona coletado_em (DATETIME, indexado) em bancos antigos e
+    preenche a partir de data_coleta (dd/mm/YYYY HH:MM:SS). Datas fora do
+    formato (ou inválidas, como 31/02) ficam com coletado_em NULL em vez de
+    interromper a migração no modo STRICT_TRANS_TABLES.
+    """
+    if not _coluna_existe(cursor, "historico", "coletado_em"):
+        cursor.execute("ALTER TABLE historico ADD COLUMN coletado_em DATETIME NULL, ADD INDEX idx_coletado_em (coletado_em)")
+        cursor.execute("""
+            UPDATE IGNORE historico SET coletado_em = STR_TO_DATE(data_coleta, '%d/%m/%Y %H:%i:%s')
+            WHERE coletado_em IS NULL AND data_coleta REGEXP '^[0-9]{2}/[0-9]{2}/[0-9]{4} [0-9]{2}:[0-9]{2}:[0-9]{2}$'
+        """)
+        print("[MIGRACAO] historico.coletado_em criado e preenchido")
+    
+    if not _coluna_existe(cursor, "historico_backup", "coletado_em"):
+        cursor.execute("ALTER TABLE historico_backup ADD COLUMN coletado_em DATETIME NULL")
+        cursor.execute("""
+            UPDATE IGNORE historico_backup SET coletado_em = STR_TO_DATE(data_coleta, '%d/%m/%Y %H:%i:%s')
+            WHERE coletado_em IS NULL AND data_coleta REGEXP '^[0-9]{2}/[0-9]{2}/[0-9]{4} [0-9]{2}:[0-9]{2}:[0-9]{2}$'
+        """)
+
+
+def _sql_numero(coluna: str) -> str:
+    """Condição SQL: o texto da coluna é um número (aceita vírgula decimal)"""
+    return f"REPLACE(TRIM({coluna}), ',', '.') REGEXP '^[0-9]+([.][0-9]+)?$'"
+
+
+def _sql_centavos(coluna: str) -> str:
+    """Expressão SQL: texto em reais -> centavos inteiros (NULL se não é número)"""
+    return (f"IF({_sql_numero(coluna)}, "
+            f"ROUND(CAST(REPLACE(TRIM({coluna}), ',', '.') AS DECIMAL(14, 4)) * 100), NULL)")
+
+
+def _migrar_precos_centavos(cursor):
+    """
+    Migração: preco_N/frete_N de VARCHAR (reais em texto) para INT (centavos)
+    e frete_tipo_N, em produtos, historico, historico_backup e historico_latest.
+    Os valores são convertidos em SQL em colunas novas, que depois assumem o
+    nome das antigas. Tabelas já convertidas são ignoradas.
+    """
+    for tabela in ("produtos", "historico", "historico_backup", "historico_latest"):
+        cursor.execute("""
+            SELECT DATA_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'preco_1'
+        """, (tabela,))
+        row = cursor.fetchone()
+        if row is None or str(row[0]).lower() == "int":
+            continue
+        
+        adicionar, atribuir, remover, renomear = [], [], [], []
+        for pos in (1, 2, 3):
+            preco, frete = f"preco_{pos}", f"frete_{pos}"
+            gratis = f"LOWER(TRIM({frete})) IN ('gratis', 'grátis')"
+            adicionar += [f"ADD COLUMN {preco}_centavos INT NULL",
+                          f"ADD COLUMN {frete}_centavos INT NULL",
+                          f"ADD COLUMN frete_tipo_{pos} {TIPO_FRETE_SQL} AFTER {frete}"]
+            atribuir += [f"{preco}_centavos = {_sql_centavos(preco)}",
+                         f"{frete}_centavos = IF({gratis}, 0, {_sql_centavos(frete)})",
+                         f"frete_tipo_{pos} = CASE WHEN {gratis} THEN '{FRETE_GRATIS}' "
+                         f"WHEN {_sql_numero(frete)} OR LOWER(TRIM({frete})) = 'pago' THEN '{FRETE_PAGO}' "
+                         f"ELSE '{FRETE_DESCONHECIDO}' END"]
+            remover += [f"DROP COLUMN {preco}", f"DROP COLUMN {frete}"]
+            renomear += [f"CHANGE {preco}_centavos {preco} INT NULL", f"CHANGE {frete}_centavos {frete} INT NULL"]
+        
+        cursor.execute(f"ALTER TABLE {tabela} {', '.join(adicionar)}")
+        cursor.execute(f"UPDATE {tabela} SET {', '.join(atribuir)}")
+        cursor.execute(f"ALTER TABLE {tabela} {', '.join(remover)}")
+        cursor.execute(f"ALTER TABLE {tabela} {', '.join(renomear)}")
+        print(f"[MIGRACAO] {tabela}: preços e fretes convertidos para centavos")
+
+
+_usuarios_verificados = False  # Já há usuários: o admin padrão não precisa ser conferido de novo
 
 
 def criar_usuario_padrao():
-    """Cria um usuário admin padrão se não existir nenhum"""
+    """Cria um usuário admin padrão se não existir nenhum (conferido uma vez por processo)"""
+    global _usuarios_verificados
+    if _usuarios_verificados:
+        return
+    
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT COUNT(*) as count FROM usuarios")
@@ -246,299 +564,1475 @@ def criar_usuario_padrao():
         conn.commit()
         print("[OK] Usuario admin padrao criado como MASTER (admin/admin)")
     
+    _usuarios_verificados = True
     cursor.close()
     conn.close()
 
 
 # ============================================================
-# FUNÇÕES DE PRODUTOS (substitui ler_planilha/salvar_planilha)
+# PREÇOS E FRETES EM CENTAVOS
 # ============================================================
+# No banco, preco_N e frete_N são INT (centavos, NULL quando não há valor)
+# e frete_tipo_N diz se o frete é grátis, pago ou desconhecido. O resto do
+# sistema continua vendo reais (float), "-", "Gratis" e "Pago": a conversão
+# acontece na entrada (gravações) e na saída (leituras) deste módulo.
 
-def ler_planilha() -> pd.DataFrame:
-    """Lê a tabela produtos e retorna como DataFrame"""
-    criar_tabelas()
-    conn = get_connection()
-    
-    try:
-        df = pd.read_sql_query("SELECT * FROM produtos", conn)
-        # Renomear colunas para manter compatibilidade
-        col_map = {
-            "codigo_produto": "codigo_produto",
-            "sku_seller": "sku_seller",
-            "nome_esperado": "nome_esperado",
-            "link": "link",
-            "site_disponivel": "Site Disponivel",
-            "vendedor_1": "Vendedor 1",
-            "preco_1": "Preco 1",
-            "frete_1": "Frete 1",
-            "vendedor_2": "Vendedor 2",
-            "preco_2": "Preco 2",
-            "frete_2": "Frete 2",
-            "vendedor_3": "Vendedor 3",
-            "preco_3": "Preco 3",
-            "frete_3": "Frete 3",
-            "status_final": "Status Final",
-            "data_verificacao": "Data Verificacao"
-        }
-        df = df.rename(columns=col_map)
-        return df
-    except Exception as e:
-        print(f"[MYSQL] Erro ao ler produtos: {e}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+FRETE_GRATIS = esquema.FRETE_GRATIS
+FRETE_PAGO = esquema.FRETE_PAGO
+FRETE_DESCONHECIDO = esquema.FRETE_DESCONHECIDO
+TIPO_FRETE_SQL = esquema.TIPOS["frete_tipo"][1]
 
 
-def salvar_planilha(df: pd.DataFrame) -> None:
-    """Salva DataFrame na tabela produtos (substitui dados existentes)"""
+def _para_preco(serie: pd.Series) -> pd.Series:
+    return pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+
+def _para_centavos(serie: pd.Series) -> pd.Series:
+    """Reais (float ou texto) -> centavos inteiros; o que não é número vira NULL"""
+    return (_para_preco(serie) * 100).round().astype("Int64")
+
+
+def _centavos_para_reais(serie: pd.Series) -> pd.Series:
+    """Centavos -> reais (float), com "-" onde não há valor (formato da coleta)"""
+    reais = pd.to_numeric(serie, errors="coerce") / 100
+    return reais.round(2).astype(object).where(reais.notna(), "-")
+
+
+def _precos_para_centavos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte preco_N/frete_N (colunas do banco, em reais ou texto) para
+    centavos e acrescenta frete_tipo_N logo após cada frete_N. Altera o
+    próprio DataFrame (montado por esquema.para_banco).
+    """
+    for pos in (1, 2, 3):
+        preco, frete, tipo = f"preco_{pos}", f"frete_{pos}", f"frete_tipo_{pos}"
+        if preco in df.columns:
+            df[preco] = _para_centavos(df[preco])
+        if frete not in df.columns or tipo in df.columns:
+            continue
+        
+        texto = df[frete].astype(str).str.strip().str.lower()
+        gratis = texto.isin(["gratis", "grátis"])
+        valor = _para_centavos(df[frete])
+        tipos = (pd.Series(FRETE_DESCONHECIDO, index=df.index)
+                 .mask(valor.notna() | (texto == "pago"), FRETE_PAGO)
+                 .mask(gratis, FRETE_GRATIS))
+        df[frete] = valor.mask(gratis, 0)
+        df.insert(df.columns.get_loc(frete) + 1, tipo, tipos)
+    return df
+
+
+def _precos_para_exibicao(df: pd.DataFrame) -> pd.DataFrame:
+    """Inverso de _precos_para_centavos: reais, "-", "Gratis" e "Pago" (remove frete_tipo_N)"""
+    for pos in (1, 2, 3):
+        preco, frete, tipo = f"preco_{pos}", f"frete_{pos}", f"frete_tipo_{pos}"
+        if preco in df.columns:
+            df[preco] = _centavos_para_reais(df[preco])
+        if frete not in df.columns:
+            df = df.drop(columns=[tipo], errors="ignore")
+            continue
+        
+        reais = _centavos_para_reais(df[frete])
+        if tipo in df.columns:
+            tipos = df.pop(tipo)
+            reais = reais.mask(tipos == FRETE_GRATIS, "Gratis").mask((tipos == FRETE_PAGO) & df[frete].isna(), "Pago")
+        df[frete] = reais
+    return df
+
+
+# ============================================================
+# VERSÃO DOS DADOS (cache de leitura do db_client)
+# ============================================================
+# Quem grava em produtos/histórico incrementa o contador da tabela na mesma
+# transação; o cache compara o contador antes de reaproveitar um DataFrame.
+# Gravações de outros processos (coleta, outras máquinas) também aparecem.
+
+def registrar_alteracao(cursor, tabela: str) -> None:
+    """Incrementa o contador de alterações da tabela (confirmado junto com a transação)"""
+    cursor.execute("""
+        INSERT INTO alteracoes_dados (tabela, versao) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE versao = versao + 1
+    """, (tabela,))
+
+
+def versao_dados(tabelas: list) -> tuple:
+    """Versão atual das tabelas: muda sempre que alguma delas for alterada"""
     criar_tabelas()
-    
-    if df is None or df.empty:
-        print("[AVISO] DataFrame vazio, nada para salvar.")
-        return
-    
-    # Mapear nomes das colunas para o banco
-    col_map = {
-        "codigo_produto": "codigo_produto",
-        "sku_seller": "sku_seller",
-        "nome_esperado": "nome_esperado",
-        "link": "link",
-        "Site Disponivel": "site_disponivel",
-        "Vendedor 1": "vendedor_1",
-        "Preco 1": "preco_1",
-        "Frete 1": "frete_1",
-        "Vendedor 2": "vendedor_2",
-        "Preco 2": "preco_2",
-        "Frete 2": "frete_2",
-        "Vendedor 3": "vendedor_3",
-        "Preco 3": "preco_3",
-        "Frete 3": "frete_3",
-        "Status Final": "status_final",
-        "Data Verificacao": "data_verificacao"
-    }
-    
-    df_save = df.copy()
-    df_save = df_save.rename(columns=col_map)
-    
-    # Manter apenas colunas conhecidas
-    colunas_validas = ["codigo_produto", "sku_seller", "nome_esperado", "link", "site_disponivel", 
-                       "vendedor_1", "preco_1", "frete_1",
-                       "vendedor_2", "preco_2", "frete_2",
-                       "vendedor_3", "preco_3", "frete_3",
-                       "status_final", "data_verificacao"]
-    colunas_presentes = [c for c in colunas_validas if c in df_save.columns]
-    df_save = df_save[colunas_presentes]
-    
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        # Limpar tabela
-        cursor.execute("DELETE FROM produtos")
-        
-        # Inserir dados usando INSERT com múltiplos valores
-        if not df_save.empty:
-            placeholders = ", ".join(["%s"] * len(colunas_presentes))
-            columns = ", ".join(colunas_presentes)
-            insert_query = f"INSERT INTO produtos ({columns}) VALUES ({placeholders})"
-            
-            # Converter DataFrame para lista de tuplas
-            data = [tuple(row) for row in df_save.values]
-            cursor.executemany(insert_query, data)
-        
-        conn.commit()
+        cursor.execute(f"SELECT tabela, versao FROM alteracoes_dados WHERE tabela IN ({', '.join(['%s'] * len(tabelas))})",
+                       tuple(tabelas))
+        versoes = dict(cursor.fetchall())
         cursor.close()
-        print(f"[OK] Produtos salvos ({len(df_save)} linhas)")
-    except Exception as e:
-        print(f"[MYSQL] Erro ao salvar produtos: {e}")
+        return tuple(versoes.get(t, 0) for t in tabelas)
     finally:
         conn.close()
 
 
 # ============================================================
-# FUNÇÕES DE HISTÓRICO (substitui ler_aba("Pagina2"))
+# MANUTENÇÃO (ANALYZE / OPTIMIZE TABLE)
 # ============================================================
 
-def ler_aba(aba: str) -> pd.DataFrame:
-    """Lê dados de uma 'aba' - para compatibilidade com código existente"""
-    criar_tabelas()
-    
-    if aba.lower() in ["pagina2", "página2", "historico"]:
-        return ler_historico()
-    elif aba.lower() in ["pagina1", "página1", "produtos"]:
-        return ler_planilha()
-    elif aba.lower() == "usuarios":
-        return ler_usuarios()
-    else:
-        print(f"[MYSQL] Aba desconhecida: {aba}")
-        return pd.DataFrame()
+# Consultas representativas cronometradas antes/depois da manutenção
+CONSULTAS_REFERENCIA = {
+    "Produto por sku_seller": "SELECT id FROM produtos WHERE sku_seller = 'x'",
+    "Último registro por SKU": "SELECT MAX(id) FROM historico GROUP BY codigo_produto",
+    "Histórico de um SKU": "SELECT * FROM historico WHERE codigo_produto = 'x' ORDER BY coletado_em",
+    "Últimos registros (latest)": "SELECT COUNT(*) FROM historico_latest",
+}
 
+# Fração de espaço livre (DATA_FREE) a partir da qual a tabela é recriada com OPTIMIZE TABLE
+LIMITE_ESPACO_LIVRE = 0.2
 
-def ler_historico(limit: int = 0) -> pd.DataFrame:
-    """
-    Lê a tabela histórico e retorna como DataFrame.
-    limit=0 retorna todos os dados (para relatórios)
-    limit>0 retorna apenas os N mais recentes (para telas de análise rápida)
-    """
-    conn = get_connection()
-    
+
+def _tamanhos_tabelas(cursor) -> dict:
+    """{tabela: (bytes de dados + índices, bytes livres)} do banco atual"""
     try:
-        if limit > 0:
-            # Query com limite para carregamento rápido
-            df = pd.read_sql_query(f"""
-                SELECT * FROM historico 
-                ORDER BY id DESC 
-                LIMIT {limit}
-            """, conn)
-        else:
-            # Sem limite - para relatórios completos
-            df = pd.read_sql_query("SELECT * FROM historico ORDER BY id DESC", conn)
-        return df
-    except Exception as e:
-        print(f"[MYSQL] Erro ao ler histórico: {e}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+        cursor.execute("SET SESSION information_schema_stats_expiry = 0")  # MySQL 8: sem estatísticas em cache
+    except Error:
+        pass
+    cursor.execute("""
+        SELECT TABLE_NAME, DATA_LENGTH + INDEX_LENGTH, DATA_FREE FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+    """)
+    return {tabela: (int(usado or 0), int(livre or 0)) for tabela, usado, livre in cursor.fetchall()}
+
+
+def _tempos_consultas(cursor) -> dict:
+    """Tempo (ms) de cada consulta de referência"""
+    tempos = {}
+    for nome, sql in CONSULTAS_REFERENCIA.items():
+        inicio = time.perf_counter()
+        try:
+            cursor.execute(sql)
+            cursor.fetchall()
+            tempos[nome] = (time.perf_counter() - inicio) * 1000
+        except Error:
+            tempos[nome] = None
+    return tempos
 
 
-def atualizar_historico(df_atual: pd.DataFrame, dias_limite: int = 180):
+def manutencao_banco(completa: bool = False) -> dict:
     """
-    Adiciona registros ao histórico.
-    Registros com mais de 6 meses (180 dias) são movidos para backup.
+    ANALYZE TABLE em todas as tabelas e OPTIMIZE TABLE (recria a tabela e
+    devolve o espaço livre) nas que têm mais de LIMITE_ESPACO_LIVRE de espaço
+    livre, ou em todas com completa=True. O InnoDB faz o checkpoint do redo
+    log sozinho: não há equivalente ao wal_checkpoint do SQLite.
+    Retorna tamanhos, tempos das consultas de referência (antes/depois) e
+    duração de cada etapa.
     """
     criar_tabelas()
-    
-    if df_atual is None or df_atual.empty:
-        print("[AVISO] Nenhum dado para salvar no historico.")
-        return
-    
     conn = get_connection()
-    
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Preparar dados para insercao
-        df_envio = df_atual.copy()
-        df_envio["Data Coleta"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        
-        # Mapear colunas
-        col_map = {
-            "codigo_produto": "codigo_produto",
-            "nome_esperado": "nome_esperado",
-            "link": "link",
-            "Site Disponivel": "site_disponivel",
-            "Vendedor 1": "vendedor_1",
-            "Preco 1": "preco_1",
-            "Frete 1": "frete_1",
-            "Vendedor 2": "vendedor_2",
-            "Preco 2": "preco_2",
-            "Frete 2": "frete_2",
-            "Vendedor 3": "vendedor_3",
-            "Preco 3": "preco_3",
-            "Frete 3": "frete_3",
-            "Status Final": "status_final",
-            "Data Verificacao": "data_verificacao",
-            "Data Coleta": "data_coleta"
+        cursor = conn.cursor()
+        tamanhos = _tamanhos_tabelas(cursor)
+        relatorio = {
+            "banco": _load_mysql_config()["database"],
+            "tamanho_antes": sum(usado + livre for usado, livre in tamanhos.values()),
+            "consultas_antes": _tempos_consultas(cursor),
+            "etapas": {},
         }
-        df_envio = df_envio.rename(columns=col_map)
-        
-        # Manter apenas colunas validas
-        colunas_validas = ["codigo_produto", "nome_esperado", "link", "site_disponivel", 
-                          "vendedor_1", "preco_1", "frete_1",
-                          "vendedor_2", "preco_2", "frete_2",
-                          "vendedor_3", "preco_3", "frete_3",
-                          "status_final", "data_verificacao", "data_coleta"]
-        colunas_presentes = [c for c in colunas_validas if c in df_envio.columns]
-        df_envio = df_envio[colunas_presentes]
-        
-        # Inserir no histórico
-        if not df_envio.empty:
-            placeholders = ", ".join(["%s"] * len(colunas_presentes))
-            columns = ", ".join(colunas_presentes)
-            insert_query = f"INSERT INTO historico ({columns}) VALUES ({placeholders})"
-            data = [tuple(row) for row in df_envio.values]
-            cursor.executemany(insert_query, data)
-            conn.commit()
-        
-        print(f"[OK] Historico atualizado com {len(df_envio)} linhas")
         
-        # BACKUP E LIMPEZA de registros com mais de 6 meses
-        limite = datetime.now() - timedelta(days=dias_limite)
+        otimizar = [tabela for tabela, (usado, livre) in tamanhos.items()
+                    if completa or (livre and livre > LIMITE_ESPACO_LIVRE * (usado + livre))]
+        inicio = time.perf_counter()
+        for tabela in otimizar:
+            cursor.execute(f"OPTIMIZE TABLE `{tabela}`")
+            cursor.fetchall()
+        if otimizar:
+            relatorio["etapas"][f"OPTIMIZE TABLE ({len(otimizar)} tabelas)"] = time.perf_counter() - inicio
         
-        cursor.execute("SELECT * FROM historico")
-        rows = cursor.fetchall()
-        
-        ids_para_backup = []
-        registros_backup = []
-        data_backup = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        
-        for row in rows:
-            try:
-                data_coleta = row.get("data_coleta")
-                if data_coleta:
-                    data = datetime.strptime(data_coleta, "%d/%m/%Y %H:%M:%S")
-                    if data < limite:
-                        ids_para_backup.append(row["id"])
-                        reg = dict(row)
-                        reg.pop("id", None)
-                        reg["data_backup"] = data_backup
-                        registros_backup.append(reg)
-            except:
-                pass
-        
-        if registros_backup:
-            # Mover para tabela de backup
-            colunas_backup = list(registros_backup[0].keys())
-            placeholders = ", ".join(["%s"] * len(colunas_backup))
-            columns = ", ".join(colunas_backup)
-            insert_query = f"INSERT INTO historico_backup ({columns}) VALUES ({placeholders})"
-            data = [tuple(reg.values()) for reg in registros_backup]
-            cursor.executemany(insert_query, data)
-            
-            # Remover do histórico principal
-            placeholders = ",".join(["%s" for _ in ids_para_backup])
-            cursor.execute(f"DELETE FROM historico WHERE id IN ({placeholders})", ids_para_backup)
-            conn.commit()
-            print(f"[BACKUP] {len(registros_backup)} registros movidos para backup (> 6 meses)")
+        inicio = time.perf_counter()
+        for tabela in tamanhos:
+            if tabela not in otimizar:  # OPTIMIZE já atualiza as estatísticas
+                cursor.execute(f"ANALYZE TABLE `{tabela}`")
+                cursor.fetchall()
+        relatorio["etapas"]["ANALYZE TABLE"] = time.perf_counter() - inicio
         
+        relatorio["tamanho_depois"] = sum(usado + livre for usado, livre in _tamanhos_tabelas(cursor).values())
+        relatorio["consultas_depois"] = _tempos_consultas(cursor)
+        relatorio["arquivo_parquet"] = arquivo_historico.tamanho_total(_pasta_arquivo())
         cursor.close()
-        
-    except Exception as e:
-        print(f"[MYSQL] Erro ao atualizar histórico: {e}")
+        return relatorio
     finally:
         conn.close()
 
 
 # ============================================================
-# FUNÇÕES DE USUÁRIOS (substitui google sheets para login)
+# FUNÇÕES DE PRODUTOS (substitui ler_planilha/salvar_planilha)
 # ============================================================
 
-def ler_usuarios() -> pd.DataFrame:
-    """Lê a tabela usuários"""
+def ler_planilha() -> pd.DataFrame:
+    """Lê a tabela produtos e retorna como DataFrame"""
+    criar_tabelas()
     conn = get_connection()
+    
     try:
-        df = pd.read_sql_query("SELECT * FROM usuarios", conn)
-        return df
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM produtos")
+        df = esquema.ler_cursor(cursor, "produtos")
+        cursor.close()
+        return esquema.exibir(_precos_para_exibicao(df), "produtos")
     except Exception as e:
-        print(f"[MYSQL] Erro ao ler usuários: {e}")
+        print(f"[MYSQL] Erro ao ler produtos: {e}")
         return pd.DataFrame()
     finally:
         conn.close()
 
 
-def verificar_usuario(usuario: str, senha: str):
-    """Verifica credenciais do usuário"""
+def contar_produtos() -> int:
+    """Retorna a quantidade de produtos cadastrados"""
     criar_tabelas()
-    criar_usuario_padrao()
-    
     conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
+    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM usuarios WHERE usuario = %s", (usuario,))
-        row = cursor.fetchone()
-        
-        if not row:
-            return False, "Usuário inexistente. Crie uma nova conta.", None
+        cursor.execute("SELECT COUNT(*) FROM produtos")
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"[MYSQL] Erro ao contar produtos: {e}")
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def ler_pagina_produtos(apos_id: int = 0, tamanho: int = 1000) -> pd.DataFrame:
+    """Uma página de produtos: até tamanho linhas com id > apos_id, em ordem de id"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM produtos WHERE id > %s ORDER BY id LIMIT %s", (int(apos_id), int(tamanho)))
+        df = esquema.ler_cursor(cursor, "produtos")
+        cursor.close()
+    finally:
+        conn.close()
+    return esquema.exibir(_precos_para_exibicao(df), "produtos")
+
+
+def ler_produtos_paginado(tamanho_pagina: int = 1000):
+    """
+    Lê a tabela produtos em páginas (paginação por id, sem OFFSET).
+    Cada página pega e devolve sua própria conexão do pool, então o gerador
+    pode ser consumido de threads diferentes (ex: asyncio.to_thread).
+    """
+    criar_tabelas()
+    ultimo_id = 0
+    
+    while True:
+        df = ler_pagina_produtos(ultimo_id, tamanho_pagina)
+        if df.empty:
+            return
+        
+        ultimo_id = int(df["id"].iloc[-1])
+        yield df
+        
+        if len(df) < tamanho_pagina:
+            return
+
+
+def _atualizar_produtos(cursor, df: pd.DataFrame) -> int:
+    """UPDATE por id dos resultados da coleta, na transação corrente (sem commit)"""
+    if df is None or df.empty or "id" not in df.columns:
+        return 0
+    
+    colunas = [c for c in ["Site Disponivel",
+                           "Vendedor 1", "Preco 1", "Frete 1",
+                           "Vendedor 2", "Preco 2", "Frete 2",
+                           "Vendedor 3", "Preco 3", "Frete 3",
+                           "Status Final", "Data Verificacao"] if c in df.columns]
+    if not colunas:
+        return 0
+    
+    df_db = _precos_para_centavos(esquema.para_banco(df[colunas + ["id"]], "produtos"))
+    colunas_db = [c for c in df_db.columns if c != "id"]
+    sets = ", ".join(f"{c} = %s" for c in colunas_db)
+    cursor.executemany(f"UPDATE produtos SET {sets} WHERE id = %s", list(_linhas_para_insert(df_db[colunas_db + ["id"]])))
+    registrar_alteracao(cursor, "produtos")
+    return len(df_db)
+
+
+def atualizar_produtos_lote(df: pd.DataFrame) -> None:
+    """Atualiza, pelo id, os resultados da coleta de um lote de produtos"""
+    if df is None or df.empty or "id" not in df.columns:
+        return
+    
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        _atualizar_produtos(cursor, df)
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        print(f"[MYSQL] Erro ao atualizar lote de produtos: {e}")
+    finally:
+        conn.close()
+
+
+def _normalizar_valor(v):
+    """Normaliza um valor para comparação com o que está gravado no banco"""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    return str(v)
+
+
+def _diferenca_produtos(atuais: dict, df_save: pd.DataFrame, colunas: list):
+    """
+    Compara o DataFrame com as linhas atuais do banco (id -> valores).
+    Retorna (alteradas, novas, ids_removidos): apenas linhas cujo conteúdo mudou
+    são devolvidas para upsert; linhas sem id são novas.
+    """
+    alteradas = []
+    novas = []
+    ids_vistos = set()
+    
+    for row in df_save[["id"] + colunas].itertuples(index=False):
+        valores = tuple(_normalizar_valor(v) for v in row[1:])
+        if pd.isna(row[0]):
+            novas.append(valores)
+            continue
+        
+        row_id = int(row[0])
+        ids_vistos.add(row_id)
+        if atuais.get(row_id) != valores:
+            alteradas.append((row_id,) + valores)
+    
+    ids_removidos = [i for i in atuais if i not in ids_vistos]
+    return alteradas, novas, ids_removidos
+
+
+def _salvar_produtos(cursor, df: pd.DataFrame) -> str:
+    """Grava produtos (ver salvar_planilha) na transação corrente, sem commit; retorna o resumo"""
+    # Só as colunas conhecidas, já com os nomes do banco
+    df_save = _precos_para_centavos(esquema.para_banco(df, "produtos"))
+    colunas_presentes = [c for c in esquema.colunas("produtos") if c in df_save.columns]
+    
+    if "id" not in df_save.columns:
+        # Sem chave: limpar tabela e inserir novos dados
+        cursor.execute("DELETE FROM produtos")
+        if not df_save.empty:
+            placeholders = ", ".join(["%s"] * len(colunas_presentes))
+            columns = ", ".join(colunas_presentes)
+            insert_query = f"INSERT INTO produtos ({columns}) VALUES ({placeholders})"
+            data = [tuple(_normalizar_valor(v) for v in row) for row in df_save[colunas_presentes].values]
+            cursor.executemany(insert_query, data)
+        registrar_alteracao(cursor, "produtos")
+        return f"{len(df_save)} linhas"
+    
+    colunas_sql = ", ".join(colunas_presentes)
+    cursor.execute(f"SELECT id, {colunas_sql} FROM produtos")
+    atuais = {
+        row[0]: tuple(_normalizar_valor(v) for v in row[1:])
+        for row in cursor.fetchall()
+    }
+    alteradas, novas, ids_removidos = _diferenca_produtos(atuais, df_save, colunas_presentes)
+    
+    if alteradas:
+        placeholders = ", ".join(["%s"] * (len(colunas_presentes) + 1))
+        updates = ", ".join(f"{c} = VALUES({c})" for c in colunas_presentes)
+        cursor.executemany(f"""
+            INSERT INTO produtos (id, {colunas_sql}) VALUES ({placeholders})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, alteradas)
+    
+    if novas:
+        placeholders = ", ".join(["%s"] * len(colunas_presentes))
+        cursor.executemany(f"INSERT INTO produtos ({colunas_sql}) VALUES ({placeholders})", novas)
+    
+    for i in range(0, len(ids_removidos), 500):
+        lote = ids_removidos[i:i + 500]
+        cursor.execute(f"DELETE FROM produtos WHERE id IN ({','.join(['%s'] * len(lote))})", lote)
+    
+    if alteradas or novas or ids_removidos:
+        registrar_alteracao(cursor, "produtos")
+    return (f"{len(alteradas)} alterados, {len(novas)} novos, "
+            f"{len(ids_removidos)} removidos, {len(df_save) - len(alteradas) - len(novas)} sem mudança")
+
+
+def salvar_planilha(df: pd.DataFrame) -> None:
+    """
+    Salva DataFrame na tabela produtos.
+    
+    Se o DataFrame traz a coluna id (como retornado por ler_planilha), faz um
+    UPSERT pela chave primária gravando apenas as linhas que mudaram, inserindo
+    as novas e removendo as que saíram. Sem id, substitui a tabela inteira.
+    """
+    criar_tabelas()
+    
+    if df is None or df.empty:
+        print("[AVISO] DataFrame vazio, nada para salvar.")
+        return
+    
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        resumo = _salvar_produtos(cursor, df)
+        conn.commit()
+        cursor.close()
+        print(f"[OK] Produtos salvos ({resumo})")
+    except Exception as e:
+        conn.rollback()
+        print(f"[MYSQL] Erro ao salvar produtos: {e}")
+    finally:
+        conn.close()
+
+
+# ============================================================
+# FUNÇÕES DE HISTÓRICO (substitui ler_aba("Pagina2"))
+# ============================================================
+
+def ler_aba(aba: str) -> pd.DataFrame:
+    """Lê dados de uma 'aba' - para compatibilidade com código existente"""
+    criar_tabelas()
+    
+    if aba.lower() in ["pagina2", "página2", "historico"]:
+        return ler_historico()
+    elif aba.lower() in ["pagina1", "página1", "produtos"]:
+        return ler_planilha()
+    elif aba.lower() == "usuarios":
+        return ler_usuarios()
+    else:
+        print(f"[MYSQL] Aba desconhecida: {aba}")
+        return pd.DataFrame()
+
+
+# ============================================================
+# PARTICIONAMENTO MENSAL DO HISTÓRICO
+# ============================================================
+# historico é particionado por RANGE COLUMNS(coletado_em), uma partição por
+# mês (pAAAAMM), mais p000000 (registros sem data) e pfuturo (MAXVALUE).
+# Consultas com filtro em coletado_em só leem as partições do período e a
+# retenção descarta meses inteiros com DROP PARTITION.
+
+PARTICAO_SEM_DATA = "000000"
+
+
+def _chave_particao(momento: datetime) -> str:
+    return momento.strftime("%Y%m")
+
+
+def _inicio_mes(chave: str) -> str:
+    return f"{chave[:4]}-{chave[4:]}-01 00:00:00"
+
+
+def _proximo_mes(chave: str) -> str:
+    ano, mes = int(chave[:4]), int(chave[4:])
+    return f"{ano + 1}01" if mes == 12 else f"{ano}{mes + 1:02d}"
+
+
+def _meses_entre(chave_inicial: str, chave_final: str) -> list:
+    """Chaves AAAAMM de chave_inicial até chave_final (inclusive)"""
+    chaves = []
+    chave = chave_inicial
+    while chave <= chave_final:
+        chaves.append(chave)
+        chave = _proximo_mes(chave)
+    return chaves
+
+
+def _definir_particoes(chaves: list) -> str:
+    """Cláusulas PARTITION dos meses informados, terminando em pfuturo"""
+    partes = [f"PARTITION p{chave} VALUES LESS THAN ('{_inicio_mes(_proximo_mes(chave))}')" for chave in chaves]
+    partes.append("PARTITION pfuturo VALUES LESS THAN (MAXVALUE)")
+    return ",\n            ".join(partes)
+
+
+def clausulas_particoes(chave_inicial: str, chave_final: str) -> str:
+    """Partições de um histórico novo: p000000, um mês de chave_inicial a chave_final e pfuturo"""
+    chaves = _meses_entre(chave_inicial, chave_final)
+    return (f"PARTITION p{PARTICAO_SEM_DATA} VALUES LESS THAN ('{_inicio_mes(chaves[0])}'),\n"
+            f"            {_definir_particoes(chaves)}")
+
+
+def _particoes_historico(cursor) -> list:
+    """Chaves AAAAMM das partições mensais de historico (vazia se não particionado)"""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'historico' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [row[0][1:] for row in cursor.fetchall() if row[0] != "pfuturo"]
+
+
+def _particionar_historico(cursor):
+    """
+    Migração: converte historico em tabela particionada por mês.
+    A chave de partição precisa fazer parte da chave primária, por isso
+    coletado_em passa a ser NOT NULL e a PK vira (id, coletado_em).
+    """
+    if _particoes_historico(cursor):
+        return
+    
+    agora = datetime.now()
+    cursor.execute("SELECT MIN(coletado_em) FROM historico WHERE coletado_em > '1970-01-01 00:00:00'")
+    primeiro = cursor.fetchone()[0] or agora
+    chaves = _meses_entre(_chave_particao(primeiro), _proximo_mes(_chave_particao(agora)))
+    
+    cursor.execute("UPDATE historico SET coletado_em = '1970-01-01 00:00:00' WHERE coletado_em IS NULL")
+    cursor.execute("""
+        ALTER TABLE historico
+            MODIFY coletado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, coletado_em)
+    """)
+    cursor.execute(f"""
+        ALTER TABLE historico PARTITION BY RANGE COLUMNS(coletado_em) (
+            {clausulas_particoes(chaves[0], chaves[-1])}
+        )
+    """)
+    print(f"[MIGRACAO] historico particionado por mês ({len(chaves)} partições)")
+
+
+def _garantir_particoes(cursor, momento: datetime):
+    """Cria (dividindo pfuturo) as partições até o mês seguinte ao da coleta"""
+    chaves = [c for c in _particoes_historico(cursor) if c != PARTICAO_SEM_DATA]
+    if not chaves:
+        return
+    
+    chave_alvo = _proximo_mes(_chave_particao(momento))
+    if chaves[-1] >= chave_alvo:
+        return
+    
+    novas = _meses_entre(_proximo_mes(chaves[-1]), chave_alvo)
+    cursor.execute(f"""
+        ALTER TABLE historico REORGANIZE PARTITION pfuturo INTO (
+            {_definir_particoes(novas)}
+        )
+    """)
+
+
+def ler_historico(limit: int = 0, *, data_inicio: Optional[datetime] = None,
+                  data_fim: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Lê a tabela histórico e retorna como DataFrame.
+    limit=0 retorna todos os dados (para relatórios)
+    limit>0 retorna apenas os N mais recentes (para telas de análise rápida)
+    data_inicio/data_fim (só por nome; data_inicio <= coletado_em < data_fim)
+    restringem a leitura às partições mensais do período.
+    """
+    return consultar_historico(data_inicio=data_inicio, data_fim=data_fim, limite=limit)
+
+
+def _montar_consulta_historico(colunas, data_inicio, data_fim, skus, vendedores, limite, antes_id=None):
+    """Monta (sql, params) da consulta ao histórico"""
+    permitidas = ["id"] + COLUNAS_HISTORICO
+    if colunas:
+        invalidas = [c for c in colunas if c not in permitidas]
+        if invalidas:
+            raise ValueError(f"Colunas inexistentes no histórico: {invalidas}")
+        projecao = ", ".join(colunas)
+    else:
+        projecao = "*"
+    
+    filtros = []
+    params = []
+    if data_inicio is not None:
+        filtros.append("coletado_em >= %s")
+        params.append(data_inicio)
+    if data_fim is not None:
+        filtros.append("coletado_em < %s")
+        params.append(data_fim)
+    if skus:
+        skus = list(skus)
+        filtros.append(f"codigo_produto IN ({', '.join(['%s'] * len(skus))})")
+        params += skus
+    if vendedores:
+        vendedores = list(vendedores)
+        marcadores = ", ".join(["%s"] * len(vendedores))
+        filtros.append("(" + " OR ".join(f"vendedor_{i} IN ({marcadores})" for i in (1, 2, 3)) + ")")
+        params += vendedores * 3
+    if antes_id is not None:
+        filtros.append("id < %s")
+        params.append(int(antes_id))
+    
+    sql = f"SELECT {projecao} FROM historico"
+    if filtros:
+        sql += " WHERE " + " AND ".join(filtros)
+    sql += " ORDER BY id DESC"
+    if limite > 0:
+        sql += f" LIMIT {int(limite)}"
+    return sql, params
+
+
+def consultar_historico(colunas: Optional[list] = None,
+                        data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                        skus: Optional[list] = None, vendedores: Optional[list] = None,
+                        chunksize: Optional[int] = None, limite: int = 0,
+                        precos_em_centavos: bool = False, antes_id: Optional[int] = None):
+    """
+    Consulta o histórico com projeção e filtros aplicados no banco.
+    
+    colunas: nomes das colunas no banco (ex: ["codigo_produto", "preco_1", "coletado_em"]);
+             None traz todas.
+    data_inicio/data_fim: data_inicio <= coletado_em < data_fim (poda de partições).
+    skus: valores de codigo_produto. vendedores: vendedor em qualquer das 3 posições.
+    limite: > 0 retorna apenas os N registros mais recentes.
+    antes_id: só registros com id < antes_id; com limite, pagina do mais
+              recente para o mais antigo (usado pelo modo serviço).
+    chunksize: se informado, retorna um iterador de DataFrames com até chunksize
+               linhas cada, lidos de um cursor não bufferizado (as linhas vêm do
+               servidor conforme o consumo); senão, um único DataFrame.
+    precos_em_centavos: True devolve preco_N/frete_N como gravados (centavos
+                        inteiros, com frete_tipo_N); False converte para reais/"-".
+    """
+    if colunas and not precos_em_centavos:
+        # O texto do frete ("Gratis"/"Pago") depende do tipo
+        colunas = list(colunas) + [f"frete_tipo_{c[-1]}" for c in colunas
+                                   if c in ("frete_1", "frete_2", "frete_3") and f"frete_tipo_{c[-1]}" not in colunas]
+    sql, params = _montar_consulta_historico(colunas, data_inicio, data_fim, skus, vendedores, limite, antes_id)
+    
+    if chunksize:
+        return _consultar_historico_em_blocos(sql, params, chunksize, precos_em_centavos)
+    
+    conn = get_connection()
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        df = esquema.ler_cursor(cursor, "historico")
+        cursor.close()
+        return df if precos_em_centavos else _precos_para_exibicao(df)
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler histórico: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+def consultar_historico_com_arquivo(colunas: Optional[list] = None,
+                                    data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                                    skus: Optional[list] = None, vendedores: Optional[list] = None,
+                                    precos_em_centavos: bool = False) -> pd.DataFrame:
+    """
+    Como consultar_historico, mas junta o arquivo Parquet (meses que já saíram
+    pela retenção) ao histórico vivo, para relatórios de períodos longos.
+    Do arquivo só são lidos os meses do período e as colunas pedidas.
+    """
+    if colunas and not precos_em_centavos:
+        colunas = list(colunas) + [f"frete_tipo_{c[-1]}" for c in colunas
+                                   if c in ("frete_1", "frete_2", "frete_3") and f"frete_tipo_{c[-1]}" not in colunas]
+    
+    df_vivo = consultar_historico(colunas, data_inicio, data_fim, skus, vendedores, precos_em_centavos=True)
+    df_arquivo = arquivo_historico.ler(_pasta_arquivo(), colunas, data_inicio, data_fim, skus, vendedores)
+    df = df_vivo if df_arquivo.empty else pd.concat([df_arquivo, df_vivo], ignore_index=True)
+    return df if precos_em_centavos else _precos_para_exibicao(df)
+
+
+def _consultar_historico_em_blocos(sql: str, params: list, chunksize: int, precos_em_centavos: bool):
+    """Gerador de consultar_historico(chunksize=...) sobre cursor não bufferizado"""
+    conn = get_connection()
+    cursor = conn.cursor(buffered=False)
+    
+    try:
+        cursor.execute(sql, params)
+        
+        while True:
+            linhas = cursor.fetchmany(chunksize)
+            if not linhas:
+                break
+            bloco = esquema.ler_cursor(cursor, "historico", linhas)
+            yield bloco if precos_em_centavos else _precos_para_exibicao(bloco)
+    finally:
+        # Interrompido no meio: descartar o restante antes de devolver a conexão ao pool
+        try:
+            conn.consume_results()
+        except Exception:
+            pass
+        cursor.close()
+        conn.close()
+
+
+def _gravar_historico(cursor, df_atual: pd.DataFrame, data_coleta: Optional[datetime] = None,
+                      ofertas: Optional[pd.DataFrame] = None) -> int:
+    """
+    Insere a coleta no histórico com rollup diário, último registro por SKU e
+    ofertas, tudo na transação corrente (sem commit). A partição do mês já
+    deve existir (_garantir_particoes). Retorna as linhas inseridas.
+    """
+    # Só as colunas do histórico, já com os nomes do banco
+    df_envio = esquema.para_banco(df_atual, "historico", extras=())
+    momento = data_coleta or datetime.now()
+    df_envio["data_coleta"] = momento.strftime("%d/%m/%Y %H:%M:%S")
+    df_envio["coletado_em"] = momento.strftime("%Y-%m-%d %H:%M:%S")
+    df_envio = _precos_para_centavos(df_envio)
+    
+    if df_envio.empty:
+        return 0
+    inserir_em_massa(cursor, "historico", df_envio)
+    # Rollup diário e último registro por SKU na mesma transação
+    _atualizar_historico_diario(cursor, df_envio)
+    _atualizar_historico_latest(cursor, df_envio)
+    if ofertas is not None:
+        _inserir_ofertas(cursor, ofertas, momento)
+    registrar_alteracao(cursor, "historico")
+    return len(df_envio)
+
+
+def atualizar_historico(df_atual: pd.DataFrame, dias_limite: int = 180,
+                        retencao: bool = True, data_coleta: Optional[datetime] = None,
+                        ofertas: Optional[pd.DataFrame] = None):
+    """
+    Adiciona registros ao histórico.
+    Registros com mais de 6 meses (180 dias) são movidos para backup.
+    
+    retencao=False apenas insere (usado pela coleta em streaming, que aplica
+    a retenção uma única vez no final via aplicar_retencao_historico).
+    data_coleta permite que todas as páginas de uma mesma execução
+    compartilhem o mesmo carimbo de coleta.
+    ofertas: todas as ofertas coletadas (uma linha por vendedor, ver
+    COLUNAS_OFERTAS), gravadas em ofertas na mesma transação.
+    """
+    criar_tabelas()
+    
+    if df_atual is None or df_atual.empty:
+        print("[AVISO] Nenhum dado para salvar no historico.")
+        return
+    
+    conn = get_connection()
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        
+        # Garantir a partição do mês da coleta
+        cursor_ddl = conn.cursor()
+        _garantir_particoes(cursor_ddl, data_coleta or datetime.now())
+        cursor_ddl.close()
+        
+        linhas = _gravar_historico(cursor, df_atual, data_coleta, ofertas)
+        conn.commit()
+        print(f"[OK] Historico atualizado com {linhas} linhas")
+        
+        if retencao:
+            _mover_historico_para_backup(conn, dias_limite)
+            _aplicar_retencao_ofertas(conn, dias_limite)
+        
+        cursor.close()
+        
+    except Exception as e:
+        print(f"[MYSQL] Erro ao atualizar histórico: {e}")
+    finally:
+        conn.close()
+
+
+# Colunas copiadas do histórico para o backup
+COLUNAS_HISTORICO = esquema.colunas("historico")
+TAMANHO_LOTE_RETENCAO = 5000
+
+
+# ============================================================
+# SESSÃO DE GRAVAÇÃO EM MASSA (uma conexão, uma transação)
+# ============================================================
+
+class SessaoEmMassa:
+    """
+    Gravações de várias etapas na mesma transação (ver sessao_em_massa):
+    nada é confirmado até o fim do bloco with, e uma falha desfaz todas.
+    inserir/upsert/excluir só aceitam tabelas e colunas de esquema (os nomes
+    vão no SQL e, pelo serviço de dados, chegam da rede).
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor(dictionary=True)
+        self.alteradas = set()  # Tabelas com contador a incrementar no commit
+    
+    def inserir(self, tabela: str, df: pd.DataFrame) -> int:
+        """INSERT das linhas (colunas do DataFrame = colunas da tabela)"""
+        esquema.conferir_colunas(tabela, df.columns)
+        self.alteradas.add(tabela)
+        return inserir_em_massa(self.cursor, tabela, df)
+    
+    def upsert(self, tabela: str, df: pd.DataFrame, chave: str = "id", ao_inserir: Optional[dict] = None) -> tuple:
+        """
+        Atualiza pela coluna chave as linhas que já existem na tabela e insere
+        as demais (com os valores extras de ao_inserir). A chave não precisa ser
+        única: todas as linhas com o mesmo valor são atualizadas.
+        Retorna (atualizadas, inseridas).
+        """
+        esquema.conferir_colunas(tabela, [chave, *df.columns, *(ao_inserir or {})])
+        if df.empty:
+            return 0, 0
+        valores = list(dict.fromkeys(df[chave].to_numpy(dtype=object, na_value=None)))
+        existentes = set()
+        for i in range(0, len(valores), 500):
+            lote = valores[i:i + 500]
+            self.cursor.execute(f"SELECT {chave} FROM {tabela} WHERE {chave} IN ({', '.join(['%s'] * len(lote))})",
+                                lote)
+            existentes.update(row[chave] for row in self.cursor.fetchall())
+        
+        self.alteradas.add(tabela)
+        existe = df[chave].isin(existentes)
+        colunas = [c for c in df.columns if c != chave]
+        if existe.any() and colunas:
+            self.cursor.executemany(
+                f"UPDATE {tabela} SET {', '.join(f'{c} = %s' for c in colunas)} WHERE {chave} = %s",
+                list(_linhas_para_insert(df.loc[existe, colunas + [chave]]))
+            )
+        novas = df.loc[~existe].assign(**(ao_inserir or {}))
+        return int(existe.sum()), inserir_em_massa(self.cursor, tabela, novas)
+    
+    def excluir(self, tabela: str, coluna: str, valores: list) -> int:
+        """DELETE das linhas com coluna IN valores (em lotes de 500)"""
+        esquema.conferir_colunas(tabela, [coluna])
+        valores = list(valores)
+        removidas = 0
+        for i in range(0, len(valores), 500):
+            lote = valores[i:i + 500]
+            self.cursor.execute(f"DELETE FROM {tabela} WHERE {coluna} IN ({', '.join(['%s'] * len(lote))})", lote)
+            removidas += self.cursor.rowcount
+        self.alteradas.add(tabela)
+        return removidas
+    
+    def atualizar_produtos_lote(self, df: pd.DataFrame) -> int:
+        return _atualizar_produtos(self.cursor, df)
+    
+    def salvar_planilha(self, df: pd.DataFrame) -> str:
+        return _salvar_produtos(self.cursor, df) if df is not None and not df.empty else ""
+    
+    def atualizar_historico(self, df_atual: pd.DataFrame, data_coleta: Optional[datetime] = None,
+                            ofertas: Optional[pd.DataFrame] = None) -> int:
+        """Como atualizar_historico(retencao=False): a retenção não entra na transação"""
+        if df_atual is None or df_atual.empty:
+            return 0
+        # DDL confirma a transação em andamento no MySQL: a partição é criada em outra conexão
+        conn_ddl = get_connection()
+        try:
+            cursor_ddl = conn_ddl.cursor()
+            _garantir_particoes(cursor_ddl, data_coleta or datetime.now())
+            cursor_ddl.close()
+        finally:
+            conn_ddl.close()
+        return _gravar_historico(self.cursor, df_atual, data_coleta, ofertas)
+
+
+@contextmanager
+def sessao_em_massa():
+    """
+    Abre uma transação em uma conexão do pool e entrega uma SessaoEmMassa;
+    confirma uma única vez ao sair do bloco, ou desfaz tudo se houver exceção.
+    
+        with sessao_em_massa() as sessao:
+            sessao.atualizar_produtos_lote(df)
+            sessao.atualizar_historico(df, data_coleta=agora, ofertas=df_ofertas)
+    """
+    criar_tabelas()
+    conn = get_connection()
+    sessao = None
+    try:
+        conn.rollback()
+        conn.start_transaction()
+        sessao = SessaoEmMassa(conn)
+        yield sessao
+        for tabela in sorted(sessao.alteradas & {"produtos", "historico"}):
+            registrar_alteracao(sessao.cursor, tabela)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        if sessao is not None:
+            sessao.cursor.close()
+        conn.close()
+
+
+def aplicar_sessao(operacoes: list) -> list:
+    """
+    Executa [(método, args, kwargs), ...] da SessaoEmMassa em uma única
+    sessao_em_massa (usado pelo serviço de dados). Retorna os resultados.
+    """
+    with sessao_em_massa() as sessao:
+        resultados = []
+        for nome, args, kwargs in operacoes:
+            if nome.startswith("_") or not callable(getattr(SessaoEmMassa, nome, None)):
+                raise ValueError(f"Operação de sessão desconhecida: {nome}")
+            resultados.append(getattr(sessao, nome)(*args, **kwargs))
+        return resultados
+
+
+def _pasta_arquivo() -> Path:
+    """Pasta do histórico arquivado em Parquet ("pasta_arquivo" na seção mysql do server_config.json)"""
+    return Path(_ler_secao_mysql().get("pasta_arquivo") or os.path.join("data", "arquivo_historico"))
+
+
+def _mover_historico_para_backup(conn, dias_limite: int):
+    """
+    Move para o arquivo Parquet (ou, sem pyarrow, para historico_backup) os
+    meses inteiramente mais antigos que dias_limite: cada partição é copiada
+    e descartada com DROP PARTITION. O mês que contém a data limite é mantido
+    inteiro. Sem particionamento, cai na remoção em lotes por id.
+    """
+    if arquivo_historico.PARQUET_DISPONIVEL:
+        _arquivar_backup_existente(conn)
+    
+    cursor = conn.cursor()
+    chaves = [c for c in _particoes_historico(cursor) if c != PARTICAO_SEM_DATA]
+    if not chaves:
+        cursor.close()
+        _mover_historico_para_backup_em_lotes(conn, dias_limite)
+        return
+    
+    chave_limite = _chave_particao(datetime.now() - timedelta(days=dias_limite))
+    data_backup = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    colunas = ", ".join(COLUNAS_HISTORICO)
+    total_movidos = 0
+    particoes_removidas = 0
+    
+    # A última partição mensal nunca é removida: pfuturo depende dela
+    for chave in chaves[:-1]:
+        if chave >= chave_limite:
+            break
+        if arquivo_historico.PARQUET_DISPONIVEL:
+            # Arquivo gravado (e renomeado) antes do DROP: repetir após uma falha só regrava o mês
+            blocos = pd.read_sql_query(f"SELECT id, {colunas} FROM historico PARTITION (p{chave})", conn,
+                                       chunksize=50000)
+            total_movidos += arquivo_historico.arquivar_mes(_pasta_arquivo(), chave, blocos)
+        else:
+            cursor.execute(f"""
+                INSERT INTO historico_backup ({colunas}, data_backup)
+                SELECT {colunas}, %s FROM historico PARTITION (p{chave})
+            """, (data_backup,))
+            total_movidos += cursor.rowcount
+            conn.commit()
+        cursor.execute(f"ALTER TABLE historico DROP PARTITION p{chave}")
+        particoes_removidas += 1
+    
+    if particoes_removidas:
+        registrar_alteracao(cursor, "historico")
+        conn.commit()
+        destino = "o arquivo Parquet" if arquivo_historico.PARQUET_DISPONIVEL else "backup"
+        print(f"[BACKUP] {total_movidos} registros movidos para {destino} "
+              f"({particoes_removidas} partições mensais > {dias_limite} dias)")
+    
+    cursor.close()
+
+
+def _mover_historico_para_backup_em_lotes(conn, dias_limite: int):
+    """
+    Move registros do histórico mais antigos que dias_limite para historico_backup.
+    Tudo em SQL, em lotes ordenados por id: cada lote é copiado com
+    INSERT ... SELECT e removido com DELETE usando o mesmo filtro, e cada
+    lote é confirmado separadamente (transações curtas no InnoDB).
+    """
+    cursor = conn.cursor()
+    
+    limite = datetime.now() - timedelta(days=dias_limite)
+    data_backup = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    colunas = ", ".join(COLUNAS_HISTORICO)
+    total_movidos = 0
+    
+    while True:
+        # Maior id do próximo lote (usa o índice de coletado_em)
+        cursor.execute("""
+            SELECT MAX(id) FROM (
+                SELECT id FROM historico WHERE coletado_em < %s ORDER BY id LIMIT %s
+            ) AS lote
+        """, (limite, TAMANHO_LOTE_RETENCAO))
+        max_id = cursor.fetchone()[0]
+        if max_id is None:
+            break
+        
+        if arquivo_historico.PARQUET_DISPONIVEL:
+            lote = pd.read_sql_query(f"SELECT id, {colunas} FROM historico WHERE coletado_em < %s AND id <= %s",
+                                     conn, params=(limite, max_id))
+            # Uma parte por mês do lote, nomeada pelo primeiro id (repetir o lote regrava a mesma parte)
+            for chave, lote_mes in lote.groupby(pd.to_datetime(lote["coletado_em"]).dt.strftime("%Y%m")):
+                arquivo_historico.arquivar_mes(_pasta_arquivo(), chave, [lote_mes], parte=str(lote_mes["id"].min()))
+        else:
+            cursor.execute(f"""
+                INSERT INTO historico_backup ({colunas}, data_backup)
+                SELECT {colunas}, %s FROM historico WHERE coletado_em < %s AND id <= %s
+            """, (data_backup, limite, max_id))
+        cursor.execute("DELETE FROM historico WHERE coletado_em < %s AND id <= %s", (limite, max_id))
+        total_movidos += cursor.rowcount
+        registrar_alteracao(cursor, "historico")
+        conn.commit()
+    
+    if total_movidos:
+        destino = "o arquivo Parquet" if arquivo_historico.PARQUET_DISPONIVEL else "backup"
+        print(f"[BACKUP] {total_movidos} registros movidos para {destino} (> {dias_limite} dias)")
+    
+    cursor.close()
+
+
+_SQL_MES_BACKUP = "COALESCE(DATE_FORMAT(coletado_em, '%Y%m'), '000000')"
+
+
+def _arquivar_backup_existente(conn):
+    """Esvazia historico_backup (retenções anteriores) para o arquivo Parquet, mês a mês"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM historico_backup LIMIT 1")
+    if not cursor.fetchall():
+        cursor.close()
+        return
+    
+    colunas = ", ".join(COLUNAS_HISTORICO)
+    total = 0
+    cursor.execute(f"SELECT DISTINCT {_SQL_MES_BACKUP} FROM historico_backup")
+    for (chave,) in cursor.fetchall():
+        blocos = pd.read_sql_query(f"SELECT id, {colunas} FROM historico_backup WHERE {_SQL_MES_BACKUP} = %s",
+                                   conn, params=(chave,), chunksize=50000)
+        total += arquivo_historico.arquivar_mes(_pasta_arquivo(), chave, blocos, parte="backup")
+        cursor.execute(f"DELETE FROM historico_backup WHERE {_SQL_MES_BACKUP} = %s", (chave,))
+        conn.commit()
+    cursor.close()
+    print(f"[BACKUP] {total} registros de historico_backup movidos para o arquivo Parquet")
+
+
+def aplicar_retencao_historico(dias_limite: int = 180) -> None:
+    """Aplica apenas a retenção do histórico (backup + limpeza), sem inserir dados"""
+    criar_tabelas()
+    conn = get_connection()
+    try:
+        _mover_historico_para_backup(conn, dias_limite)
+        _aplicar_retencao_ofertas(conn, dias_limite)
+    except Exception as e:
+        print(f"[MYSQL] Erro ao aplicar retenção do histórico: {e}")
+    finally:
+        conn.close()
+
+
+# ============================================================
+# ROLLUP DIÁRIO DO HISTÓRICO
+# ============================================================
+# historico_diario: min/max/soma/quantidade/último preço por (sku, vendedor, dia)
+# historico_diario_buybox: vencedor do buybox (vendedor_1 da última coleta) por (sku, dia)
+# Atualizado a cada atualizar_historico com os agregados do lote (upsert),
+# então relatórios de períodos longos leem o rollup em vez do histórico bruto.
+
+def _agregar_diario(df: pd.DataFrame):
+    """
+    Reduz linhas do histórico (colunas do banco, preços em centavos) aos
+    agregados diários. Retorna (ofertas, buybox) prontos para o upsert; o
+    rollup fica em reais.
+    """
+    df = df[df["coletado_em"].notna() & df["codigo_produto"].notna()]
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    
+    # Uma linha por oferta: (sku, vendedor, preço, posição)
+    partes = []
+    for pos in (1, 2, 3):
+        v_col, p_col = f"vendedor_{pos}", f"preco_{pos}"
+        if v_col not in df.columns or p_col not in df.columns:
+            continue
+        parte = pd.DataFrame({
+            "codigo_produto": df["codigo_produto"].astype(str),
+            "vendedor": df[v_col],
+            "preco": pd.to_numeric(df[p_col], errors="coerce") / 100,
+            "coletado_em": df["coletado_em"].astype(str),
+            "buybox": int(pos == 1),
+        })
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame(), pd.DataFrame()
+    
+    ofertas = pd.concat(partes, ignore_index=True)
+    ofertas = ofertas[ofertas["vendedor"].notna() & ~ofertas["vendedor"].isin(["-", ""]) & ofertas["preco"].notna()]
+    if ofertas.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    ofertas["dia"] = ofertas["coletado_em"].str[:10]
+    ofertas = ofertas.sort_values("coletado_em", kind="stable")
+    
+    grupos = ofertas.groupby(["codigo_produto", "vendedor", "dia"], sort=False)
+    agregado = grupos.agg(
+        preco_min=("preco", "min"),
+        preco_max=("preco", "max"),
+        preco_soma=("preco", "sum"),
+        ofertas=("preco", "size"),
+        vezes_buybox=("buybox", "sum"),
+        preco_ultimo=("preco", "last"),
+        coletado_em=("coletado_em", "last"),
+    ).reset_index()
+    
+    buybox = (ofertas[ofertas["buybox"] == 1]
+              .groupby(["codigo_produto", "dia"], sort=False)
+              .agg(vendedor=("vendedor", "last"), preco=("preco", "last"), coletado_em=("coletado_em", "last"))
+              .reset_index())
+    
+    return agregado, buybox
+
+
+def _atualizar_historico_diario(cursor, df_envio: pd.DataFrame):
+    """Soma os agregados do lote ao rollup (upsert por chave)"""
+    if not all(c in df_envio.columns for c in ("codigo_produto", "coletado_em")):
+        return
+    agregado, buybox = _agregar_diario(df_envio)
+    
+    # As atribuições do ON DUPLICATE KEY UPDATE são feitas em ordem:
+    # preco_ultimo precisa comparar com coletado_em antes de ele ser atualizado
+    if not agregado.empty:
+        cursor.executemany("""
+            INSERT INTO historico_diario (codigo_produto, vendedor, dia, preco_min, preco_max,
+                                          preco_soma, ofertas, vezes_buybox, preco_ultimo, coletado_em)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                preco_min = LEAST(preco_min, VALUES(preco_min)),
+                preco_max = GREATEST(preco_max, VALUES(preco_max)),
+                preco_soma = preco_soma + VALUES(preco_soma),
+                ofertas = ofertas + VALUES(ofertas),
+                vezes_buybox = vezes_buybox + VALUES(vezes_buybox),
+                preco_ultimo = IF(VALUES(coletado_em) >= coletado_em, VALUES(preco_ultimo), preco_ultimo),
+                coletado_em = GREATEST(coletado_em, VALUES(coletado_em))
+        """, _linhas_para_insert(agregado[["codigo_produto", "vendedor", "dia", "preco_min", "preco_max",
+                                           "preco_soma", "ofertas", "vezes_buybox", "preco_ultimo", "coletado_em"]]))
+    
+    if not buybox.empty:
+        cursor.executemany("""
+            INSERT INTO historico_diario_buybox (codigo_produto, dia, vendedor, preco, coletado_em)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                vendedor = IF(VALUES(coletado_em) >= coletado_em, VALUES(vendedor), vendedor),
+                preco = IF(VALUES(coletado_em) >= coletado_em, VALUES(preco), preco),
+                coletado_em = GREATEST(coletado_em, VALUES(coletado_em))
+        """, _linhas_para_insert(buybox[["codigo_produto", "dia", "vendedor", "preco", "coletado_em"]]))
+
+
+def _preencher_historico_diario(cursor):
+    """
+    Migração: monta o rollup a partir do histórico já existente, direto em SQL.
+    O "último preço" é o primeiro item do GROUP_CONCAT ordenado por data decrescente.
+    """
+    ofertas = " UNION ALL ".join(f"""
+        SELECT codigo_produto, vendedor_{pos} AS vendedor,
+               preco_{pos} / 100 AS preco,
+               {int(pos == 1)} AS buybox, coletado_em
+        FROM historico
+        WHERE coletado_em > '1970-01-02' AND codigo_produto IS NOT NULL
+          AND vendedor_{pos} NOT IN ('-', '') AND preco_{pos} IS NOT NULL
+    """ for pos in (1, 2, 3))
+    
+    cursor.execute(f"""
+        INSERT INTO historico_diario (codigo_produto, vendedor, dia, preco_min, preco_max,
+                                      preco_soma, ofertas, vezes_buybox, preco_ultimo, coletado_em)
+        SELECT codigo_produto, vendedor, DATE(coletado_em), MIN(preco), MAX(preco), SUM(preco),
+               COUNT(*), SUM(buybox),
+               SUBSTRING_INDEX(GROUP_CONCAT(preco ORDER BY coletado_em DESC SEPARATOR '|'), '|', 1),
+               MAX(coletado_em)
+        FROM ({ofertas}) AS o
+        GROUP BY codigo_produto, vendedor, DATE(coletado_em)
+    """)
+    print(f"[MIGRACAO] Rollup diário montado ({cursor.rowcount} linhas)")
+    
+    cursor.execute(f"""
+        INSERT INTO historico_diario_buybox (codigo_produto, dia, vendedor, preco, coletado_em)
+        SELECT codigo_produto, DATE(coletado_em),
+               SUBSTRING_INDEX(GROUP_CONCAT(vendedor ORDER BY coletado_em DESC SEPARATOR '|~|'), '|~|', 1),
+               SUBSTRING_INDEX(GROUP_CONCAT(preco ORDER BY coletado_em DESC SEPARATOR '|'), '|', 1),
+               MAX(coletado_em)
+        FROM ({ofertas}) AS o
+        WHERE buybox = 1
+        GROUP BY codigo_produto, DATE(coletado_em)
+    """)
+
+
+def _filtro_dias(data_inicio: Optional[datetime], data_fim: Optional[datetime], skus: Optional[list]):
+    """WHERE (dia e sku) comum às leituras do rollup"""
+    filtros = []
+    params = []
+    if data_inicio is not None:
+        filtros.append("dia >= %s")
+        params.append(data_inicio.date())
+    if data_fim is not None:
+        filtros.append("dia < %s")
+        params.append(data_fim.date())
+    if skus:
+        skus = list(skus)
+        filtros.append(f"codigo_produto IN ({', '.join(['%s'] * len(skus))})")
+        params += skus
+    where = f" WHERE {' AND '.join(filtros)}" if filtros else ""
+    return where, params
+
+
+def ler_historico_diario(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                         skus: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lê o rollup por (sku, vendedor, dia), com preco_medio calculado.
+    Período por dia: data_inicio <= dia < data_fim.
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        where, params = _filtro_dias(data_inicio, data_fim, skus)
+        return pd.read_sql_query(f"""
+            SELECT codigo_produto, vendedor, dia, preco_min, preco_max,
+                   preco_soma / ofertas AS preco_medio, preco_ultimo, ofertas, vezes_buybox
+            FROM historico_diario{where}
+            ORDER BY dia, codigo_produto, vendedor
+        """, conn, params=params or None)
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler rollup diário: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+def ler_buybox_diario(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                      skus: Optional[list] = None) -> pd.DataFrame:
+    """Lê o vencedor do buybox por (sku, dia)"""
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        where, params = _filtro_dias(data_inicio, data_fim, skus)
+        return pd.read_sql_query(f"""
+            SELECT codigo_produto, dia, vendedor, preco
+            FROM historico_diario_buybox{where}
+            ORDER BY dia, codigo_produto
+        """, conn, params=params or None)
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler buybox diário: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# ÚLTIMO REGISTRO POR SKU
+# ============================================================
+# historico_latest guarda a coleta mais recente de cada SKU e é atualizada
+# junto com cada escrita no histórico: consultas de "estado atual" custam
+# O(catálogo) em vez de MAX(id) ... GROUP BY sobre todo o histórico.
+
+def _preencher_historico_latest(cursor):
+    """Migração: preenche historico_latest com o último registro de cada SKU"""
+    lista = ", ".join(COLUNAS_HISTORICO)
+    cursor.execute(f"""
+        REPLACE INTO historico_latest ({lista})
+        SELECT {lista} FROM historico
+        WHERE id IN (
+            SELECT max_id FROM (
+                SELECT MAX(id) AS max_id FROM historico
+                WHERE codigo_produto IS NOT NULL GROUP BY codigo_produto
+            ) AS ultimos
+        )
+    """)
+
+
+def _atualizar_historico_latest(cursor, df_envio: pd.DataFrame):
+    """Upsert do último registro de cada SKU do lote (só substitui coletas mais antigas)"""
+    if "codigo_produto" not in df_envio.columns:
+        return
+    df = df_envio[df_envio["codigo_produto"].notna()].drop_duplicates("codigo_produto", keep="last")
+    if df.empty:
+        return
+    
+    colunas = [c for c in COLUNAS_HISTORICO if c in df.columns]
+    # coletado_em por último: as demais atribuições comparam com o valor antigo
+    novo = "(coletado_em IS NULL OR VALUES(coletado_em) >= coletado_em)"
+    atualizacoes = ", ".join(
+        f"{c} = IF({novo}, VALUES({c}), {c})"
+        for c in colunas if c not in ("codigo_produto", "coletado_em")
+    )
+    if "coletado_em" in colunas:
+        atualizacoes += f", coletado_em = IF({novo}, VALUES(coletado_em), coletado_em)"
+    
+    cursor.executemany(f"""
+        INSERT INTO historico_latest ({', '.join(colunas)})
+        VALUES ({', '.join(['%s'] * len(colunas))})
+        ON DUPLICATE KEY UPDATE {atualizacoes}
+    """, _linhas_para_insert(df[colunas]))
+
+
+def ler_historico_latest(limite: int = 0, precos_em_centavos: bool = False) -> pd.DataFrame:
+    """
+    Retorna o último registro de cada SKU (colunas do banco) com o
+    sku_seller do cadastro de produtos.
+    precos_em_centavos=True mantém preco_N/frete_N em centavos inteiros (e frete_tipo_N).
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        sql = """
+            SELECT l.*, p.sku_seller
+            FROM historico_latest l
+            LEFT JOIN produtos p ON l.codigo_produto = p.codigo_produto
+        """
+        if limite > 0:
+            sql += f" LIMIT {int(limite)}"
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        df = esquema.ler_cursor(cursor, "historico")
+        cursor.close()
+        return df if precos_em_centavos else _precos_para_exibicao(df)
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler último registro por SKU: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# OFERTAS NORMALIZADAS
+# ============================================================
+# Uma linha por (coleta, SKU, posição do vendedor), sem limite de vendedores.
+# O histórico continua guardando os 3 primeiros no formato largo; a view
+# ofertas_top3 monta esse mesmo formato a partir de ofertas.
+
+COLUNAS_OFERTAS = ["codigo_produto", "posicao", "vendedor_id", "vendedor",
+                   "preco_centavos", "frete_centavos", "frete_tipo"]
+TAMANHO_LOTE_RETENCAO_OFERTAS = 20000
+
+
+def _id_coleta(momento: datetime) -> int:
+    """Identificador da execução da coleta (AAAAMMDDHHMMSS), comum a todas as páginas"""
+    return int(momento.strftime("%Y%m%d%H%M%S"))
+
+
+def _criar_view_ofertas_top3(cursor):
+    """View de compatibilidade: ofertas no formato largo (vendedor_1..3, preco_1..3, ...)"""
+    colunas = ",\n               ".join(
+        f"MAX(CASE WHEN posicao = {pos} THEN {origem} END) AS {destino}_{pos}"
+        for pos in (1, 2, 3)
+        for origem, destino in (("vendedor", "vendedor"), ("preco_centavos", "preco"),
+                                ("frete_centavos", "frete"), ("frete_tipo", "frete_tipo"))
+    )
+    cursor.execute(f"""
+        CREATE OR REPLACE VIEW ofertas_top3 AS
+        SELECT coleta_id, codigo_produto, MAX(coletado_em) AS coletado_em,
+               COUNT(*) AS total_ofertas,
+               {colunas}
+        FROM ofertas
+        GROUP BY coleta_id, codigo_produto
+    """)
+
+
+def _inserir_ofertas(cursor, df_ofertas: pd.DataFrame, momento: datetime):
+    """Insere as ofertas da coleta (na transação corrente)"""
+    colunas = [c for c in COLUNAS_OFERTAS if c in df_ofertas.columns]
+    df = df_ofertas[df_ofertas["codigo_produto"].notna()][colunas]
+    # Um SKU repetido no cadastro é coletado duas vezes: fica a última
+    df = df.drop_duplicates(["codigo_produto", "posicao"], keep="last")
+    if df.empty:
+        return
+    coleta_id = _id_coleta(momento)
+    # O mesmo SKU em outra página da mesma coleta (mesmo coleta_id): fica a última também
+    skus = df["codigo_produto"].unique().tolist()
+    for inicio in range(0, len(skus), 500):
+        lote = skus[inicio:inicio + 500]
+        marcadores = ", ".join(["%s"] * len(lote))
+        cursor.execute(f"DELETE FROM ofertas WHERE coleta_id = %s AND codigo_produto IN ({marcadores})",
+                       [coleta_id] + lote)
+    df.insert(0, "coleta_id", coleta_id)
+    df["coletado_em"] = momento.strftime("%Y-%m-%d %H:%M:%S")
+    inserir_em_massa(cursor, "ofertas", df)
+
+
+def _aplicar_retencao_ofertas(conn, dias_limite: int):
+    """
+    Remove ofertas mais antigas que dias_limite (o histórico guarda os 3
+    primeiros), em lotes confirmados separadamente.
+    """
+    cursor = conn.cursor()
+    limite = datetime.now() - timedelta(days=dias_limite)
+    removidas = 0
+    while True:
+        cursor.execute("DELETE FROM ofertas WHERE coletado_em < %s LIMIT %s",
+                       (limite, TAMANHO_LOTE_RETENCAO_OFERTAS))
+        removidas += cursor.rowcount
+        conn.commit()
+        if cursor.rowcount < TAMANHO_LOTE_RETENCAO_OFERTAS:
+            break
+    cursor.close()
+    if removidas:
+        print(f"[BACKUP] {removidas} ofertas removidas (> {dias_limite} dias)")
+
+
+def ler_ofertas(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                skus: Optional[list] = None, vendedores: Optional[list] = None,
+                limite: int = 0) -> pd.DataFrame:
+    """
+    Lê as ofertas normalizadas (todos os vendedores, preços/fretes em centavos Int64).
+    Período: data_inicio <= coletado_em < data_fim. skus: codigo_produto.
+    vendedores: nome do vendedor (usa o índice vendedor + coletado_em).
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        filtros = []
+        params = []
+        if data_inicio is not None:
+            filtros.append("coletado_em >= %s")
+            params.append(data_inicio)
+        if data_fim is not None:
+            filtros.append("coletado_em < %s")
+            params.append(data_fim)
+        if skus:
+            skus = list(skus)
+            filtros.append(f"codigo_produto IN ({', '.join(['%s'] * len(skus))})")
+            params += skus
+        if vendedores:
+            vendedores = list(vendedores)
+            filtros.append(f"vendedor IN ({', '.join(['%s'] * len(vendedores))})")
+            params += vendedores
+        
+        sql = "SELECT coleta_id, coletado_em, " + ", ".join(COLUNAS_OFERTAS) + " FROM ofertas"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY coletado_em, codigo_produto, posicao"
+        if limite > 0:
+            sql += f" LIMIT {int(limite)}"
+        
+        df = pd.read_sql_query(sql, conn, params=params or None)
+        for coluna in ("preco_centavos", "frete_centavos"):
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype("Int64")
+        return df
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler ofertas: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# FUNÇÕES DE USUÁRIOS (substitui google sheets para login)
+# ============================================================
+
+def ler_usuarios() -> pd.DataFrame:
+    """Lê a tabela usuários"""
+    conn = get_connection()
+    try:
+        df = pd.read_sql_query("SELECT * FROM usuarios", conn)
+        return df
+    except Exception as e:
+        print(f"[MYSQL] Erro ao ler usuários: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+def _buscar_usuario(usuario: str):
+    """senha, status e role do usuário (busca pelo índice único de usuario), ou None"""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT senha, status, role FROM usuarios WHERE usuario = %s", (usuario,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def verificar_usuario(usuario: str, senha: str):
+    """
+    Verifica credenciais do usuário: uma consulta em uma conexão do pool.
+    Tabelas e admin padrão só são conferidos quando o usuário não é encontrado
+    (ex.: primeiro login em um banco novo).
+    """
+    try:
+        try:
+            row = _buscar_usuario(usuario)
+        except mysql.connector.ProgrammingError:
+            row = None  # Banco novo: tabela usuarios ainda não existe
+        if row is None:
+            criar_tabelas()
+            criar_usuario_padrao()
+            row = _buscar_usuario(usuario)
+        
+        if not row:
+            return False, "Usuário inexistente. Crie uma nova conta.", None
         
         if row["senha"] != senha:
             return False, "Usuário ou senha incorretos.", None
@@ -550,9 +2044,6 @@ def verificar_usuario(usuario: str, senha: str):
         
     except Exception as e:
         return False, f"Erro: {e}", None
-    finally:
-        cursor.close()
-        conn.close()
 
 
 def adicionar_usuario(usuario: str, senha: str, email: str):
@@ -609,6 +2100,39 @@ def atualizar_usuario(user_id, status=None, role=None):
         conn.close()
 
 
+def atualizar_usuarios_lote(alteracoes: dict):
+    """
+    Atualiza status e/ou cargo de vários usuários em uma única transação.
+    alteracoes: {user_id: {"status": ..., "role": ...}} (chave ausente ou vazia não muda).
+    Retorna as linhas alteradas (colunas de listar_usuarios), para a tela
+    redesenhar só elas, ou None se a transação falhar (nada é gravado).
+    """
+    ids = [int(user_id) for user_id in alteracoes]
+    if not ids:
+        return pd.DataFrame(columns=["id", "usuario", "email", "status", "role"])
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            "UPDATE usuarios SET status = COALESCE(%s, status), role = COALESCE(%s, role) WHERE id = %s",
+            [(a.get("status") or None, a.get("role") or None, user_id) for user_id, a in zip(ids, alteracoes.values())]
+        )
+        conn.commit()
+        cursor.execute(
+            f"SELECT id, usuario, email, status, role FROM usuarios WHERE id IN ({', '.join(['%s'] * len(ids))})",
+            tuple(ids)
+        )
+        return pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro atualizar usuarios: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def excluir_usuario(user_id):
     """Remove um usuário"""
     conn = get_connection()
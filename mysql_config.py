@@ -98,8 +98,8 @@ def save_mysql_config(mysql_config):
                 "db_type": "mysql",
             }
         
-        # Atualizar seção MySQL
-        config["mysql"] = mysql_config
+        # Atualizar seção MySQL (mantendo chaves não informadas, ex.: ajustes do pool)
+        config["mysql"] = {**config.get("mysql", {}), **mysql_config}
         config["db_type"] = "mysql"
         
         from datetime import datetime
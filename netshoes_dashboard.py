@@ -6,6 +6,7 @@ import flet as ft
 import pandas as pd
 from datetime import datetime
 from db_client import ler_planilha, ler_aba
+from db_async import em_segundo_plano
 
 
 def criar_tela_dashboard(page: ft.Page, is_dark: list):
@@ -201,10 +202,27 @@ def criar_tela_dashboard(page: ft.Page, is_dark: list):
     
     def render_dashboard(e=None):
         main_content.controls.clear()
+        main_content.controls.append(ft.Row([
+            ft.ProgressRing(width=20, height=20),
+            ft.Text("Carregando produtos...", color=get_text_color()),
+        ], spacing=10))
+        page.update()
+        
+        # Leitura na thread do banco: a tela continua respondendo enquanto carrega
+        em_segundo_plano(ler_planilha, ao_concluir=montar_dashboard, ao_falhar=mostrar_erro)
+    
+    def mostrar_erro(ex):
+        main_content.controls.clear()
+        main_content.controls.append(ft.Container(
+            content=ft.Text(f"Erro: {ex}", color=ft.Colors.RED_400),
+            padding=20,
+        ))
+        page.update()
+    
+    def montar_dashboard(df):
+        main_content.controls.clear()
         
         try:
-            df = ler_planilha()
-            
             if df is None or df.empty:
                 main_content.controls.append(criar_msg_sem_dados(
                     "Nenhum dado de produtos encontrado.\n\nExecute 'python main.py' para coletar dados."
@@ -206,6 +206,30 @@ def set_network_mode(ip_or_path, share_name="NetShoes"):
     return save_config(config)
 
 
+def get_service_config():
+    """
+    Endereço do serviço de dados (servico_dados.py) usado com db_type "servico".
+    Sem host configurado, usa o IP do servidor de rede (ou esta máquina).
+    """
+    config = load_config()
+    servico = {"host": config.get("network_ip", "") or "127.0.0.1", "porta": 8765, "token": ""}
+    servico.update(config.get("servico", {}))
+    return servico
+
+
+def set_service_mode(host, porta=8765, token=None):
+    """
+    Configura os clientes para usar o serviço de dados em vez do arquivo na rede.
+    token: o mesmo configurado no servidor (obrigatório lá fora de 127.0.0.1).
+    """
+    config = load_config()
+    config["db_type"] = "servico"
+    config["servico"] = {**config.get("servico", {}), "host": host, "porta": int(porta)}
+    if token is not None:
+        config["servico"]["token"] = token
+    return save_config(config)
+
+
 def get_current_mode():
     """Retorna o modo atual (local ou network)"""
     config = load_config()
@@ -22,6 +22,48 @@ COL_SKU = "SKU Color"
 VENDOR = "Color Sports"
 
 
+def _parse_numero(val, frete=False):
+    """Preco (ou frete) da planilha -> float; "-", vazio, nulo e o que nao for numero viram 0.0"""
+    if pd.isna(val) or val == "-" or val == "" or (frete and str(val).lower() == "gratis"):
+        return 0.0
+    try:
+        return float(str(val).replace(",", ".").replace("R$", "").strip())
+    except:
+        return 0.0
+
+
+# type() e o teste de tipo rodam em C, celula a celula (sem laco em Python)
+_tipo_celula = np.frompyfunc(type, 1, 1)
+_eh_numero = np.frompyfunc(frozenset({float, np.float64, int}).__contains__, 1, 1)
+
+
+def _valores_numericos(df, coluna, frete=False):
+    """
+    Coluna de preco (ou frete) como array float64, com o mesmo resultado de
+    _parse_numero em cada celula. Numeros (floats das leituras) sao copiados
+    direto; os textos ("-", "Gratis", "R$ 12,90") passam por _parse_numero uma
+    vez por valor distinto. Coluna ausente: zeros inteiros.
+    """
+    if coluna not in df.columns:
+        return np.zeros(len(df), dtype=np.int64)
+    serie = df[coluna]
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(valores), 0.0, valores)
+    
+    valores = serie.to_numpy(dtype=object)
+    numero = _eh_numero(_tipo_celula(valores)).astype(bool)
+    resultado = np.zeros(len(valores), dtype=np.float64)
+    if numero.any():
+        resultado[numero] = valores[numero].astype(np.float64)
+        resultado[numero & np.isnan(resultado)] = 0.0
+    if not numero.all():
+        codigos, unicos = pd.factorize(valores[~numero])  # Nulos ficam com -1 -> ultimo item (0.0)
+        convertidos = np.array([_parse_numero(v, frete) for v in unicos] + [0.0], dtype=np.float64)
+        resultado[~numero] = convertidos[codigos]
+    return resultado
+
+
 def analisar_gap_lucro(df_atual):
     """
     Analisa oportunidades de aumento de margem (Gap de Lucro).
@@ -32,125 +74,83 @@ def analisar_gap_lucro(df_atual):
     - Compara com o concorrente de MENOR preco (Vendedor 2 ou 3)
     - Considera valor do FRETE (não apenas se é grátis)
     - Calcula preco total = preco + frete
+    
+    Tudo em arrays NumPy (sem iterrows): roda a cada abertura do dashboard e
+    a cada exportacao para Excel.
     """
     if df_atual is None or df_atual.empty:
         return pd.DataFrame()
-
-    df = df_atual.copy()
     
     # Garantir que temos as colunas necessarias
     cols_req = ["codigo_produto", "Vendedor 1", "Preco 1"]
-    if not all(c in df.columns for c in cols_req):
+    if not all(c in df_atual.columns for c in cols_req):
         return pd.DataFrame()
-
-    # Funcao auxiliar para converter preco
-    def parse_preco(val):
-        if pd.isna(val) or val == "-" or val == "":
-            return 0.0
-        try:
-            return float(str(val).replace(",", ".").replace("R$", "").strip())
-        except:
-            return 0.0
     
-    # Funcao auxiliar para converter frete
-    def parse_frete(val):
-        if pd.isna(val) or val == "-" or val == "" or str(val).lower() == "gratis":
-            return 0.0
-        try:
-            return float(str(val).replace(",", ".").replace("R$", "").strip())
-        except:
-            return 0.0
-
     # Converter todos os precos e fretes
-    df["Preco 1 Num"] = df["Preco 1"].apply(parse_preco)
-    df["Frete 1 Num"] = df.get("Frete 1", 0).apply(parse_frete) if "Frete 1" in df.columns else 0
-    df["Total 1"] = df["Preco 1 Num"] + df["Frete 1 Num"]
+    preco = {pos: _valores_numericos(df_atual, f"Preco {pos}") for pos in (1, 2, 3)}
+    frete = {pos: _valores_numericos(df_atual, f"Frete {pos}", frete=True) for pos in (1, 2, 3)}
+    total = {pos: preco[pos] + frete[pos] for pos in (1, 2, 3)}
     
-    df["Preco 2 Num"] = df.get("Preco 2", 0).apply(parse_preco) if "Preco 2" in df.columns else 0
-    df["Frete 2 Num"] = df.get("Frete 2", 0).apply(parse_frete) if "Frete 2" in df.columns else 0
-    df["Total 2"] = df["Preco 2 Num"] + df["Frete 2 Num"]
-    
-    df["Preco 3 Num"] = df.get("Preco 3", 0).apply(parse_preco) if "Preco 3" in df.columns else 0
-    df["Frete 3 Num"] = df.get("Frete 3", 0).apply(parse_frete) if "Frete 3" in df.columns else 0
-    df["Total 3"] = df["Preco 3 Num"] + df["Frete 3 Num"]
-
     # Filtrar onde Color Sports eh Vendedor 1
-    mask_color = df["Vendedor 1"].astype(str).str.lower().str.contains("color", na=False)
-    df_color = df[mask_color].copy()
-    
-    if df_color.empty:
+    mask_color = df_atual["Vendedor 1"].astype(str).str.lower().str.contains("color", na=False).to_numpy()
+    if not mask_color.any():
         return pd.DataFrame()
     
-    # Encontrar o concorrente de menor preco total (entre V2 e V3)
-    results = []
-    for idx, row in df_color.iterrows():
-        total_1 = row["Total 1"]
-        
-        # Lista de concorrentes validos
-        concorrentes = []
-        
-        # Vendedor 2
-        v2 = row.get("Vendedor 2", "-")
-        total_2 = row["Total 2"]
-        preco_2 = row["Preco 2 Num"]
-        if v2 != "-" and pd.notna(v2) and total_2 > 0:
-            concorrentes.append({
-                "vendedor": v2,
-                "preco": preco_2,
-                "frete": row["Frete 2 Num"],
-                "total": total_2,
-                "posicao": 2
-            })
-        
-        # Vendedor 3
-        v3 = row.get("Vendedor 3", "-")
-        total_3 = row["Total 3"]
-        preco_3 = row["Preco 3 Num"]
-        if v3 != "-" and pd.notna(v3) and total_3 > 0:
-            concorrentes.append({
-                "vendedor": v3,
-                "preco": preco_3,
-                "frete": row["Frete 3 Num"],
-                "total": total_3,
-                "posicao": 3
-            })
-        
-        if not concorrentes:
-            continue
-        
-        # Encontrar o concorrente com MENOR preco total
-        melhor_concorrente = min(concorrentes, key=lambda x: x["total"])
-        
-        # Calcular Gap e Potencial
-        preco_concorrente = melhor_concorrente["preco"]
-        preco_ideal = preco_concorrente - 0.10  # Ficar 10 centavos abaixo
-        ganho_potencial = preco_ideal - row["Preco 1 Num"]
-        
-        # Só incluir se vale a pena (ganho >= R$ 1.00)
-        if ganho_potencial >= 1.00:
-            results.append({
-                "codigo_produto": row["codigo_produto"],
-                "sku_seller": row.get("sku_seller", "-"),
-                "nome_esperado": row.get("nome_esperado", "-"),
-                "Vendedor 1": row["Vendedor 1"],
-                "Preco 1": row["Preco 1 Num"],
-                "Frete 1": row["Frete 1 Num"] if "Frete 1" in df.columns else 0,
-                "Concorrente": melhor_concorrente["vendedor"],
-                "Posicao Concorrente": melhor_concorrente["posicao"],
-                "Preco Concorrente": melhor_concorrente["preco"],
-                "Frete Concorrente": melhor_concorrente["frete"],
-                "Total Concorrente": melhor_concorrente["total"],
-                "Preco 2": row.get("Preco 2 Num", 0),
-                "Vendedor 2": row.get("Vendedor 2", "-"),
-                "Gap": preco_concorrente - row["Preco 1 Num"],
-                "Preco Ideal": preco_ideal,
-                "Ganho Potencial": ganho_potencial,
-            })
+    # Concorrentes validos: vendedor informado e preco total > 0
+    vendedor = {}
+    valido = {}
+    for pos in (2, 3):
+        coluna = f"Vendedor {pos}"
+        vendedor[pos] = (df_atual[coluna].to_numpy(dtype=object) if coluna in df_atual.columns
+                         else np.full(len(df_atual), "-", dtype=object))
+        valido[pos] = (pd.notna(vendedor[pos]) & (vendedor[pos] != "-")) & (total[pos] > 0)
+    
+    # Concorrente de MENOR preco total; no empate fica o Vendedor 2
+    usar_3 = valido[3] & (~valido[2] | (total[3] < total[2]))
+    preco_concorrente = np.where(usar_3, preco[3], preco[2])
+    
+    # Calcular Gap e Potencial
+    preco_ideal = preco_concorrente - 0.10  # Ficar 10 centavos abaixo
+    ganho_potencial = preco_ideal - preco[1]
     
-    if not results:
+    # Só incluir se vale a pena (ganho >= R$ 1.00)
+    sel = np.flatnonzero(mask_color & (valido[2] | valido[3]) & (ganho_potencial >= 1.00))
+    if len(sel) == 0:
         return pd.DataFrame()
     
-    df_final = pd.DataFrame(results)
+    def coluna_ou(nome, padrao):
+        if nome in df_atual.columns:
+            return df_atual[nome].to_numpy(dtype=object)[sel]
+        return np.full(len(sel), padrao, dtype=object)
+    
+    usar_3 = usar_3[sel]
+    
+    def do_concorrente(pos_3, pos_2):
+        # Um array so quando todos vem da mesma posicao: mantem o dtype (0 inteiro se faltar a coluna)
+        if usar_3.all():
+            return pos_3[sel]
+        if not usar_3.any():
+            return pos_2[sel]
+        return np.where(usar_3, pos_3[sel], pos_2[sel])
+    
+    df_final = pd.DataFrame({
+        "codigo_produto": coluna_ou("codigo_produto", "-"),
+        "sku_seller": coluna_ou("sku_seller", "-"),
+        "nome_esperado": coluna_ou("nome_esperado", "-"),
+        "Vendedor 1": coluna_ou("Vendedor 1", "-"),
+        "Preco 1": preco[1][sel],
+        "Frete 1": frete[1][sel],
+        "Concorrente": do_concorrente(vendedor[3], vendedor[2]),
+        "Posicao Concorrente": np.where(usar_3, 3, 2),
+        "Preco Concorrente": preco_concorrente[sel],
+        "Frete Concorrente": do_concorrente(frete[3], frete[2]),
+        "Total Concorrente": do_concorrente(total[3], total[2]),
+        "Preco 2": preco[2][sel],
+        "Vendedor 2": vendedor[2][sel],
+        "Gap": preco_concorrente[sel] - preco[1][sel],
+        "Preco Ideal": preco_ideal[sel],
+        "Ganho Potencial": ganho_potencial[sel],
+    })
     df_final = df_final.sort_values("Ganho Potencial", ascending=False)
     
     return df_final
@@ -162,6 +162,8 @@ def analisar_gap_lucro(df_atual):
 def detectar_oportunidades(df_hist):
     """
     Retorna DataFrame com oportunidades detectadas (versao historica/estatistica).
+    Aceita o historico bruto ou o buybox por dia (ler_buybox_diario: um registro
+    por SKU e dia, bem menor em periodos longos).
     """
 
     if df_hist is None or df_hist.empty:
@@ -175,6 +177,10 @@ def detectar_oportunidades(df_hist):
         df[COL_PRECO] = df["Preco 1"]
         df[COL_VENDEDOR] = df["Vendedor 1"]
         df[COL_SKU] = df["codigo_produto"]
+    elif {"codigo_produto", "dia", "vendedor", "preco"} <= set(df.columns):
+        # Buybox diario: o vencedor do dia faz o papel do Vendedor 1
+        df = df.rename(columns={"codigo_produto": COL_SKU, "dia": COL_DATA,
+                                "vendedor": COL_VENDEDOR, "preco": COL_PRECO})
 
     df[COL_PRECO] = pd.to_numeric(df[COL_PRECO], errors="coerce")
     df[COL_VENDEDOR] = df[COL_VENDEDOR].astype(str)
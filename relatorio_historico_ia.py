@@ -7,56 +7,34 @@ VERSÃO OTIMIZADA - Usa operações vetorizadas do pandas
 import warnings
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from db_client import get_connection
+from datetime import datetime
+from db_client import ler_historico_latest
 
 # Suprimir aviso do pandas sobre conexão DBAPI2
 warnings.filterwarnings("ignore", message=".*pandas only supports SQLAlchemy.*")
 
 
 def carregar_dados_historicos(dias: int = 30):
-    """Carrega dados históricos - OTIMIZADO com SQL mais eficiente"""
-    conn = get_connection()
-    
+    """Carrega o último registro de cada SKU (tabela historico_latest, mantida a cada coleta)"""
     try:
-        # Calcular data limite
-        data_limite = datetime.now() - timedelta(days=dias)
-        
-        # Query otimizada - pegar apenas registros mais recentes por SKU
-        # Isso reduz drasticamente a quantidade de dados processados
-        query = """
-            SELECT 
-                h.codigo_produto,
-                h.nome_esperado,
-                h.vendedor_1,
-                h.preco_1,
-                h.vendedor_2,
-                h.preco_2,
-                h.vendedor_3,
-                h.preco_3,
-                h.status_final,
-                h.data_coleta,
-                p.sku_seller
-            FROM historico h
-            LEFT JOIN produtos p ON h.codigo_produto = p.codigo_produto
-            WHERE h.id IN (
-                SELECT MAX(id) FROM historico GROUP BY codigo_produto
-            )
-            LIMIT 25000
-        """
-        
-        df = pd.read_sql_query(query, conn)
+        df = ler_historico_latest(limite=25000, precos_em_centavos=True)
         
         if df.empty:
             return pd.DataFrame()
         
-        return df
+        # Preços gravados em centavos inteiros: reais sem parsing de texto
+        for col in ['preco_1', 'preco_2', 'preco_3']:
+            if col in df.columns:
+                df[col] = df[col].astype('float64') / 100
+        
+        colunas = ["codigo_produto", "nome_esperado",
+                   "vendedor_1", "preco_1", "vendedor_2", "preco_2", "vendedor_3", "preco_3",
+                   "status_final", "data_coleta", "sku_seller"]
+        return df[[c for c in colunas if c in df.columns]]
     
     except Exception as e:
         print(f"[ERRO] Ao carregar histórico: {e}")
         return pd.DataFrame()
-    finally:
-        conn.close()
 
 
 def analisar_concorrencia(df: pd.DataFrame):
@@ -67,13 +45,8 @@ def analisar_concorrencia(df: pd.DataFrame):
     # Criar cópia para não modificar original
     df = df.copy()
     
-    # Converter preços para numérico de forma vetorizada
-    for col in ['preco_1', 'preco_2', 'preco_3']:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: str(x).replace(',', '.') if pd.notna(x) else None)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
     # Calcular métricas de preço de forma vetorizada
+    # (os preços já chegam numéricos, em reais, de carregar_dados_historicos)
     preco_cols = ['preco_1', 'preco_2', 'preco_3']
     existing_cols = [c for c in preco_cols if c in df.columns]
     
@@ -13,13 +13,99 @@ import flet as ft
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
-from db_client import ler_planilha, ler_historico
+from typing import Optional
+from db_client import ler_planilha, consultar_historico_com_arquivo, ler_historico_diario, consulta_analitica
 from oportunidades_ia import analisar_gap_lucro
 
 
 REL_DIR = Path("data/relatorios")
 REL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Colunas do histórico usadas pelas abas do relatório (evita carregar links/status)
+COLUNAS_HISTORICO_RELATORIO = ["codigo_produto", "nome_esperado",
+                               "vendedor_1", "preco_1", "vendedor_2", "preco_2",
+                               "vendedor_3", "preco_3", "data_verificacao"]
+
+
+# ============================================================
+# ABAS CALCULADAS NO MOTOR ANALÍTICO (DuckDB)
+# ============================================================
+# Com o motor analítico disponível, as agregações do histórico rodam direto
+# no banco; cada função retorna None sem ele e a aba segue pelo pandas.
+
+def _periodo(data_inicio: Optional[datetime]):
+    return ("AND coletado_em >= ?", [data_inicio]) if data_inicio else ("", [])
+
+
+def _tem_historico_analitico(data_inicio: Optional[datetime]) -> Optional[bool]:
+    """Se há histórico no período (EXISTS, sem trazer linhas); None sem o motor analítico"""
+    filtro, params = _periodo(data_inicio)
+    df = consulta_analitica(f"SELECT EXISTS (SELECT 1 FROM historico WHERE 1 = 1 {filtro}) AS tem", params)
+    return None if df is None else bool(df["tem"].iloc[0])
+
+
+def _buybox_wins_analitico(data_inicio: Optional[datetime]) -> Optional[pd.DataFrame]:
+    filtro, params = _periodo(data_inicio)
+    return consulta_analitica(f"""
+        SELECT vendedor_1 AS "Vendedor", COUNT(*) AS "BuyBox Wins",
+               ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS "Percentual"
+        FROM historico
+        WHERE vendedor_1 IS NOT NULL AND vendedor_1 NOT IN ('-', '') {filtro}
+        GROUP BY vendedor_1
+        ORDER BY "BuyBox Wins" DESC
+    """, params)
+
+
+def _color_vs_concorrencia_analitico(data_inicio: Optional[datetime]) -> Optional[pd.DataFrame]:
+    filtro, params = _periodo(data_inicio)
+    df = consulta_analitica(f"""
+        SELECT vendedor, COUNT(*) AS qtd, SUM(preco) AS soma,
+               lower(vendedor) LIKE '%color%' AS color
+        FROM historico_ofertas
+        WHERE vendedor IS NOT NULL AND vendedor NOT IN ('-', '') AND preco IS NOT NULL {filtro}
+        GROUP BY vendedor
+    """, params)
+    if df is None or df.empty:
+        return df
+    
+    color = df[df["color"]]
+    qtd_color = int(color["qtd"].sum())
+    media_color = color["soma"].sum() / qtd_color if qtd_color else 0
+    
+    outros = df[~df["color"]].sort_values(["qtd", "vendedor"], ascending=[False, True])
+    if outros.empty:
+        return pd.DataFrame()
+    media_conc = outros["soma"] / outros["qtd"]
+    diff = media_color - media_conc
+    
+    resumo = pd.DataFrame([{
+        "Concorrente": "*** RESUMO COLOR SPORTS ***",
+        "Qtd Ofertas": qtd_color,
+        "Preco Medio": round(media_color, 2),
+        "Diff vs Color": 0,
+        "Color Mais Barato": ""
+    }])
+    df_comp = pd.DataFrame({
+        "Concorrente": outros["vendedor"],
+        "Qtd Ofertas": outros["qtd"],
+        "Preco Medio": media_conc.round(2),
+        "Diff vs Color": diff.round(2),
+        "Color Mais Barato": diff.lt(0).map({True: "Sim", False: "Nao"}),
+    })
+    return pd.concat([resumo, df_comp], ignore_index=True)
+
+
+def _substituicoes_analitico(data_inicio: Optional[datetime]) -> Optional[pd.DataFrame]:
+    filtro, params = _periodo(data_inicio)
+    return consulta_analitica(f"""
+        SELECT vendedor_1 AS "Concorrente", COUNT(*) AS "Vezes Ganhou de Color"
+        FROM historico
+        WHERE vendedor_1 IS NOT NULL AND vendedor_1 NOT IN ('-', '')
+          AND lower(vendedor_1) NOT LIKE '%color%' {filtro}
+        GROUP BY vendedor_1
+        ORDER BY "Vezes Ganhou de Color" DESC
+    """, params)
+
 
 def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: list):
     """Cria a tela de relatorios"""
@@ -92,6 +178,9 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
     # Variáveis para armazenar dados temporariamente
     dados_exportar = [None]  # Dados atuais (produtos)
     dados_historico = [None]  # Dados históricos
+    dados_diario = [None]  # Rollup diário (sku, vendedor, dia)
+    dados_inicio = [None]  # Início do período (consultas no motor analítico)
+    dados_tem_historico = [False]  # Há histórico no período (mesmo sem o bruto carregado)
     
     def on_save_excel_result(e: ft.FilePickerResultEvent):
         """Callback quando usuário escolhe onde salvar Excel"""
@@ -111,7 +200,8 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
             
             # Verificar se pelo menos um tem dados
             has_atual = df_atual is not None and not df_atual.empty
-            has_hist = df_hist is not None and not df_hist.empty
+            has_bruto = df_hist is not None and not df_hist.empty  # Histórico bruto carregado
+            has_hist = has_bruto or dados_tem_historico[0]
             
             if not has_atual and not has_hist:
                 status_text.value = "Erro: Nenhum dado disponível"
@@ -133,8 +223,26 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
                     else:
                         pd.DataFrame({"Info": ["Nenhuma oportunidade detectada"]}).to_excel(writer, sheet_name="Oportunidades de Lucro", index=False)
 
-                # ======= PRECOS POR VENDEDOR (usa HISTÓRICO) =======
-                if check_precos.value and has_hist:
+                # ======= PRECOS POR VENDEDOR (usa ROLLUP DIÁRIO) =======
+                df_diario = dados_diario[0]
+                if check_precos.value and df_diario is not None and not df_diario.empty:
+                    df_diario = df_diario.assign(preco_soma=df_diario["preco_medio"] * df_diario["ofertas"])
+                    agg = df_diario.groupby("vendedor").agg(
+                        qtd=("ofertas", "sum"), soma=("preco_soma", "sum"),
+                        pmin=("preco_min", "min"), pmax=("preco_max", "max"),
+                    ).reset_index()
+                    agg["media"] = agg["soma"] / agg["qtd"]
+                    preco_data = pd.DataFrame({
+                        "Vendedor": agg["vendedor"],
+                        "Qtd Ofertas": agg["qtd"],
+                        "Preco Medio": agg["media"].round(2),
+                        "Preco Min": agg["pmin"].round(2),
+                        "Preco Max": agg["pmax"].round(2),
+                    }).sort_values("Preco Medio", kind="stable")
+                    preco_data.to_excel(writer, sheet_name="Precos", index=False)
+                
+                # ======= PRECOS POR VENDEDOR (usa HISTÓRICO, bancos sem rollup) =======
+                elif check_precos.value and has_bruto:
                     df = df_hist  # Usar histórico
                     vendedor_precos = {}
                     for v_col, p_col in [("vendedor_1", "preco_1"), ("vendedor_2", "preco_2"), ("vendedor_3", "preco_3")]:
@@ -163,8 +271,14 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
                             })
                         pd.DataFrame(preco_data).to_excel(writer, sheet_name="Precos", index=False)
                 
-                # ======= BUYBOX WINS (usa HISTÓRICO) =======
-                if check_buybox.value and has_hist:
+                # ======= BUYBOX WINS (usa MOTOR ANALÍTICO) =======
+                contagem = _buybox_wins_analitico(dados_inicio[0]) if check_buybox.value and has_hist else None
+                if contagem is not None:
+                    if not contagem.empty:
+                        contagem.to_excel(writer, sheet_name="BuyBox Wins", index=False)
+                
+                # ======= BUYBOX WINS (usa HISTÓRICO, sem motor analítico) =======
+                elif check_buybox.value and has_bruto:
                     df = df_hist  # Usar histórico
                     col_vendedor = "vendedor_1" if "vendedor_1" in df.columns else "Vendedor 1"
                     if col_vendedor in df.columns:
@@ -176,8 +290,14 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
                             contagem["Percentual"] = (contagem["BuyBox Wins"] / total * 100).round(2)
                             contagem.to_excel(writer, sheet_name="BuyBox Wins", index=False)
                 
-                # ======= COLOR VS CONCORRENCIA (usa HISTÓRICO) =======
-                if check_color_vs.value and has_hist:
+                # ======= COLOR VS CONCORRENCIA (usa MOTOR ANALÍTICO) =======
+                df_comp = _color_vs_concorrencia_analitico(dados_inicio[0]) if check_color_vs.value and has_hist else None
+                if df_comp is not None:
+                    if not df_comp.empty:
+                        df_comp.to_excel(writer, sheet_name="Color vs Concorrencia", index=False)
+                
+                # ======= COLOR VS CONCORRENCIA (usa HISTÓRICO, sem motor analítico) =======
+                elif check_color_vs.value and has_bruto:
                     df = df_hist  # Usar histórico
                     color_precos = []
                     outros_precos = {}
@@ -226,8 +346,14 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
                         df_comp = pd.concat([resumo, df_comp], ignore_index=True)
                         df_comp.to_excel(writer, sheet_name="Color vs Concorrencia", index=False)
                 
-                # ======= SUBSTITUICOES (usa HISTÓRICO) =======
-                if check_substituicoes.value and has_hist:
+                # ======= SUBSTITUICOES (usa MOTOR ANALÍTICO) =======
+                subs = _substituicoes_analitico(dados_inicio[0]) if check_substituicoes.value and has_hist else None
+                if subs is not None:
+                    if not subs.empty:
+                        subs.to_excel(writer, sheet_name="Substituicoes", index=False)
+                
+                # ======= SUBSTITUICOES (usa HISTÓRICO, sem motor analítico) =======
+                elif check_substituicoes.value and has_bruto:
                     df = df_hist  # Usar histórico
                     col_vendedor = "vendedor_1" if "vendedor_1" in df.columns else "Vendedor 1"
                     if col_vendedor in df.columns:
@@ -242,8 +368,31 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
                             subs_data = [{"Concorrente": k, "Vezes Ganhou de Color": v} for k, v in sorted(substituicoes.items(), key=lambda x: x[1], reverse=True)]
                             pd.DataFrame(subs_data).to_excel(writer, sheet_name="Substituicoes", index=False)
                 
-                # ======= VOLATILIDADE (usa HISTÓRICO) =======
-                if check_volatilidade.value and has_hist:
+                # ======= VOLATILIDADE (usa ROLLUP DIÁRIO) =======
+                # Amplitude entre os vendedores de cada SKU no dia (mínimo e máximo do dia)
+                if check_volatilidade.value and df_diario is not None and not df_diario.empty:
+                    vol = df_diario.groupby(["codigo_produto", "dia"]).agg(
+                        pmin=("preco_min", "min"), pmax=("preco_max", "max"),
+                    ).reset_index()
+                    vol["Amplitude"] = (vol["pmax"] - vol["pmin"]).round(2)
+                    vol = vol[vol["Amplitude"] > 0].sort_values("Amplitude", ascending=False, kind="stable").head(200)
+                    if not vol.empty:
+                        vol = pd.DataFrame({
+                            "codigo_produto": vol["codigo_produto"],
+                            "Dia": vol["dia"],
+                            "Min Preco": vol["pmin"].round(2),
+                            "Max Preco": vol["pmax"].round(2),
+                            "Amplitude": vol["Amplitude"],
+                        })
+                        if has_atual:
+                            nomes = df_atual.drop_duplicates("codigo_produto").set_index("codigo_produto")
+                            for col in ("nome_esperado", "sku_seller"):
+                                if col in nomes.columns:
+                                    vol.insert(1, col, vol["codigo_produto"].map(nomes[col]))
+                        vol.to_excel(writer, sheet_name="Volatilidade", index=False)
+                
+                # ======= VOLATILIDADE (usa HISTÓRICO, bancos sem rollup) =======
+                elif check_volatilidade.value and has_bruto:
                     df = df_hist  # Usar histórico
                     preco_cols = ["preco_1", "preco_2", "preco_3"] if "preco_1" in df.columns else ["Preco 1", "Preco 2", "Preco 3"]
                     if all(c in df.columns for c in preco_cols):
@@ -295,9 +444,33 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
             df_atual = ler_planilha()
             
             # Carregar dados HISTÓRICOS (para análises históricas)
-            df_hist = ler_historico()
+            # Só as colunas usadas nas abas; com período definido, o banco lê
+            # apenas as partições mensais do intervalo
+            data_inicio = None
+            if periodo_selecionado[0] > 0:
+                data_inicio = datetime.now() - timedelta(days=periodo_selecionado[0])
+            dados_inicio[0] = data_inicio
+            df_diario = None
+            if check_precos.value or check_volatilidade.value:
+                df_diario = ler_historico_diario(data_inicio=data_inicio)
+            dados_diario[0] = df_diario
+            tem_diario = df_diario is not None and not df_diario.empty
+            
+            # BuyBox, Color vs Concorrencia e Substituicoes agregam no motor
+            # analítico; aqui só se confere (EXISTS) se há histórico no período
+            abas_analiticas = check_buybox.value or check_color_vs.value or check_substituicoes.value
+            tem_analitico = _tem_historico_analitico(data_inicio) if abas_analiticas else None
+            
+            # Histórico bruto só para as abas que ainda dependem dele: Precos e
+            # Volatilidade sem rollup, as demais sem motor analítico
+            precisa_bruto = (((check_precos.value or check_volatilidade.value) and not tem_diario)
+                             or (abas_analiticas and tem_analitico is None))
+            df_hist = None
+            if precisa_bruto:
+                df_hist = consultar_historico_com_arquivo(colunas=COLUNAS_HISTORICO_RELATORIO, data_inicio=data_inicio)
+            dados_tem_historico[0] = tem_diario or bool(tem_analitico) or (df_hist is not None and not df_hist.empty)
             
-            if (df_atual is None or df_atual.empty) and (df_hist is None or df_hist.empty):
+            if (df_atual is None or df_atual.empty) and not dados_tem_historico[0]:
                 status_text.value = "Erro: Nenhum dado disponivel. Execute 'python main.py' primeiro."
                 status_text.color = ft.Colors.RED_400
                 page.update()
@@ -316,8 +489,13 @@ def criar_tela_relatorios(page: ft.Page, file_picker: ft.FilePicker, is_dark: li
             dados_historico[0] = df_hist
             
             total_atual = len(df_atual) if df_atual is not None and not df_atual.empty else 0
-            total_hist = len(df_hist) if df_hist is not None and not df_hist.empty else 0
-            status_text.value = f"Dados atuais: {total_atual}, Histórico: {total_hist}. Escolha onde salvar..."
+            if df_hist is not None:
+                resumo_hist = f"Histórico: {len(df_hist)}"
+            elif tem_analitico:
+                resumo_hist = "Histórico: agregado no motor analítico"
+            else:
+                resumo_hist = f"Histórico diário: {len(df_diario) if tem_diario else 0}"
+            status_text.value = f"Dados atuais: {total_atual}, {resumo_hist}. Escolha onde salvar..."
             page.update()
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,220 @@
+# servico_client.py — Backend que fala com o serviço de dados (servico_dados.py)
+"""
+Usado por db_client quando db_type é "servico": as mesmas funções de
+sqlite_client/mysql_client, executadas no servidor por HTTP. O cliente não
+abre o arquivo do banco pela rede; recebe os DataFrames em formato colunar,
+comprimidos com gzip.
+
+Endereço em server_config.json ("servico": host, porta, token; ver
+network_config.get_service_config). Sem conexão direta com o banco:
+get_connection() levanta RuntimeError, assim como as operações que o
+servidor não expõe (ler_usuarios, ler_aba, manutencao_banco...).
+"""
+import gzip
+import http.client
+import threading
+from contextlib import contextmanager
+
+from network_config import get_service_config
+from servico_dados import MIN_BYTES_GZIP, NIVEL_GZIP, de_json, para_json
+
+TIMEOUT = 300  # Segundos (a retenção e a manutenção podem demorar)
+
+_config = None
+_conexoes_thread = threading.local()
+
+
+def _endereco() -> dict:
+    global _config
+    if _config is None:
+        _config = get_service_config()
+    return _config
+
+
+def _conexao(nova: bool = False) -> http.client.HTTPConnection:
+    """Conexão HTTP da thread atual, mantida entre chamadas"""
+    conn = getattr(_conexoes_thread, "conexao", None)
+    if conn is None or nova:
+        if conn is not None:
+            conn.close()
+        config = _endereco()
+        conn = _conexoes_thread.conexao = http.client.HTTPConnection(config["host"], int(config["porta"]),
+                                                                     timeout=TIMEOUT)
+        _conexoes_thread.usada = False
+    return conn
+
+
+def _chamar(nome: str, *args, **kwargs):
+    """Executa db_client.<nome>(*args, **kwargs) no servidor e devolve o resultado"""
+    corpo = para_json({"args": list(args), "kwargs": kwargs})
+    headers = {"Content-Type": "application/json; charset=utf-8", "Accept-Encoding": "gzip"}
+    if _endereco().get("token"):
+        headers["X-Token"] = _endereco()["token"]
+    if len(corpo) >= MIN_BYTES_GZIP:
+        corpo = gzip.compress(corpo, NIVEL_GZIP)
+        headers["Content-Encoding"] = "gzip"
+    
+    conn = _conexao()
+    try:
+        try:
+            conn.request("POST", f"/chamar/{nome}", corpo, headers)
+            resposta = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not _conexoes_thread.usada:
+                raise
+            # O servidor fechou a conexão ociosa antes de receber o pedido: repetir numa nova
+            conn = _conexao(nova=True)
+            conn.request("POST", f"/chamar/{nome}", corpo, headers)
+            resposta = conn.getresponse()
+        dados = resposta.read()
+    except (http.client.HTTPException, OSError) as e:
+        _conexao(nova=True)
+        config = _endereco()
+        raise ConnectionError(f"Serviço de dados indisponível em {config['host']}:{config['porta']}: {e}") from e
+    _conexoes_thread.usada = True
+    
+    if resposta.getheader("Content-Encoding") == "gzip":
+        dados = gzip.decompress(dados)
+    conteudo = de_json(dados)
+    if resposta.status != 200:
+        raise RuntimeError(f"[SERVICO] {nome}: {conteudo.get('erro', resposta.reason)}")
+    return conteudo["resultado"]
+
+
+def _remota(nome: str):
+    def funcao(*args, **kwargs):
+        return _chamar(nome, *args, **kwargs)
+    funcao.__name__ = funcao.__qualname__ = nome
+    return funcao
+
+
+def _indisponivel(nome: str):
+    def funcao(*args, **kwargs):
+        raise RuntimeError(f"{nome} não é atendida pelo serviço de dados: execute na máquina do banco")
+    funcao.__name__ = funcao.__qualname__ = nome
+    return funcao
+
+
+# Só as operações que o servidor atende (servico_dados.OPERACOES) vão pela rede;
+# as demais de db_client.FUNCOES_BACKEND estão mais abaixo ou levantam RuntimeError
+criar_tabelas = _remota("criar_tabelas")
+ler_planilha = _remota("ler_planilha")
+ler_pagina_produtos = _remota("ler_pagina_produtos")
+salvar_planilha = _remota("salvar_planilha")
+contar_produtos = _remota("contar_produtos")
+atualizar_produtos_lote = _remota("atualizar_produtos_lote")
+ler_historico = _remota("ler_historico")
+consultar_historico_com_arquivo = _remota("consultar_historico_com_arquivo")
+ler_historico_diario = _remota("ler_historico_diario")
+ler_buybox_diario = _remota("ler_buybox_diario")
+ler_historico_latest = _remota("ler_historico_latest")
+ler_ofertas = _remota("ler_ofertas")
+atualizar_historico = _remota("atualizar_historico")
+aplicar_retencao_historico = _remota("aplicar_retencao_historico")
+verificar_usuario = _remota("verificar_usuario")
+adicionar_usuario = _remota("adicionar_usuario")
+listar_usuarios = _remota("listar_usuarios")
+atualizar_usuario = _remota("atualizar_usuario")
+atualizar_usuarios_lote = _remota("atualizar_usuarios_lote")
+excluir_usuario = _remota("excluir_usuario")
+versao_dados = _remota("versao_dados")
+aplicar_sessao = _remota("aplicar_sessao")
+
+criar_usuario_padrao = _indisponivel("criar_usuario_padrao")
+ler_aba = _indisponivel("ler_aba")
+ler_usuarios = _indisponivel("ler_usuarios")
+salvar_aba = _indisponivel("salvar_aba")
+manutencao_banco = _indisponivel("manutencao_banco")
+
+
+# ============================================================
+# OPERAÇÕES QUE NÃO SÃO UMA CHAMADA SIMPLES
+# ============================================================
+
+def get_connection():
+    raise RuntimeError("Sem conexão direta com o banco no modo serviço: use as funções de db_client")
+
+
+def registrar_alteracao(cursor, tabela: str) -> None:
+    """Sem efeito: as gravações feitas pelo serviço já são registradas no servidor"""
+
+
+class _SessaoRemota:
+    """Anota as operações da sessão para enviá-las juntas ao fim do bloco with"""
+    
+    def __init__(self):
+        self.operacoes = []
+    
+    def __getattr__(self, nome):
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+        
+        def operacao(*args, **kwargs):
+            self.operacoes.append([nome, list(args), kwargs])
+        return operacao
+
+
+@contextmanager
+def sessao_em_massa():
+    """
+    As operações do bloco vão ao servidor em uma única chamada (aplicar_sessao)
+    e rodam lá em uma transação; os métodos da sessão retornam None aqui.
+    """
+    sessao = _SessaoRemota()
+    yield sessao
+    if sessao.operacoes:
+        _chamar("aplicar_sessao", sessao.operacoes)
+
+
+def ler_produtos_paginado(tamanho_pagina: int = 1000):
+    """Páginas de produtos pedidas uma a uma ao servidor (ler_pagina_produtos, por id)"""
+    ultimo_id = 0
+    while True:
+        df = ler_pagina_produtos(ultimo_id, tamanho_pagina)
+        if df.empty:
+            return
+        ultimo_id = int(df["id"].iloc[-1])
+        yield df
+        if len(df) < tamanho_pagina:
+            return
+
+
+def consultar_historico(colunas=None, data_inicio=None, data_fim=None, skus=None, vendedores=None,
+                        chunksize=None, limite=0, precos_em_centavos=False, antes_id=None):
+    """
+    consultar_historico no servidor. Com chunksize, cada bloco é uma chamada
+    (limite=chunksize, antes_id do bloco anterior): o cliente nunca guarda o
+    resultado inteiro. Os blocos vêm do registro mais recente para o mais antigo.
+    """
+    filtros = {"data_inicio": data_inicio, "data_fim": data_fim, "skus": skus, "vendedores": vendedores,
+               "precos_em_centavos": precos_em_centavos}
+    if not chunksize:
+        return _chamar("consultar_historico", colunas, limite=limite, antes_id=antes_id, **filtros)
+    return _historico_em_blocos(colunas, chunksize, limite, antes_id, filtros)
+
+
+def _historico_em_blocos(colunas, chunksize: int, limite: int, antes_id, filtros: dict):
+    # O id do último registro de cada bloco é o ponto de partida do seguinte
+    sem_id = bool(colunas) and "id" not in colunas
+    if sem_id:
+        colunas = list(colunas) + ["id"]
+    restantes = limite
+    while True:
+        tamanho = min(chunksize, restantes) if limite > 0 else chunksize
+        bloco = _chamar("consultar_historico", colunas, limite=tamanho, antes_id=antes_id, **filtros)
+        if bloco.empty:
+            return
+        antes_id = int(bloco["id"].iloc[-1])
+        yield bloco.drop(columns="id") if sem_id else bloco
+        restantes -= len(bloco)
+        if len(bloco) < tamanho or (limite > 0 and restantes <= 0):
+            return
+
+
+def saude() -> dict:
+    """GET /saude do servidor (tipo de banco e caminho)"""
+    token = _endereco().get("token")
+    conn = _conexao()
+    conn.request("GET", "/saude", headers={"X-Token": token} if token else {})
+    resposta = conn.getresponse()
+    return de_json(resposta.read())
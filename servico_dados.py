@@ -0,0 +1,352 @@
+# servico_dados.py — Serviço de dados local (HTTP) ao lado do banco
+"""
+Abrir o netshoes.db pelo compartilhamento de rede (\\\\servidor\\pasta) faz cada
+leitura de página atravessar o SMB, e o WAL não é seguro nesse caso. Este
+serviço roda na máquina do banco e atende as operações de db_client por HTTP;
+os clientes usam db_type "servico" (servico_client) e nunca abrem o arquivo.
+
+    python servico_dados.py                   # 0.0.0.0:8765 (porta de server_config.json)
+    python servico_dados.py --porta 9000
+    python servico_dados.py --host 127.0.0.1  # só nesta máquina (testes)
+
+Na rede o serviço exige um token ("servico": {"token": ...} em
+server_config.json, o mesmo nos clientes): sem ele, só sobe em 127.0.0.1.
+
+Protocolo:
+- POST /chamar/<função> com {"args": [...], "kwargs": {...}} (JSON, gzip se grande),
+  só para as funções de OPERACOES; cabeçalho X-Token com o token configurado
+- resposta {"resultado": ...} ou {"erro": "..."}; gzip se o cliente aceitar
+- DataFrames em formato colunar: nomes, dtypes e uma lista de valores por coluna
+- GET /saude: tipo de banco e caminho (também exige o X-Token)
+
+As leituras ficam em cache no servidor já serializadas e comprimidas, valendo
+enquanto versao_dados das tabelas não mudar: vários clientes abrindo o
+dashboard custam uma consulta e uma compressão.
+"""
+import gzip
+import hmac
+import ipaddress
+import json
+import sys
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+PORTA_PADRAO = 8765
+NIVEL_GZIP = 5
+MIN_BYTES_GZIP = 1024  # Respostas menores vão sem compressão
+MAX_RESPOSTAS_CACHE = 32
+
+# Operações que o serviço atende (o que os clientes usam). Ficam de fora as que
+# entregam a conexão, as genéricas por nome de tabela (ler_aba/salvar_aba),
+# ler_usuarios (traz as senhas), manutencao_banco e consulta_analitica (SQL livre:
+# no DuckDB lê e grava arquivos). sessao_em_massa chega como aplicar_sessao.
+OPERACOES = {
+    "criar_tabelas", "ler_planilha", "ler_pagina_produtos", "salvar_planilha", "contar_produtos",
+    "atualizar_produtos_lote",
+    "ler_historico", "consultar_historico", "consultar_historico_com_arquivo", "ler_historico_diario",
+    "ler_buybox_diario", "ler_historico_latest", "ler_ofertas", "atualizar_historico",
+    "aplicar_retencao_historico", "verificar_usuario", "adicionar_usuario", "listar_usuarios",
+    "atualizar_usuario", "atualizar_usuarios_lote", "excluir_usuario", "versao_dados", "aplicar_sessao",
+}
+# Tabelas que inserir/upsert/excluir de uma sessão remota podem alterar. O histórico
+# vai só por atualizar_historico (no SQLite historico é uma view das partições)
+TABELAS_SESSAO = {"produtos"}
+# Parâmetros posicionais desses métodos (de SessaoEmMassa), para conferir os nomes
+PARAMETROS_SESSAO = {
+    "inserir": ("tabela", "df"),
+    "upsert": ("tabela", "df", "chave", "ao_inserir"),
+    "excluir": ("tabela", "coluna", "valores"),
+}
+COLUNAS_OCULTAS = ["senha"]  # Nunca saem do servidor, qualquer que seja a leitura
+
+# Leituras com cache no servidor -> tabelas cuja versão invalida o resultado
+LEITURAS = {
+    "ler_planilha": ["produtos"],
+    "contar_produtos": ["produtos"],
+    "ler_historico": ["historico"],
+    "consultar_historico": ["historico"],
+    "consultar_historico_com_arquivo": ["historico"],
+    "ler_historico_diario": ["historico"],
+    "ler_buybox_diario": ["historico"],
+    "ler_historico_latest": ["historico", "produtos"],
+    "ler_ofertas": ["historico"],
+}
+
+
+# ============================================================
+# CODIFICAÇÃO (usada pelo servidor e por servico_client)
+# ============================================================
+
+def _valores_coluna(serie: pd.Series) -> list:
+    """Valores da coluna prontos para JSON (nulos como None)"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime("%Y-%m-%d %H:%M:%S").where(serie.notna(), None).tolist()
+    if pd.api.types.is_float_dtype(serie):
+        return [None if v != v else v for v in serie.tolist()]
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+def _coluna(valores: list, dtype: str) -> pd.Series:
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(pd.Series(valores, dtype=object))
+    try:
+        return pd.Series(valores, dtype=dtype)
+    except (TypeError, ValueError):
+        return pd.Series(valores, dtype=object)
+
+
+def codificar(valor):
+    """DataFrames, tuplas e datas -> estruturas JSON marcadas (__frame__, __tupla__, __data__)"""
+    if isinstance(valor, pd.DataFrame):
+        return {"__frame__": {
+            "colunas": [str(c) for c in valor.columns],
+            "dtypes": [str(t) for t in valor.dtypes],
+            "dados": [_valores_coluna(valor.iloc[:, i]) for i in range(valor.shape[1])],
+        }}
+    if isinstance(valor, tuple):
+        return {"__tupla__": [codificar(v) for v in valor]}
+    if isinstance(valor, list):
+        return [codificar(v) for v in valor]
+    if isinstance(valor, dict):
+        return {str(k): codificar(v) for k, v in valor.items()}
+    if isinstance(valor, (datetime, date)):
+        return {"__data__": valor.isoformat()}
+    return valor
+
+
+def decodificar(valor):
+    """Inverso de codificar"""
+    if isinstance(valor, list):
+        return [decodificar(v) for v in valor]
+    if not isinstance(valor, dict):
+        return valor
+    if "__frame__" in valor:
+        frame = valor["__frame__"]
+        return pd.DataFrame({
+            nome: _coluna(dados, dtype) for nome, dtype, dados in zip(frame["colunas"], frame["dtypes"], frame["dados"])
+        }, columns=frame["colunas"])
+    if "__tupla__" in valor:
+        return tuple(decodificar(v) for v in valor["__tupla__"])
+    if "__data__" in valor:
+        return datetime.fromisoformat(valor["__data__"])
+    return {k: decodificar(v) for k, v in valor.items()}
+
+
+def _json_padrao(valor):
+    """Tipos que o json não conhece (numpy, Decimal do MySQL, Timestamp)"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if hasattr(valor, "item"):
+        return valor.item()
+    return str(valor)
+
+
+def para_json(valor) -> bytes:
+    return json.dumps(codificar(valor), ensure_ascii=False, default=_json_padrao).encode("utf-8")
+
+
+def de_json(corpo: bytes):
+    return decodificar(json.loads(corpo.decode("utf-8")))
+
+
+# ============================================================
+# SERVIDOR
+# ============================================================
+
+_cache_respostas = {}
+_cache_lock = threading.Lock()
+
+
+def _conferir_sessao(operacoes: list):
+    """
+    aplicar_sessao remoto: inserir/upsert/excluir só em TABELAS_SESSAO e só com
+    colunas da tabela (chave, coluna, ao_inserir e as colunas do DataFrame vão no SQL)
+    """
+    import esquema
+    for nome, args, kwargs in operacoes:
+        if nome not in PARAMETROS_SESSAO:
+            continue
+        valores = {"chave": "id", **dict(zip(PARAMETROS_SESSAO[nome], args)), **kwargs}
+        tabela = valores.get("tabela")
+        if tabela not in TABELAS_SESSAO:
+            raise PermissionError(f"Tabela não permitida na sessão remota: {tabela}")
+        nomes = [valores["coluna"]] if nome == "excluir" else list(getattr(valores.get("df"), "columns", []))
+        if nome == "upsert":
+            nomes += [valores["chave"], *(valores.get("ao_inserir") or {})]
+        try:
+            esquema.conferir_colunas(tabela, nomes)
+        except ValueError as e:
+            raise PermissionError(f"Sessão remota recusada: {e}") from e
+
+
+def _executar(nome: str, args: list, kwargs: dict):
+    """Roda a operação de db_client na thread do banco (db_async), sem COLUNAS_OCULTAS no resultado"""
+    import db_async
+    import db_client
+    if nome == "aplicar_sessao":
+        _conferir_sessao(args[0] if args else kwargs.get("operacoes", []))
+    resultado = db_async.submeter(getattr(db_client, nome), *args, **kwargs).result()
+    if isinstance(resultado, pd.DataFrame):
+        resultado = resultado.drop(columns=COLUNAS_OCULTAS, errors="ignore")
+    return resultado
+
+
+def _resposta(nome: str, corpo: bytes) -> tuple:
+    """(JSON, JSON comprimido) da chamada, do cache quando as tabelas não mudaram"""
+    tabelas = LEITURAS.get(nome)
+    if tabelas is None:
+        pedido = de_json(corpo) if corpo else {}
+        return para_json({"resultado": _executar(nome, pedido.get("args", []), pedido.get("kwargs", {}))}), None
+    
+    import db_client
+    chave = (nome, corpo)
+    versao = db_client.versao_dados(tabelas)  # Lida ANTES da consulta, como no cache de db_client
+    with _cache_lock:
+        guardado = _cache_respostas.get(chave)
+    if guardado is not None and guardado[0] == versao:
+        return guardado[1], guardado[2]
+    
+    pedido = de_json(corpo) if corpo else {}
+    resultado = _executar(nome, pedido.get("args", []), pedido.get("kwargs", {}))
+    json_resposta = para_json({"resultado": resultado})
+    if isinstance(resultado, pd.DataFrame) and resultado.empty:
+        return json_resposta, None  # Vazio (ou erro de leitura): não guardar
+    comprimido = gzip.compress(json_resposta, NIVEL_GZIP) if len(json_resposta) >= MIN_BYTES_GZIP else None
+    with _cache_lock:
+        _cache_respostas.pop(chave, None)
+        _cache_respostas[chave] = (versao, json_resposta, comprimido)
+        while len(_cache_respostas) > MAX_RESPOSTAS_CACHE:
+            _cache_respostas.pop(next(iter(_cache_respostas)))
+    return json_resposta, comprimido
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Conexão mantida entre chamadas do mesmo cliente
+    timeout = 300  # Conexão ociosa é fechada (o cliente reabre)
+    token = ""
+    
+    def log_message(self, formato, *args):
+        pass  # Sem uma linha por requisição no console
+    
+    def _enviar(self, status: int, corpo: bytes, comprimido: bytes = None):
+        aceita_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if aceita_gzip and comprimido is None and len(corpo) >= MIN_BYTES_GZIP:
+            comprimido = gzip.compress(corpo, NIVEL_GZIP)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if aceita_gzip and comprimido is not None:
+            corpo = comprimido
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def _erro(self, status: int, mensagem: str):
+        self._enviar(status, para_json({"erro": mensagem}))
+    
+    def _autorizado(self) -> bool:
+        """Confere o X-Token (sem token configurado, só em 127.0.0.1: ver criar_servidor)"""
+        return not self.token or hmac.compare_digest(self.headers.get("X-Token", "").encode(), self.token.encode())
+    
+    def do_GET(self):
+        if not self._autorizado():
+            return self._erro(403, "Token inválido")
+        if self.path != "/saude":
+            return self._erro(404, f"Caminho desconhecido: {self.path}")
+        import db_client
+        banco = db_client.DB_TYPE
+        info = {"ok": True, "banco": banco}
+        if banco == "sqlite":
+            from sqlite_client import _get_db_path
+            info["caminho"] = _get_db_path()
+        self._enviar(200, para_json(info))
+    
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        if not self._autorizado():
+            return self._erro(403, "Token inválido")
+        if not self.path.startswith("/chamar/"):
+            return self._erro(404, f"Caminho desconhecido: {self.path}")
+        
+        nome = self.path[len("/chamar/"):]
+        if nome not in OPERACOES:
+            return self._erro(404, f"Operação não disponível no serviço: {nome}")
+        
+        try:
+            if self.headers.get("Content-Encoding") == "gzip":
+                corpo = gzip.decompress(corpo)
+            json_resposta, comprimido = _resposta(nome, corpo)
+        except Exception as e:
+            print(f"[SERVICO] Erro em {nome}: {e}")
+            return self._erro(500, f"{type(e).__name__}: {e}")
+        self._enviar(200, json_resposta, comprimido)
+
+
+def _so_local(host: str) -> bool:
+    """host aceita conexões só desta máquina (127.x, ::1, localhost)"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def criar_servidor(host: str = "0.0.0.0", porta: int = PORTA_PADRAO, token: str = "") -> ThreadingHTTPServer:
+    """
+    Servidor pronto para serve_forever() (porta 0 escolhe uma livre: servidor.server_address).
+    Fora de 127.0.0.1 exige token: sem ele qualquer máquina da rede usaria o banco.
+    """
+    import db_client
+    if db_client.DB_TYPE == "servico":
+        raise RuntimeError("O serviço precisa de db_type sqlite ou mysql nesta máquina (está 'servico')")
+    if not token and not _so_local(host):
+        raise RuntimeError(f"Sem token configurado o serviço só atende em 127.0.0.1 (pedido: {host}). "
+                           'Defina "servico": {"token": "..."} em server_config.json (servidor e clientes) '
+                           "ou use network_config.set_service_mode(host, porta, token)")
+    
+    manipulador = type("Manipulador", (_Manipulador,), {"token": token})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_em_thread(host: str = "127.0.0.1", porta: int = 0, token: str = "") -> ThreadingHTTPServer:
+    """Sobe o servidor numa thread daemon (para testes em localhost); encerrar com .shutdown()"""
+    servidor = criar_servidor(host, porta, token)
+    threading.Thread(target=servidor.serve_forever, name="servico_dados", daemon=True).start()
+    return servidor
+
+
+def main():
+    from network_config import get_service_config
+    
+    config = get_service_config()
+    host, porta = "0.0.0.0", config["porta"]
+    if "--host" in sys.argv:
+        host = sys.argv[sys.argv.index("--host") + 1]
+    if "--porta" in sys.argv:
+        porta = int(sys.argv[sys.argv.index("--porta") + 1])
+    
+    try:
+        servidor = criar_servidor(host, porta, config.get("token", ""))
+    except RuntimeError as e:
+        print(f"[SERVICO] {e}")
+        sys.exit(1)
+    print(f"[SERVICO] Atendendo em http://{host}:{porta} (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
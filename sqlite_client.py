@@ -5,11 +5,17 @@ Suporta modo WAL para melhor concorrência em rede
 """
 import sqlite3
 import os
+import threading
+import time
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional
 from pathlib import Path
 
+import arquivo_historico
+import esquema
+
 try:
     from network_config import get_database_path
     USE_NETWORK_CONFIG = True
@@ -31,17 +37,38 @@ def _garantir_pasta():
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
 
-def get_connection():
-    """Retorna conexão com o banco SQLite"""
-    _garantir_pasta()
-    db_path = _get_db_path()
+class _ConexaoCompartilhada(sqlite3.Connection):
+    """
+    Conexão reaproveitada entre chamadas na mesma thread.
+    close() não fecha de verdade: apenas descarta a transação pendente
+    (o mesmo efeito de fechar sem commit), para que o código existente
+    continue usando o padrão get_connection() ... conn.close().
+    """
     
-    conn = sqlite3.connect(db_path, timeout=30.0)  # Timeout maior para rede
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+    
+    def fechar(self):
+        """Fecha a conexão de fato"""
+        super().close()
+
+
+# Conexões por thread ({caminho do banco: conexão}) e bancos com schema já verificado
+_conexoes_thread = threading.local()
+_schema_verificado = set()
+_schema_lock = threading.Lock()
+
+
+def _abrir_conexao(db_path: str) -> sqlite3.Connection:
+    """Abre a conexão e aplica os PRAGMAs (uma vez por conexão)"""
+    conn = sqlite3.connect(db_path, timeout=30.0, factory=_ConexaoCompartilhada)  # Timeout maior para rede
     conn.row_factory = sqlite3.Row
     
     # Habilitar modo WAL para melhor concorrência
     # Permite múltiplos leitores simultâneos
     try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Só vale para bancos novos (os antigos: manutencao_banco)
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("PRAGMA synchronous=NORMAL")  # Melhor performance
         conn.execute("PRAGMA busy_timeout=30000")  # 30 segundos de timeout
@@ -51,19 +78,71 @@ def get_connection():
     return conn
 
 
+def get_connection():
+    """
+    Retorna a conexão SQLite da thread atual.
+    A conexão é aberta na primeira chamada de cada thread e reaproveitada
+    nas seguintes (conn.close() não a fecha; use fechar_conexoes()).
+    """
+    db_path = _get_db_path()
+    cache = getattr(_conexoes_thread, "conexoes", None)
+    if cache is None:
+        cache = _conexoes_thread.conexoes = {}
+    
+    conn = cache.get(db_path)
+    if conn is not None:
+        try:
+            conn.execute("SELECT 1")
+            return conn
+        except sqlite3.ProgrammingError:
+            # Conexão fechada com fechar(): abrir outra
+            cache.pop(db_path, None)
+    
+    _garantir_pasta()
+    conn = _abrir_conexao(db_path)
+    cache[db_path] = conn
+    return conn
+
+
+def fechar_conexoes():
+    """Fecha as conexões abertas pela thread atual (ex.: ao encerrar um worker)"""
+    cache = getattr(_conexoes_thread, "conexoes", None) or {}
+    for conn in cache.values():
+        try:
+            conn.fechar()
+        except Exception:
+            pass
+    cache.clear()
+
+
 def criar_tabelas():
-    """Cria as tabelas se não existirem - só cria se o banco já existir ou precisar ser criado"""
+    """
+    Cria as tabelas se não existirem - só cria se o banco já existir ou precisar ser criado.
+    A verificação roda uma vez por processo para cada banco.
+    """
     db_path = _get_db_path()
+    if db_path in _schema_verificado:
+        return
     
+    with _schema_lock:
+        if db_path in _schema_verificado:
+            return
+        _verificar_schema(db_path)
+        _schema_verificado.add(db_path)
+
+
+def _verificar_schema(db_path: str):
+    """Cria as tabelas ausentes e aplica as migrações pendentes"""
     # Se o banco já existe, verificar se já tem as tabelas principais
     if os.path.exists(db_path):
         try:
-            conn = sqlite3.connect(db_path, timeout=30.0)
+            conn = get_connection()
             cursor = conn.cursor()
             # Verificar se a tabela produtos já existe
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='produtos'")
             if cursor.fetchone():
-                # Tabela já existe, não precisa criar novamente
+                # Tabela já existe, só aplicar migrações pendentes
+                aplicar_migracoes(conn)
                 conn.close()
                 return
             conn.close()
@@ -75,48 +154,19 @@ def criar_tabelas():
     cursor = conn.cursor()
     
     # Tabela produtos (dados atuais - equivale a Pagina1)
-    cursor.execute("""
+    # Preços/fretes são criados como TEXT e convertidos para centavos pela migração v6
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS produtos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo_produto TEXT,
-            sku_seller TEXT,
-            nome_esperado TEXT,
-            link TEXT,
-            site_disponivel TEXT,
-            vendedor_1 TEXT,
-            preco_1 TEXT,
-            frete_1 TEXT,
-            vendedor_2 TEXT,
-            preco_2 TEXT,
-            frete_2 TEXT,
-            vendedor_3 TEXT,
-            preco_3 TEXT,
-            frete_3 TEXT,
-            status_final TEXT,
-            data_verificacao TEXT
+            {esquema.ddl("produtos", "sqlite", legado=True)}
         )
     """)
     
-    # Tabela historico (equivale a Pagina2)
-    cursor.execute("""
+    # Tabela historico (equivale a Pagina2); coletado_em vem da migração v2
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS historico (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo_produto TEXT,
-            nome_esperado TEXT,
-            link TEXT,
-            site_disponivel TEXT,
-            vendedor_1 TEXT,
-            preco_1 TEXT,
-            frete_1 TEXT,
-            vendedor_2 TEXT,
-            preco_2 TEXT,
-            frete_2 TEXT,
-            vendedor_3 TEXT,
-            preco_3 TEXT,
-            frete_3 TEXT,
-            status_final TEXT,
-            data_verificacao TEXT,
-            data_coleta TEXT
+            {esquema.ddl("historico", "sqlite", legado=True, sem=("coletado_em",))}
         )
     """)
     
@@ -139,12 +189,218 @@ def criar_tabelas():
         pass # Coluna ja existe
     
     conn.commit()
+    aplicar_migracoes(conn)
     conn.close()
     print("[OK] Tabelas SQLite criadas/verificadas.")
 
 
+# ============================================================
+# CARGA EM MASSA
+# ============================================================
+
+def _linhas_para_insert(df: pd.DataFrame):
+    """
+    Tuplas prontas para o driver (NaN -> None, tipos numpy -> Python).
+    Converte coluna a coluna para arrays de objetos e monta as linhas sob demanda.
+    """
+    colunas = [serie.to_numpy(dtype=object, na_value=None) for _, serie in df.items()]
+    return zip(*colunas)
+
+
+def inserir_em_massa(conn, tabela: str, df: pd.DataFrame) -> int:
+    """
+    Insere o DataFrame com um único INSERT preparado + executemany, dentro da
+    transação corrente da conexão (não faz commit). Retorna o número de linhas.
+    """
+    if df.empty:
+        return 0
+    colunas = list(df.columns)
+    conn.executemany(
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+        _linhas_para_insert(df)
+    )
+    return len(df)
+
+
+# ============================================================
+# MIGRAÇÕES DE SCHEMA (versionadas via PRAGMA user_version)
+# ============================================================
+
+# Converte data_coleta (dd/mm/YYYY HH:MM:SS) para ISO-8601 dentro do SQL
+_SQL_DATA_ISO = ("substr(data_coleta, 7, 4) || '-' || substr(data_coleta, 4, 2) || '-' || "
+                 "substr(data_coleta, 1, 2) || substr(data_coleta, 11)")
+
+
+def _adicionar_coluna(conn, tabela: str, coluna: str, tipo: str):
+    """Adiciona uma coluna se ela ainda não existir"""
+    colunas = [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")]
+    if coluna not in colunas:
+        conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+
+# Versão da migração que converte preços/fretes para centavos
+VERSAO_CENTAVOS = 6
+
+# (versão, descrição, comandos) - aplicadas em ordem, uma única vez por banco.
+# Cada comando é um SQL ou uma função que recebe a conexão.
+MIGRACOES = [
+    (1, "Índices secundários de produtos e histórico", [
+        # importar_skus busca produto por sku_seller linha a linha
+        "CREATE INDEX IF NOT EXISTS idx_produtos_sku_seller ON produtos(sku_seller)",
+        # JOIN histórico -> produtos nos relatórios
+        "CREATE INDEX IF NOT EXISTS idx_produtos_codigo_produto ON produtos(codigo_produto)",
+        # Filtros/ordenação por SKU e data. O rowid (id) vai implícito no fim do
+        # índice, então ele também cobre o "MAX(id) GROUP BY codigo_produto"
+        # usado para pegar o último registro de cada SKU.
+        "CREATE INDEX IF NOT EXISTS idx_historico_codigo_data ON historico(codigo_produto, data_coleta)",
+    ]),
+    (2, "Data de coleta ordenável (ISO-8601) em coletado_em", [
+        lambda conn: _adicionar_coluna(conn, "historico", "coletado_em", "TEXT"),
+        lambda conn: _criar_tabela_backup(conn.cursor()),
+        lambda conn: _adicionar_coluna(conn, "historico_backup", "coletado_em", "TEXT"),
+        # dd/mm/YYYY HH:MM:SS -> YYYY-MM-DD HH:MM:SS
+        f"UPDATE historico SET coletado_em = {_SQL_DATA_ISO} "
+        "WHERE coletado_em IS NULL AND data_coleta LIKE '__/__/____ __:__:__'",
+        f"UPDATE historico_backup SET coletado_em = {_SQL_DATA_ISO} "
+        "WHERE coletado_em IS NULL AND data_coleta LIKE '__/__/____ __:__:__'",
+        "CREATE INDEX IF NOT EXISTS idx_historico_coletado_em ON historico(coletado_em)",
+    ]),
+    (3, "Histórico particionado por mês (historico_AAAAMM + view historico)", [
+        lambda conn: _particionar_historico(conn),
+    ]),
+    (4, "Rollup diário do histórico (historico_diario + historico_diario_buybox)", [
+        """
+        CREATE TABLE IF NOT EXISTS historico_diario (
+            codigo_produto TEXT NOT NULL,
+            vendedor TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            preco_min REAL,
+            preco_max REAL,
+            preco_soma REAL,
+            ofertas INTEGER,
+            vezes_buybox INTEGER,
+            preco_ultimo REAL,
+            coletado_em TEXT,
+            PRIMARY KEY (codigo_produto, vendedor, dia)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_historico_diario_dia ON historico_diario(dia)",
+        """
+        CREATE TABLE IF NOT EXISTS historico_diario_buybox (
+            codigo_produto TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            vendedor TEXT,
+            preco REAL,
+            coletado_em TEXT,
+            PRIMARY KEY (codigo_produto, dia)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_historico_diario_buybox_dia ON historico_diario_buybox(dia)",
+        lambda conn: _preencher_historico_diario(conn),
+    ]),
+    (5, "Último registro por SKU (historico_latest)", [
+        lambda conn: _criar_historico_latest(conn),
+    ]),
+    (VERSAO_CENTAVOS, "Preços e fretes em centavos (INTEGER) + frete_tipo_N", [
+        lambda conn: _migrar_precos_centavos(conn),
+    ]),
+    (7, "Ofertas normalizadas (uma linha por vendedor) + view ofertas_top3", [
+        lambda conn: _criar_tabela_ofertas(conn),
+    ]),
+]
+
+# Consultas representativas usadas para comparar o plano antes/depois das migrações
+CONSULTAS_REFERENCIA = {
+    "Produto por sku_seller": "SELECT id FROM produtos WHERE sku_seller = 'x'",
+    "Último registro por SKU": "SELECT MAX(id) FROM historico GROUP BY codigo_produto",
+    "Histórico de um SKU": "SELECT * FROM historico WHERE codigo_produto = 'x' ORDER BY data_coleta",
+    "Último registro + produto": """
+        SELECT h.codigo_produto, p.sku_seller FROM historico h
+        LEFT JOIN produtos p ON h.codigo_produto = p.codigo_produto
+        WHERE h.id IN (SELECT MAX(id) FROM historico GROUP BY codigo_produto)
+    """,
+}
+
+
+def planos_de_consulta(conn) -> dict:
+    """Retorna o EXPLAIN QUERY PLAN resumido de cada consulta de referência"""
+    planos = {}
+    for nome, sql in CONSULTAS_REFERENCIA.items():
+        try:
+            linhas = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            planos[nome] = " | ".join(str(linha[3]) for linha in linhas)
+        except sqlite3.Error as e:
+            planos[nome] = f"indisponível ({e})"
+    return planos
+
+
+def _custo_plano(plano: str) -> int:
+    """Passos caros do plano: SCAN de tabela sem índice e B-tree temporária (ORDER/GROUP BY)"""
+    passos = plano.split(" | ")
+    return sum(1 for p in passos if (p.startswith("SCAN ") and " USING " not in p) or "TEMP B-TREE" in p)
+
+
+def _comparar_planos(plano_antes: str, plano_depois: str) -> str:
+    """Marcador da comparação: MELHOROU/PIOROU só quando muda o número de passos caros"""
+    if plano_antes == plano_depois:
+        return "igual"
+    antes, depois = _custo_plano(plano_antes), _custo_plano(plano_depois)
+    if depois < antes:
+        return "MELHOROU"
+    if depois > antes:
+        return "PIOROU"
+    return "mudou"
+
+
+def aplicar_migracoes(conn) -> list:
+    """
+    Aplica as migrações pendentes (versão > PRAGMA user_version).
+    Imprime e retorna a comparação de planos de consulta (nome, antes, depois).
+    """
+    versao_atual = conn.execute("PRAGMA user_version").fetchone()[0]
+    pendentes = [m for m in MIGRACOES if m[0] > versao_atual]
+    if not pendentes:
+        return []
+    
+    antes = planos_de_consulta(conn)
+    
+    for versao, descricao, comandos in pendentes:
+        for comando in comandos:
+            if callable(comando):
+                comando(conn)
+            else:
+                conn.execute(comando)
+        conn.execute(f"PRAGMA user_version = {versao}")
+        conn.commit()
+        print(f"[MIGRACAO] v{versao}: {descricao}")
+    
+    # Atualizar estatísticas para o planejador usar os novos índices
+    conn.execute("ANALYZE")
+    conn.commit()
+    
+    depois = planos_de_consulta(conn)
+    comparacao = [(nome, antes[nome], depois[nome]) for nome in CONSULTAS_REFERENCIA]
+    
+    print("[MIGRACAO] Planos de consulta (antes -> depois):")
+    for nome, plano_antes, plano_depois in comparacao:
+        marcador = _comparar_planos(plano_antes, plano_depois)
+        print(f"  - {nome} [{marcador}]")
+        print(f"      antes : {plano_antes}")
+        print(f"      depois: {plano_depois}")
+    
+    return comparacao
+
+
+# Bancos em que já há usuários: o admin padrão não precisa ser conferido de novo
+_usuarios_verificados = set()
+
+
 def criar_usuario_padrao():
-    """Cria um usuário admin padrão se não existir nenhum"""
+    """Cria um usuário admin padrão se não existir nenhum (conferido uma vez por processo)"""
+    db_path = _get_db_path()
+    if db_path in _usuarios_verificados:
+        return
+    
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM usuarios")
@@ -160,9 +416,429 @@ def criar_usuario_padrao():
         print("[OK] Usuario admin padrao criado como MASTER (admin/admin)")
     # Removido: não resetar mais o role do admin a cada inicialização
     
+    _usuarios_verificados.add(db_path)
     conn.close()
 
 
+# ============================================================
+# PARTICIONAMENTO MENSAL DO HISTÓRICO
+# ============================================================
+# Cada mês fica em uma tabela própria (historico_AAAAMM) e "historico" é uma
+# VIEW com UNION ALL de todas elas, então as leituras existentes continuam
+# funcionando. Os ids são globais (tabela historico_sequencia), para que
+# "MAX(id)" continue significando "registro mais recente".
+
+COLUNAS_HISTORICO = esquema.colunas("historico")
+
+# Colunas anteriores à migração v6 (tudo TEXT, sem frete_tipo_N)
+COLUNAS_HISTORICO_TEXTO = esquema.colunas("historico", legado=True)
+
+# Registros antigos cuja data não pôde ser convertida
+PARTICAO_SEM_DATA = "000000"
+
+
+def _nome_particao(chave: str) -> str:
+    return f"historico_{chave}"
+
+
+def _chave_particao(momento: datetime) -> str:
+    return momento.strftime("%Y%m")
+
+
+def _inicio_mes(chave: str) -> str:
+    """Primeiro instante do mês da partição, no formato de coletado_em"""
+    return f"{chave[:4]}-{chave[4:]}-01 00:00:00"
+
+
+def _proximo_mes(chave: str) -> str:
+    ano, mes = int(chave[:4]), int(chave[4:])
+    return f"{ano + 1}01" if mes == 12 else f"{ano}{mes + 1:02d}"
+
+
+def _listar_particoes(conn) -> list:
+    """Chaves (AAAAMM) das partições existentes, em ordem"""
+    rows = conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name GLOB 'historico_[0-9][0-9][0-9][0-9][0-9][0-9]'
+        ORDER BY name
+    """).fetchall()
+    return [row[0][len("historico_"):] for row in rows]
+
+
+def _colunas_particao(conn) -> list:
+    """
+    (coluna, tipo) das partições: segue as partições existentes, para que a
+    view continue consistente; sem nenhuma, o schema da versão do banco.
+    """
+    particoes = _listar_particoes(conn)
+    if particoes:
+        info = conn.execute(f"PRAGMA table_info({_nome_particao(particoes[-1])})").fetchall()
+        return [(row[1], row[2] + (" NOT NULL" if row[3] else "") + (f" DEFAULT {row[4]}" if row[4] is not None else ""))
+                for row in info if row[1] != "id"]
+    legado = conn.execute("PRAGMA user_version").fetchone()[0] < VERSAO_CENTAVOS
+    return esquema.definicoes("historico", "sqlite", legado=legado)
+
+
+def _criar_particao(conn, chave: str) -> bool:
+    """Cria a tabela do mês com seus índices. Retorna True se ela não existia."""
+    nome = _nome_particao(chave)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)).fetchone():
+        return False
+    
+    colunas = ",\n            ".join(f"{c} {tipo}" for c, tipo in _colunas_particao(conn))
+    conn.execute(f"""
+        CREATE TABLE {nome} (
+            id INTEGER PRIMARY KEY,
+            {colunas}
+        )
+    """)
+    # O rowid (id) vai implícito no fim do índice: cobre também o MAX(id) por SKU
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{nome}_codigo_data ON {nome}(codigo_produto, coletado_em)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{nome}_coletado_em ON {nome}(coletado_em)")
+    return True
+
+
+def _recriar_view_historico(conn):
+    """Recria a view historico com todas as partições existentes"""
+    # A view precisa de pelo menos uma partição
+    _criar_particao(conn, _chave_particao(datetime.now()))
+    
+    colunas = "id, " + ", ".join(c for c, _ in _colunas_particao(conn))
+    selects = "\n    UNION ALL\n    ".join(
+        f"SELECT {colunas} FROM {_nome_particao(chave)}" for chave in _listar_particoes(conn)
+    )
+    conn.execute("DROP VIEW IF EXISTS historico")
+    conn.execute(f"CREATE VIEW historico AS\n    {selects}")
+
+
+def _particionar_historico(conn):
+    """Migração: distribui a tabela historico nas partições mensais"""
+    tipo = conn.execute("SELECT type FROM sqlite_master WHERE name = 'historico'").fetchone()
+    if tipo and tipo[0] == "view":
+        return
+    
+    conn.execute("CREATE TABLE IF NOT EXISTS historico_sequencia (ultimo_id INTEGER NOT NULL)")
+    ultimo_id = 0
+    
+    if tipo:
+        conn.execute("ALTER TABLE historico RENAME TO historico_nao_particionado")
+        colunas = "id, " + ", ".join(COLUNAS_HISTORICO_TEXTO)
+        
+        meses = conn.execute("""
+            SELECT DISTINCT substr(coletado_em, 1, 4) || substr(coletado_em, 6, 2)
+            FROM historico_nao_particionado WHERE coletado_em IS NOT NULL
+        """).fetchall()
+        for (chave,) in meses:
+            _criar_particao(conn, chave)
+            conn.execute(f"""
+                INSERT INTO {_nome_particao(chave)} ({colunas})
+                SELECT {colunas} FROM historico_nao_particionado
+                WHERE coletado_em >= ? AND coletado_em < ?
+            """, (_inicio_mes(chave), _inicio_mes(_proximo_mes(chave))))
+        
+        if conn.execute("SELECT 1 FROM historico_nao_particionado WHERE coletado_em IS NULL LIMIT 1").fetchone():
+            _criar_particao(conn, PARTICAO_SEM_DATA)
+            conn.execute(f"""
+                INSERT INTO {_nome_particao(PARTICAO_SEM_DATA)} ({colunas})
+                SELECT {colunas} FROM historico_nao_particionado WHERE coletado_em IS NULL
+            """)
+        
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM historico_nao_particionado").fetchone()[0]
+        conn.execute("DROP TABLE historico_nao_particionado")
+    
+    conn.execute("DELETE FROM historico_sequencia")
+    conn.execute("INSERT INTO historico_sequencia (ultimo_id) VALUES (?)", (ultimo_id,))
+    _recriar_view_historico(conn)
+
+
+def _inserir_na_particao(conn, df_envio: pd.DataFrame, momento: datetime):
+    """Insere as linhas na partição do mês, reservando ids na sequência global"""
+    chave = _chave_particao(momento)
+    if _criar_particao(conn, chave):
+        _recriar_view_historico(conn)
+    
+    n = len(df_envio)
+    conn.execute("UPDATE historico_sequencia SET ultimo_id = ultimo_id + ?", (n,))
+    ultimo_id = conn.execute("SELECT ultimo_id FROM historico_sequencia").fetchone()[0]
+    
+    df_envio = df_envio.copy()
+    df_envio.insert(0, "id", range(ultimo_id - n + 1, ultimo_id + 1))
+    inserir_em_massa(conn, _nome_particao(chave), df_envio)
+
+
+def _fonte_historico(conn, data_inicio: Optional[datetime], data_fim: Optional[datetime]):
+    """
+    Retorna (fonte, params) para o FROM de uma consulta ao histórico.
+    Sem período é a view historico; com período, apenas as partições do
+    intervalo já filtradas por coletado_em. fonte é None se nenhuma partição
+    cobre o período.
+    """
+    if data_inicio is None and data_fim is None:
+        return "historico", []
+    
+    chaves = [c for c in _listar_particoes(conn) if c != PARTICAO_SEM_DATA]
+    filtros = []
+    params = []
+    
+    if data_inicio is not None:
+        chaves = [c for c in chaves if c >= _chave_particao(data_inicio)]
+        filtros.append("coletado_em >= ?")
+        params.append(data_inicio.strftime("%Y-%m-%d %H:%M:%S"))
+    if data_fim is not None:
+        chaves = [c for c in chaves if c <= _chave_particao(data_fim)]
+        filtros.append("coletado_em < ?")
+        params.append(data_fim.strftime("%Y-%m-%d %H:%M:%S"))
+    
+    if not chaves:
+        return None, []
+    
+    colunas = "id, " + ", ".join(COLUNAS_HISTORICO)
+    where = " AND ".join(filtros)
+    uniao = " UNION ALL ".join(
+        f"SELECT {colunas} FROM {_nome_particao(chave)} WHERE {where}" for chave in chaves
+    )
+    return f"({uniao}) AS h", params * len(chaves)
+
+
+# ============================================================
+# PREÇOS E FRETES EM CENTAVOS
+# ============================================================
+# No banco, preco_N e frete_N são INTEGER (centavos, NULL quando não há valor)
+# e frete_tipo_N diz se o frete é grátis, pago ou desconhecido. O resto do
+# sistema continua vendo reais (float), "-", "Gratis" e "Pago": a conversão
+# acontece na entrada (gravações) e na saída (leituras) deste módulo.
+
+FRETE_GRATIS = esquema.FRETE_GRATIS
+FRETE_PAGO = esquema.FRETE_PAGO
+FRETE_DESCONHECIDO = esquema.FRETE_DESCONHECIDO
+
+TIPOS_CENTAVOS = {c: esquema.TIPOS["centavos"][0] for c in esquema.colunas_do_tipo("historico", "centavos")}
+TIPO_FRETE_SQL = esquema.TIPOS["frete_tipo"][0]
+
+
+def _para_preco(serie: pd.Series) -> pd.Series:
+    return pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+
+def _para_centavos(serie: pd.Series) -> pd.Series:
+    """Reais (float ou texto) -> centavos inteiros; o que não é número vira NULL"""
+    return (_para_preco(serie) * 100).round().astype("Int64")
+
+
+def _centavos_para_reais(serie: pd.Series) -> pd.Series:
+    """Centavos -> reais (float), com "-" onde não há valor (formato da coleta)"""
+    reais = pd.to_numeric(serie, errors="coerce") / 100
+    return reais.round(2).astype(object).where(reais.notna(), "-")
+
+
+def _precos_para_centavos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte preco_N/frete_N (colunas do banco, em reais ou texto) para
+    centavos e acrescenta frete_tipo_N logo após cada frete_N. Altera o
+    próprio DataFrame (montado por esquema.para_banco).
+    """
+    for pos in (1, 2, 3):
+        preco, frete, tipo = f"preco_{pos}", f"frete_{pos}", f"frete_tipo_{pos}"
+        if preco in df.columns:
+            df[preco] = _para_centavos(df[preco])
+        if frete not in df.columns or tipo in df.columns:
+            continue
+        
+        texto = df[frete].astype(str).str.strip().str.lower()
+        gratis = texto.isin(["gratis", "grátis"])
+        valor = _para_centavos(df[frete])
+        tipos = (pd.Series(FRETE_DESCONHECIDO, index=df.index)
+                 .mask(valor.notna() | (texto == "pago"), FRETE_PAGO)
+                 .mask(gratis, FRETE_GRATIS))
+        df[frete] = valor.mask(gratis, 0)
+        df.insert(df.columns.get_loc(frete) + 1, tipo, tipos)
+    return df
+
+
+def _precos_para_exibicao(df: pd.DataFrame) -> pd.DataFrame:
+    """Inverso de _precos_para_centavos: reais, "-", "Gratis" e "Pago" (remove frete_tipo_N)"""
+    for pos in (1, 2, 3):
+        preco, frete, tipo = f"preco_{pos}", f"frete_{pos}", f"frete_tipo_{pos}"
+        if preco in df.columns:
+            df[preco] = _centavos_para_reais(df[preco])
+        if frete not in df.columns:
+            df = df.drop(columns=[tipo], errors="ignore")
+            continue
+        
+        reais = _centavos_para_reais(df[frete])
+        if tipo in df.columns:
+            tipos = df.pop(tipo)
+            reais = reais.mask(tipos == FRETE_GRATIS, "Gratis").mask((tipos == FRETE_PAGO) & df[frete].isna(), "Pago")
+        df[frete] = reais
+    return df
+
+
+def _sql_numero(coluna: str) -> str:
+    """Condição SQL: o texto da coluna é um número (aceita vírgula decimal)"""
+    texto = f"REPLACE(TRIM({coluna}), ',', '.')"
+    return f"({texto} GLOB '[0-9]*' AND {texto} NOT GLOB '*[^0-9.]*')"
+
+
+def _sql_centavos(coluna: str) -> str:
+    """Expressão SQL: texto em reais -> centavos inteiros (NULL se não é número)"""
+    texto = f"REPLACE(TRIM({coluna}), ',', '.')"
+    return f"CASE WHEN {_sql_numero(coluna)} THEN CAST(ROUND(CAST({texto} AS REAL) * 100) AS INTEGER) END"
+
+
+def _converter_para_centavos(conn, tabela: str):
+    """
+    Reconstrói a tabela com preco_N/frete_N INTEGER (centavos) e frete_tipo_N,
+    convertendo os valores com um único INSERT ... SELECT. Preserva chave
+    primária, AUTOINCREMENT e índices. Tabelas já convertidas são ignoradas.
+    """
+    info = conn.execute(f"PRAGMA table_info({tabela})").fetchall()
+    tipos = {row[1]: row[2].upper() for row in info}
+    if "preco_1" not in tipos or tipos["preco_1"] == "INTEGER":
+        return
+    
+    sql_tabela = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (tabela,)).fetchone()[0]
+    indices = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (tabela,))]
+    autoincremento = "AUTOINCREMENT" in sql_tabela.upper()
+    
+    definicoes, destino, origem = [], [], []
+    for row in info:
+        nome, tipo, pk = row[1], row[2] or "TEXT", row[5]
+        definicao = f"{nome} {TIPOS_CENTAVOS.get(nome, tipo)}"
+        if pk:
+            definicao += " PRIMARY KEY" + (" AUTOINCREMENT" if autoincremento else "")
+        definicoes.append(definicao)
+        destino.append(nome)
+        
+        if nome.startswith("preco_"):
+            origem.append(_sql_centavos(nome))
+        elif nome.startswith("frete_"):
+            gratis = f"LOWER(TRIM({nome})) IN ('gratis', 'grátis')"
+            origem.append(f"CASE WHEN {gratis} THEN 0 ELSE {_sql_centavos(nome)} END")
+            definicoes.append(f"frete_tipo_{nome[len('frete_'):]} {TIPO_FRETE_SQL}")
+            destino.append(f"frete_tipo_{nome[len('frete_'):]}")
+            origem.append(f"CASE WHEN {gratis} THEN '{FRETE_GRATIS}' "
+                          f"WHEN {_sql_numero(nome)} OR LOWER(TRIM({nome})) = 'pago' THEN '{FRETE_PAGO}' "
+                          f"ELSE '{FRETE_DESCONHECIDO}' END")
+        else:
+            origem.append(nome)
+    
+    nova = f"{tabela}_centavos"
+    conn.execute(f"DROP TABLE IF EXISTS {nova}")
+    conn.execute(f"CREATE TABLE {nova} ({', '.join(definicoes)})")
+    conn.execute(f"INSERT INTO {nova} ({', '.join(destino)}) SELECT {', '.join(origem)} FROM {tabela}")
+    conn.execute(f"DROP TABLE {tabela}")
+    conn.execute(f"ALTER TABLE {nova} RENAME TO {tabela}")
+    for sql_indice in indices:
+        conn.execute(sql_indice)
+
+
+def _migrar_precos_centavos(conn):
+    """Migração: preços e fretes em centavos em todas as tabelas (produtos, partições, latest, backup)"""
+    conn.execute("DROP VIEW IF EXISTS historico")
+    tabelas = ["produtos", "historico_latest", "historico_backup"]
+    tabelas += [_nome_particao(chave) for chave in _listar_particoes(conn)]
+    for tabela in tabelas:
+        _converter_para_centavos(conn, tabela)
+    _recriar_view_historico(conn)
+
+
+# ============================================================
+# VERSÃO DOS DADOS (cache de leitura do db_client)
+# ============================================================
+# PRAGMA data_version muda quando OUTRA conexão confirma uma gravação. Uma
+# conexão dedicada só a essa consulta enxerga então todas as gravações: as
+# das conexões por thread deste processo e as de outros processos (coleta,
+# outras máquinas no banco em rede).
+
+_conexoes_versao = {}
+_versao_lock = threading.Lock()
+
+
+def registrar_alteracao(cursor, tabela: str) -> None:
+    """Sem efeito no SQLite (data_version já detecta a gravação); existe pela paridade com o MySQL"""
+
+
+def versao_dados(tabelas: list) -> tuple:
+    """Versão atual do banco: muda sempre que alguma gravação for confirmada"""
+    db_path = _get_db_path()
+    with _versao_lock:
+        conn = _conexoes_versao.get(db_path)
+        if conn is None:
+            _garantir_pasta()
+            conn = _conexoes_versao[db_path] = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False)
+        return (db_path, conn.execute("PRAGMA data_version").fetchone()[0])
+
+
+# ============================================================
+# MANUTENÇÃO (VACUUM / ANALYZE / CHECKPOINT DO WAL)
+# ============================================================
+
+def _tamanho_banco(db_path: str) -> int:
+    """Bytes do arquivo do banco mais o WAL"""
+    return sum(os.path.getsize(c) for c in (db_path, db_path + "-wal") if os.path.exists(c))
+
+
+def _tempos_consultas(conn) -> dict:
+    """Tempo (ms) de cada consulta de referência"""
+    tempos = {}
+    for nome, sql in CONSULTAS_REFERENCIA.items():
+        inicio = time.perf_counter()
+        try:
+            conn.execute(sql).fetchall()
+            tempos[nome] = (time.perf_counter() - inicio) * 1000
+        except sqlite3.Error:
+            tempos[nome] = None
+    return tempos
+
+
+def manutencao_banco(completa: bool = False) -> dict:
+    """
+    Devolve ao disco o espaço das exclusões (salvar_planilha, retenção),
+    atualiza as estatísticas do planejador e esvazia o WAL:
+    PRAGMA incremental_vacuum, ANALYZE e PRAGMA wal_checkpoint(TRUNCATE).
+    Bancos criados sem auto_vacuum=INCREMENTAL passam por um VACUUM completo
+    na primeira vez (o mesmo que completa=True).
+    Retorna tamanhos, tempos das consultas de referência (antes/depois) e
+    duração de cada etapa.
+    """
+    criar_tabelas()
+    db_path = _get_db_path()
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.rollback()
+    
+    relatorio = {
+        "banco": db_path,
+        "tamanho_antes": _tamanho_banco(db_path),
+        "consultas_antes": _tempos_consultas(conn),
+        "etapas": {},
+    }
+    
+    def etapa(nome: str, sql: str, script: bool = False):
+        inicio = time.perf_counter()
+        resultado = conn.executescript(sql) if script else conn.execute(sql).fetchall()
+        relatorio["etapas"][nome] = time.perf_counter() - inicio
+        return resultado
+    
+    if completa or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Passa a valer com o VACUUM
+        etapa("VACUUM", "VACUUM")
+    else:
+        # Via executescript: execute() libera uma única página por chamada
+        etapa("incremental_vacuum", "PRAGMA incremental_vacuum", script=True)
+    etapa("ANALYZE", "ANALYZE")
+    ocupado, _, _ = etapa("wal_checkpoint(TRUNCATE)", "PRAGMA wal_checkpoint(TRUNCATE)")[0]
+    if ocupado:
+        print("[MANUTENCAO] WAL não pôde ser esvaziado: há leitores/escritores ativos no banco")
+    
+    relatorio["tamanho_depois"] = _tamanho_banco(db_path)
+    relatorio["consultas_depois"] = _tempos_consultas(conn)
+    relatorio["arquivo_parquet"] = arquivo_historico.tamanho_total(_pasta_arquivo())
+    return relatorio
+
+
 # ============================================================
 # FUNÇÕES DE PRODUTOS (substitui ler_planilha/salvar_planilha)
 # ============================================================
@@ -173,28 +849,8 @@ def ler_planilha() -> pd.DataFrame:
     conn = get_connection()
     
     try:
-        df = pd.read_sql_query("SELECT * FROM produtos", conn)
-        # Renomear colunas para manter compatibilidade
-        col_map = {
-            "codigo_produto": "codigo_produto",
-            "sku_seller": "sku_seller",
-            "nome_esperado": "nome_esperado",
-            "link": "link",
-            "site_disponivel": "Site Disponivel",
-            "vendedor_1": "Vendedor 1",
-            "preco_1": "Preco 1",
-            "frete_1": "Frete 1",
-            "vendedor_2": "Vendedor 2",
-            "preco_2": "Preco 2",
-            "frete_2": "Frete 2",
-            "vendedor_3": "Vendedor 3",
-            "preco_3": "Preco 3",
-            "frete_3": "Frete 3",
-            "status_final": "Status Final",
-            "data_verificacao": "Data Verificacao"
-        }
-        df = df.rename(columns=col_map)
-        return df
+        df = esquema.ler_cursor(conn.execute("SELECT * FROM produtos"), "produtos")
+        return esquema.exibir(_precos_para_exibicao(df), "produtos")
     except Exception as e:
         print(f"[SQLITE] Erro ao ler produtos: {e}")
         return pd.DataFrame()
@@ -202,54 +858,178 @@ def ler_planilha() -> pd.DataFrame:
         conn.close()
 
 
-def salvar_planilha(df: pd.DataFrame) -> None:
-    """Salva DataFrame na tabela produtos (substitui dados existentes)"""
+def contar_produtos() -> int:
+    """Retorna a quantidade de produtos cadastrados"""
+    criar_tabelas()
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM produtos").fetchone()[0]
+    except Exception as e:
+        print(f"[SQLITE] Erro ao contar produtos: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def ler_pagina_produtos(apos_id: int = 0, tamanho: int = 1000) -> pd.DataFrame:
+    """Uma página de produtos: até tamanho linhas com id > apos_id, em ordem de id"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute("SELECT * FROM produtos WHERE id > ? ORDER BY id LIMIT ?", (int(apos_id), int(tamanho)))
+        df = esquema.ler_cursor(cursor, "produtos")
+    finally:
+        conn.close()
+    return esquema.exibir(_precos_para_exibicao(df), "produtos")
+
+
+def ler_produtos_paginado(tamanho_pagina: int = 1000):
+    """
+    Lê a tabela produtos em páginas (paginação por id, sem OFFSET).
+    Cada página usa a conexão da thread que a pede, então o gerador pode ser
+    consumido de threads diferentes (ex: asyncio.to_thread).
+    """
     criar_tabelas()
+    ultimo_id = 0
     
-    if df is None or df.empty:
-        print("[AVISO] DataFrame vazio, nada para salvar.")
+    while True:
+        df = ler_pagina_produtos(ultimo_id, tamanho_pagina)
+        if df.empty:
+            return
+        
+        ultimo_id = int(df["id"].iloc[-1])
+        yield df
+        
+        if len(df) < tamanho_pagina:
+            return
+
+
+def _atualizar_produtos(conn, df: pd.DataFrame) -> int:
+    """UPDATE por id dos resultados da coleta, na transação corrente (sem commit)"""
+    if df is None or df.empty or "id" not in df.columns:
+        return 0
+    
+    colunas = [c for c in ["Site Disponivel",
+                           "Vendedor 1", "Preco 1", "Frete 1",
+                           "Vendedor 2", "Preco 2", "Frete 2",
+                           "Vendedor 3", "Preco 3", "Frete 3",
+                           "Status Final", "Data Verificacao"] if c in df.columns]
+    if not colunas:
+        return 0
+    
+    df_db = _precos_para_centavos(esquema.para_banco(df[colunas + ["id"]], "produtos"))
+    colunas_db = [c for c in df_db.columns if c != "id"]
+    sets = ", ".join(f"{c} = ?" for c in colunas_db)
+    conn.executemany(f"UPDATE produtos SET {sets} WHERE id = ?", _linhas_para_insert(df_db[colunas_db + ["id"]]))
+    return len(df_db)
+
+
+def atualizar_produtos_lote(df: pd.DataFrame) -> None:
+    """Atualiza, pelo id, os resultados da coleta de um lote de produtos"""
+    if df is None or df.empty or "id" not in df.columns:
         return
     
-    # Mapear nomes das colunas para o banco
-    col_map = {
-        "codigo_produto": "codigo_produto",
-        "sku_seller": "sku_seller",
-        "nome_esperado": "nome_esperado",
-        "link": "link",
-        "Site Disponivel": "site_disponivel",
-        "Vendedor 1": "vendedor_1",
-        "Preco 1": "preco_1",
-        "Frete 1": "frete_1",
-        "Vendedor 2": "vendedor_2",
-        "Preco 2": "preco_2",
-        "Frete 2": "frete_2",
-        "Vendedor 3": "vendedor_3",
-        "Preco 3": "preco_3",
-        "Frete 3": "frete_3",
-        "Status Final": "status_final",
-        "Data Verificacao": "data_verificacao"
+    conn = get_connection()
+    try:
+        _atualizar_produtos(conn, df)
+        conn.commit()
+    except Exception as e:
+        print(f"[SQLITE] Erro ao atualizar lote de produtos: {e}")
+    finally:
+        conn.close()
+
+
+def _normalizar_valor(v):
+    """Normaliza um valor para comparação com o que está gravado no banco"""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    return str(v)
+
+
+def _diferenca_produtos(atuais: dict, df_save: pd.DataFrame, colunas: list):
+    """
+    Compara o DataFrame com as linhas atuais do banco (id -> valores).
+    Retorna (alteradas, novas, ids_removidos): apenas linhas cujo conteúdo mudou
+    são devolvidas para upsert; linhas sem id são novas.
+    """
+    alteradas = []
+    novas = []
+    ids_vistos = set()
+    
+    for row in df_save[["id"] + colunas].itertuples(index=False):
+        valores = tuple(_normalizar_valor(v) for v in row[1:])
+        if pd.isna(row[0]):
+            novas.append(valores)
+            continue
+        
+        row_id = int(row[0])
+        ids_vistos.add(row_id)
+        if atuais.get(row_id) != valores:
+            alteradas.append((row_id,) + valores)
+    
+    ids_removidos = [i for i in atuais if i not in ids_vistos]
+    return alteradas, novas, ids_removidos
+
+
+def _salvar_produtos(conn, df: pd.DataFrame) -> str:
+    """Grava produtos (ver salvar_planilha) na transação corrente, sem commit; retorna o resumo"""
+    # Só as colunas conhecidas, já com os nomes do banco
+    df_save = _precos_para_centavos(esquema.para_banco(df, "produtos"))
+    colunas_presentes = [c for c in esquema.colunas("produtos") if c in df_save.columns]
+    
+    if "id" not in df_save.columns:
+        # Sem chave: limpar tabela e inserir novos dados
+        conn.execute("DELETE FROM produtos")
+        inserir_em_massa(conn, "produtos", df_save[colunas_presentes])
+        return f"{len(df_save)} linhas"
+    
+    colunas_sql = ", ".join(colunas_presentes)
+    atuais = {
+        row[0]: tuple(_normalizar_valor(v) for v in row[1:])
+        for row in conn.execute(f"SELECT id, {colunas_sql} FROM produtos")
     }
+    alteradas, novas, ids_removidos = _diferenca_produtos(atuais, df_save, colunas_presentes)
+    
+    if alteradas:
+        placeholders = ", ".join(["?"] * (len(colunas_presentes) + 1))
+        updates = ", ".join(f"{c} = excluded.{c}" for c in colunas_presentes)
+        conn.executemany(f"""
+            INSERT INTO produtos (id, {colunas_sql}) VALUES ({placeholders})
+            ON CONFLICT(id) DO UPDATE SET {updates}
+        """, alteradas)
+    
+    if novas:
+        placeholders = ", ".join(["?"] * len(colunas_presentes))
+        conn.executemany(f"INSERT INTO produtos ({colunas_sql}) VALUES ({placeholders})", novas)
+    
+    for i in range(0, len(ids_removidos), 500):
+        lote = ids_removidos[i:i + 500]
+        conn.execute(f"DELETE FROM produtos WHERE id IN ({','.join(['?'] * len(lote))})", lote)
+    
+    return (f"{len(alteradas)} alterados, {len(novas)} novos, "
+            f"{len(ids_removidos)} removidos, {len(df_save) - len(alteradas) - len(novas)} sem mudança")
+
+
+def salvar_planilha(df: pd.DataFrame) -> None:
+    """
+    Salva DataFrame na tabela produtos.
     
-    df_save = df.copy()
-    df_save = df_save.rename(columns=col_map)
+    Se o DataFrame traz a coluna id (como retornado por ler_planilha), faz um
+    UPSERT pela chave primária gravando apenas as linhas que mudaram, inserindo
+    as novas e removendo as que saíram. Sem id, substitui a tabela inteira.
+    """
+    criar_tabelas()
     
-    # Manter apenas colunas conhecidas
-    colunas_validas = ["codigo_produto", "sku_seller", "nome_esperado", "link", "site_disponivel", 
-                       "vendedor_1", "preco_1", "frete_1",
-                       "vendedor_2", "preco_2", "frete_2",
-                       "vendedor_3", "preco_3", "frete_3",
-                       "status_final", "data_verificacao"]
-    colunas_presentes = [c for c in colunas_validas if c in df_save.columns]
-    df_save = df_save[colunas_presentes]
+    if df is None or df.empty:
+        print("[AVISO] DataFrame vazio, nada para salvar.")
+        return
     
     conn = get_connection()
     try:
-        # Limpar tabela e inserir novos dados
-        conn.execute("DELETE FROM produtos")
-        df_save.to_sql("produtos", conn, if_exists="append", index=False)
+        resumo = _salvar_produtos(conn, df)
         conn.commit()
-        print(f"[OK] Produtos salvos ({len(df_save)} linhas)")
+        print(f"[OK] Produtos salvos ({resumo})")
     except Exception as e:
+        conn.rollback()
         print(f"[SQLITE] Erro ao salvar produtos: {e}")
     finally:
         conn.close()
@@ -274,22 +1054,100 @@ def ler_aba(aba: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def ler_historico() -> pd.DataFrame:
-    """Lê a tabela histórico e retorna como DataFrame"""
+# Renomear colunas do histórico para compatibilidade
+COL_MAP_HISTORICO = esquema.mapa_exibicao("historico")
+
+
+def ler_historico(limit: int = 0, *, data_inicio: Optional[datetime] = None,
+                  data_fim: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Lê o histórico e retorna como DataFrame (mesma assinatura do mysql_client).
+    limit=0 retorna todos os dados; limit>0 apenas os N mais recentes.
+    Com data_inicio/data_fim (só por nome; data_inicio <= coletado_em < data_fim)
+    lê apenas as partições mensais do período.
+    """
+    return consultar_historico(data_inicio=data_inicio, data_fim=data_fim, limite=limit)
+
+
+def _montar_consulta_historico(conn, colunas, data_inicio, data_fim, skus, vendedores, limite, antes_id=None):
+    """Monta (sql, params) da consulta ao histórico; sql é None se o período não tem dados"""
+    permitidas = ["id"] + COLUNAS_HISTORICO
+    if colunas:
+        invalidas = [c for c in colunas if c not in permitidas]
+        if invalidas:
+            raise ValueError(f"Colunas inexistentes no histórico: {invalidas}")
+        projecao = ", ".join(colunas)
+    else:
+        projecao = ", ".join(permitidas)
+    
+    fonte, params = _fonte_historico(conn, data_inicio, data_fim)
+    if fonte is None:
+        return None, []
+    
+    filtros = []
+    if skus:
+        skus = list(skus)
+        filtros.append(f"codigo_produto IN ({', '.join('?' * len(skus))})")
+        params += skus
+    if vendedores:
+        vendedores = list(vendedores)
+        marcadores = ", ".join("?" * len(vendedores))
+        filtros.append("(" + " OR ".join(f"vendedor_{i} IN ({marcadores})" for i in (1, 2, 3)) + ")")
+        params += vendedores * 3
+    if antes_id is not None:
+        filtros.append("id < ?")
+        params.append(int(antes_id))
+    
+    sql = f"SELECT {projecao} FROM {fonte}"
+    if filtros:
+        sql += " WHERE " + " AND ".join(filtros)
+    if limite > 0:
+        sql += f" ORDER BY id DESC LIMIT {int(limite)}"
+    return sql, params
+
+
+def consultar_historico(colunas: Optional[list] = None,
+                        data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                        skus: Optional[list] = None, vendedores: Optional[list] = None,
+                        chunksize: Optional[int] = None, limite: int = 0,
+                        precos_em_centavos: bool = False, antes_id: Optional[int] = None):
+    """
+    Consulta o histórico com projeção e filtros aplicados no banco.
+    
+    colunas: nomes das colunas no banco (ex: ["codigo_produto", "preco_1", "coletado_em"]);
+             None traz todas.
+    data_inicio/data_fim: data_inicio <= coletado_em < data_fim (lê só as partições do período).
+    skus: valores de codigo_produto. vendedores: vendedor em qualquer das 3 posições.
+    limite: > 0 retorna apenas os N registros mais recentes.
+    antes_id: só registros com id < antes_id; com limite, pagina do mais
+              recente para o mais antigo (usado pelo modo serviço).
+    chunksize: se informado, retorna um iterador de DataFrames com até chunksize
+               linhas cada (consumir na mesma thread); senão, um único DataFrame.
+    precos_em_centavos: True devolve preco_N/frete_N como gravados (centavos
+                        inteiros, com frete_tipo_N); False converte para reais/"-".
+    
+    As colunas retornadas recebem os mesmos nomes de ler_historico().
+    """
+    if colunas and not precos_em_centavos:
+        # O texto do frete ("Gratis"/"Pago") depende do tipo
+        colunas = list(colunas) + [f"frete_tipo_{c[-1]}" for c in colunas
+                                   if c in ("frete_1", "frete_2", "frete_3") and f"frete_tipo_{c[-1]}" not in colunas]
+    
+    if chunksize:
+        return _consultar_historico_em_blocos(colunas, data_inicio, data_fim, skus, vendedores, chunksize, limite,
+                                              precos_em_centavos, antes_id)
+    
     conn = get_connection()
     
     try:
-        df = pd.read_sql_query("SELECT * FROM historico", conn)
-        # Renomear para compatibilidade
-        col_map = {
-            "codigo_produto": "SKU Color",
-            "vendedor": "Vendedor",
-            "preco": "Preço",
-            "data_verificacao": "Data Verificação",
-            "data_coleta": "Data Coleta"
-        }
-        df = df.rename(columns=col_map)
-        return df
+        sql, params = _montar_consulta_historico(conn, colunas, data_inicio, data_fim, skus, vendedores, limite,
+                                                 antes_id)
+        if sql is None:
+            return pd.DataFrame()
+        df = esquema.ler_cursor(conn.execute(sql, params), "historico")
+        return esquema.exibir(df if precos_em_centavos else _precos_para_exibicao(df), "historico")
+    except ValueError:
+        raise
     except Exception as e:
         print(f"[SQLITE] Erro ao ler histórico: {e}")
         return pd.DataFrame()
@@ -297,10 +1155,102 @@ def ler_historico() -> pd.DataFrame:
         conn.close()
 
 
-def atualizar_historico(df_atual: pd.DataFrame, dias_limite: int = 180):
+def consultar_historico_com_arquivo(colunas: Optional[list] = None,
+                                    data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                                    skus: Optional[list] = None, vendedores: Optional[list] = None,
+                                    precos_em_centavos: bool = False) -> pd.DataFrame:
+    """
+    Como consultar_historico, mas junta o arquivo Parquet (meses que já saíram
+    pela retenção) ao histórico vivo, para relatórios de períodos longos.
+    Do arquivo só são lidos os meses do período e as colunas pedidas.
+    """
+    if colunas and not precos_em_centavos:
+        colunas = list(colunas) + [f"frete_tipo_{c[-1]}" for c in colunas
+                                   if c in ("frete_1", "frete_2", "frete_3") and f"frete_tipo_{c[-1]}" not in colunas]
+    
+    df_vivo = consultar_historico(colunas, data_inicio, data_fim, skus, vendedores, precos_em_centavos=True)
+    df_arquivo = arquivo_historico.ler(_pasta_arquivo(), colunas, data_inicio, data_fim, skus, vendedores)
+    if df_arquivo.empty:
+        df = df_vivo
+    else:
+        if "coletado_em" in df_arquivo.columns:
+            df_arquivo["coletado_em"] = df_arquivo["coletado_em"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        df = pd.concat([esquema.exibir(df_arquivo, "historico"), df_vivo], ignore_index=True)
+    return df if precos_em_centavos else _precos_para_exibicao(df)
+
+
+def _consultar_historico_em_blocos(colunas, data_inicio, data_fim, skus, vendedores, chunksize, limite,
+                                   precos_em_centavos, antes_id):
+    """Gerador de consultar_historico(chunksize=...): lê com fetchmany, bloco a bloco"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        sql, params = _montar_consulta_historico(conn, colunas, data_inicio, data_fim, skus, vendedores, limite,
+                                                 antes_id)
+        if sql is None:
+            return
+        cursor.execute(sql, params)
+        
+        while True:
+            linhas = cursor.fetchmany(chunksize)
+            if not linhas:
+                break
+            bloco = esquema.ler_cursor(cursor, "historico", linhas)
+            yield esquema.exibir(bloco if precos_em_centavos else _precos_para_exibicao(bloco), "historico")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _criar_tabela_backup(cursor):
+    """Cria a tabela de backup do histórico se não existir (convertida para centavos pela migração v6)"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS historico_backup (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            {esquema.ddl("historico", "sqlite", legado=True, sem=("coletado_em",))},
+            data_backup TEXT,
+            coletado_em TEXT
+        )
+    """)
+
+
+def _gravar_historico(conn, df_atual: pd.DataFrame, data_coleta: Optional[datetime] = None,
+                      ofertas: Optional[pd.DataFrame] = None) -> int:
+    """
+    Insere a coleta no histórico com rollup diário, último registro por SKU e
+    ofertas, tudo na transação corrente (sem commit). Retorna as linhas inseridas.
+    """
+    # Só as colunas do histórico, já com os nomes do banco
+    df_envio = esquema.para_banco(df_atual, "historico", extras=())
+    momento = data_coleta or datetime.now()
+    df_envio["data_coleta"] = momento.strftime("%d/%m/%Y %H:%M:%S")
+    df_envio["coletado_em"] = momento.strftime("%Y-%m-%d %H:%M:%S")
+    df_envio = _precos_para_centavos(df_envio)
+    
+    # Inserir na partição do mês da coleta
+    _inserir_na_particao(conn, df_envio, momento)
+    # Rollup diário e último registro por SKU na mesma transação
+    _atualizar_historico_diario(conn, df_envio)
+    _atualizar_historico_latest(conn, df_envio)
+    if ofertas is not None:
+        _inserir_ofertas(conn, ofertas, momento)
+    return len(df_envio)
+
+
+def atualizar_historico(df_atual: pd.DataFrame, dias_limite: int = 180,
+                        retencao: bool = True, data_coleta: Optional[datetime] = None,
+                        ofertas: Optional[pd.DataFrame] = None):
     """
     Adiciona registros ao histórico.
     Registros com mais de 6 meses (180 dias) são movidos para backup.
+    
+    retencao=False apenas insere (usado pela coleta em streaming, que aplica
+    a retenção uma única vez no final via aplicar_retencao_historico).
+    data_coleta permite que todas as páginas de uma mesma execução
+    compartilhem o mesmo carimbo de coleta.
+    ofertas: todas as ofertas coletadas (uma linha por vendedor, ver
+    COLUNAS_OFERTAS), gravadas em ofertas na mesma transação.
     """
     criar_tabelas()
     
@@ -311,108 +1261,602 @@ def atualizar_historico(df_atual: pd.DataFrame, dias_limite: int = 180):
     conn = get_connection()
     
     try:
-        # Criar tabela de backup se não existir
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS historico_backup (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                codigo_produto TEXT,
-                nome_esperado TEXT,
-                link TEXT,
-                site_disponivel TEXT,
-                vendedor_1 TEXT,
-                preco_1 TEXT,
-                frete_1 TEXT,
-                vendedor_2 TEXT,
-                preco_2 TEXT,
-                frete_2 TEXT,
-                vendedor_3 TEXT,
-                preco_3 TEXT,
-                frete_3 TEXT,
-                status_final TEXT,
-                data_verificacao TEXT,
-                data_coleta TEXT,
-                data_backup TEXT
-            )
-        """)
+        linhas = _gravar_historico(conn, df_atual, data_coleta, ofertas)
         conn.commit()
+        print(f"[OK] Historico atualizado com {linhas} linhas")
         
-        # Preparar dados para insercao
-        df_envio = df_atual.copy()
-        df_envio["Data Coleta"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        
-        # Mapear colunas
-        col_map = {
-            "codigo_produto": "codigo_produto",
-            "nome_esperado": "nome_esperado",
-            "link": "link",
-            "Site Disponivel": "site_disponivel",
-            "Vendedor 1": "vendedor_1",
-            "Preco 1": "preco_1",
-            "Frete 1": "frete_1",
-            "Vendedor 2": "vendedor_2",
-            "Preco 2": "preco_2",
-            "Frete 2": "frete_2",
-            "Vendedor 3": "vendedor_3",
-            "Preco 3": "preco_3",
-            "Frete 3": "frete_3",
-            "Status Final": "status_final",
-            "Data Verificacao": "data_verificacao",
-            "Data Coleta": "data_coleta"
-        }
-        df_envio = df_envio.rename(columns=col_map)
+        if retencao:
+            _mover_historico_para_backup(conn, dias_limite)
+            _aplicar_retencao_ofertas(conn, dias_limite)
         
-        # Manter apenas colunas validas
-        colunas_validas = ["codigo_produto", "nome_esperado", "link", "site_disponivel", 
-                          "vendedor_1", "preco_1", "frete_1",
-                          "vendedor_2", "preco_2", "frete_2",
-                          "vendedor_3", "preco_3", "frete_3",
-                          "status_final", "data_verificacao", "data_coleta"]
-        colunas_presentes = [c for c in colunas_validas if c in df_envio.columns]
-        df_envio = df_envio[colunas_presentes]
-        
-        # Inserir no histórico
-        df_envio.to_sql("historico", conn, if_exists="append", index=False)
-        print(f"[OK] Historico atualizado com {len(df_envio)} linhas")
-        
-        # BACKUP E LIMPEZA de registros com mais de 6 meses
-        limite = datetime.now() - timedelta(days=dias_limite)
-        
-        cursor.execute("SELECT * FROM historico")
-        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"[SQLITE] Erro ao atualizar histórico: {e}")
+    finally:
+        conn.close()
+
+
+# ============================================================
+# SESSÃO DE GRAVAÇÃO EM MASSA (uma conexão, uma transação)
+# ============================================================
+
+def _conferir_gravacao(tabela: str, nomes) -> None:
+    """Tabela e colunas de uma gravação genérica da sessão (ver SessaoEmMassa)"""
+    if tabela == "historico":
+        # historico é a view das partições mensais (e os rollups dependem de cada gravação)
+        raise ValueError("historico é uma view das partições mensais: grave com atualizar_historico da sessão")
+    esquema.conferir_colunas(tabela, nomes)
+
+
+class SessaoEmMassa:
+    """
+    Gravações de várias etapas na mesma transação (ver sessao_em_massa):
+    nada é confirmado até o fim do bloco with, e uma falha desfaz todas.
+    inserir/upsert/excluir só aceitam tabelas e colunas de esquema (os nomes
+    vão no SQL e, pelo serviço de dados, chegam da rede), exceto historico:
+    o histórico se grava com atualizar_historico.
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def inserir(self, tabela: str, df: pd.DataFrame) -> int:
+        """INSERT das linhas (colunas do DataFrame = colunas da tabela)"""
+        _conferir_gravacao(tabela, df.columns)
+        return inserir_em_massa(self.conn, tabela, df)
+    
+    def upsert(self, tabela: str, df: pd.DataFrame, chave: str = "id", ao_inserir: Optional[dict] = None) -> tuple:
+        """
+        Atualiza pela coluna chave as linhas que já existem na tabela e insere
+        as demais (com os valores extras de ao_inserir). A chave não precisa ser
+        única: todas as linhas com o mesmo valor são atualizadas.
+        Retorna (atualizadas, inseridas).
+        """
+        _conferir_gravacao(tabela, [chave, *df.columns, *(ao_inserir or {})])
+        if df.empty:
+            return 0, 0
+        valores = list(dict.fromkeys(df[chave].to_numpy(dtype=object, na_value=None)))
+        existentes = set()
+        for i in range(0, len(valores), 500):
+            lote = valores[i:i + 500]
+            existentes.update(row[0] for row in self.conn.execute(
+                f"SELECT {chave} FROM {tabela} WHERE {chave} IN ({', '.join('?' * len(lote))})", lote))
         
-        ids_para_backup = []
-        registros_backup = []
-        data_backup = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        existe = df[chave].isin(existentes)
+        colunas = [c for c in df.columns if c != chave]
+        if existe.any() and colunas:
+            self.conn.executemany(
+                f"UPDATE {tabela} SET {', '.join(f'{c} = ?' for c in colunas)} WHERE {chave} = ?",
+                _linhas_para_insert(df.loc[existe, colunas + [chave]])
+            )
+        novas = df.loc[~existe].assign(**(ao_inserir or {}))
+        return int(existe.sum()), inserir_em_massa(self.conn, tabela, novas)
+    
+    def excluir(self, tabela: str, coluna: str, valores: list) -> int:
+        """DELETE das linhas com coluna IN valores (em lotes de 500)"""
+        _conferir_gravacao(tabela, [coluna])
+        valores = list(valores)
+        removidas = 0
+        for i in range(0, len(valores), 500):
+            lote = valores[i:i + 500]
+            removidas += self.conn.execute(
+                f"DELETE FROM {tabela} WHERE {coluna} IN ({', '.join('?' * len(lote))})", lote).rowcount
+        return removidas
+    
+    def atualizar_produtos_lote(self, df: pd.DataFrame) -> int:
+        return _atualizar_produtos(self.conn, df)
+    
+    def salvar_planilha(self, df: pd.DataFrame) -> str:
+        return _salvar_produtos(self.conn, df) if df is not None and not df.empty else ""
+    
+    def atualizar_historico(self, df_atual: pd.DataFrame, data_coleta: Optional[datetime] = None,
+                            ofertas: Optional[pd.DataFrame] = None) -> int:
+        """Como atualizar_historico(retencao=False): a retenção não entra na transação"""
+        if df_atual is None or df_atual.empty:
+            return 0
+        return _gravar_historico(self.conn, df_atual, data_coleta, ofertas)
+
+
+@contextmanager
+def sessao_em_massa():
+    """
+    Abre uma transação na conexão da thread e entrega uma SessaoEmMassa;
+    confirma uma única vez ao sair do bloco, ou desfaz tudo se houver exceção.
+    Dentro do bloco, grave só pelos métodos da sessão (as funções do módulo
+    fazem commit na mesma conexão).
+    
+        with sessao_em_massa() as sessao:
+            sessao.atualizar_produtos_lote(df)
+            sessao.atualizar_historico(df, data_coleta=agora, ofertas=df_ofertas)
+    """
+    criar_tabelas()
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.rollback()
+    # IMMEDIATE: reserva a escrita já no início, em vez de falhar no meio da sessão
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield SessaoEmMassa(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def aplicar_sessao(operacoes: list) -> list:
+    """
+    Executa [(método, args, kwargs), ...] da SessaoEmMassa em uma única
+    sessao_em_massa (usado pelo serviço de dados). Retorna os resultados.
+    """
+    with sessao_em_massa() as sessao:
+        resultados = []
+        for nome, args, kwargs in operacoes:
+            if nome.startswith("_") or not callable(getattr(SessaoEmMassa, nome, None)):
+                raise ValueError(f"Operação de sessão desconhecida: {nome}")
+            resultados.append(getattr(sessao, nome)(*args, **kwargs))
+        return resultados
+
+
+def _pasta_arquivo() -> Path:
+    """Pasta do histórico arquivado em Parquet (ao lado do banco)"""
+    return Path(_get_db_path()).parent / "arquivo_historico"
+
+
+def _mover_historico_para_backup(conn, dias_limite: int):
+    """
+    Move para o arquivo Parquet (ou, sem pyarrow, para historico_backup) as
+    partições mensais inteiramente mais antigas que dias_limite: cada partição
+    é copiada inteira e depois removida com DROP TABLE (sem DELETE linha a linha).
+    A granularidade é o mês: o mês que contém a data limite é mantido inteiro.
+    Registros sem data (historico_000000) não entram na retenção.
+    """
+    cursor = conn.cursor()
+    if arquivo_historico.PARQUET_DISPONIVEL:
+        _arquivar_backup_existente(conn)
+    else:
+        _criar_tabela_backup(cursor)
+    
+    chave_limite = _chave_particao(datetime.now() - timedelta(days=dias_limite))
+    data_backup = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    colunas = ", ".join(COLUNAS_HISTORICO)
+    total_movidos = 0
+    particoes_removidas = 0
+    
+    # DROP TABLE e a view recriada na mesma transação (sem DML antes, o DROP seria confirmado sozinho)
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    for chave in _listar_particoes(conn):
+        if chave == PARTICAO_SEM_DATA or chave >= chave_limite:
+            continue
         
-        for row in rows:
-            try:
-                data_coleta = row["data_coleta"] if "data_coleta" in row.keys() else None
-                if data_coleta:
-                    data = datetime.strptime(data_coleta, "%d/%m/%Y %H:%M:%S")
-                    if data < limite:
-                        ids_para_backup.append(row["id"])
-                        registros_backup.append(dict(row))
-            except:
-                pass
+        if arquivo_historico.PARQUET_DISPONIVEL:
+            # Arquivo gravado (e renomeado) antes do DROP: repetir após uma falha só regrava o mês
+            blocos = pd.read_sql_query(f"SELECT id, {colunas} FROM {_nome_particao(chave)}", conn,
+                                       chunksize=50000)
+            total_movidos += arquivo_historico.arquivar_mes(_pasta_arquivo(), chave, blocos)
+        else:
+            cursor.execute(f"""
+                INSERT INTO historico_backup ({colunas}, data_backup)
+                SELECT {colunas}, ? FROM {_nome_particao(chave)}
+            """, (data_backup,))
+            total_movidos += cursor.rowcount
+        cursor.execute(f"DROP TABLE {_nome_particao(chave)}")
+        particoes_removidas += 1
+    
+    if particoes_removidas:
+        _recriar_view_historico(conn)
+    conn.commit()
+    if particoes_removidas:
+        destino = "o arquivo Parquet" if arquivo_historico.PARQUET_DISPONIVEL else "backup"
+        print(f"[BACKUP] {total_movidos} registros movidos para {destino} "
+              f"({particoes_removidas} partições mensais > {dias_limite} dias)")
+
+
+_SQL_MES_BACKUP = "COALESCE(substr(coletado_em, 1, 4) || substr(coletado_em, 6, 2), '000000')"
+
+
+def _arquivar_backup_existente(conn):
+    """Esvazia historico_backup (retenções anteriores) para o arquivo Parquet, mês a mês"""
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'historico_backup'").fetchone()
+    if not existe or not conn.execute("SELECT 1 FROM historico_backup LIMIT 1").fetchone():
+        return
+    
+    colunas = ", ".join(COLUNAS_HISTORICO)
+    total = 0
+    for (chave,) in conn.execute(f"SELECT DISTINCT {_SQL_MES_BACKUP} FROM historico_backup").fetchall():
+        blocos = pd.read_sql_query(f"SELECT id, {colunas} FROM historico_backup WHERE {_SQL_MES_BACKUP} = ?",
+                                   conn, params=(chave,), chunksize=50000)
+        total += arquivo_historico.arquivar_mes(_pasta_arquivo(), chave, blocos, parte="backup")
+        conn.execute(f"DELETE FROM historico_backup WHERE {_SQL_MES_BACKUP} = ?", (chave,))
+        conn.commit()
+    print(f"[BACKUP] {total} registros de historico_backup movidos para o arquivo Parquet")
+
+
+def aplicar_retencao_historico(dias_limite: int = 180) -> None:
+    """Aplica apenas a retenção do histórico (backup + limpeza), sem inserir dados"""
+    criar_tabelas()
+    conn = get_connection()
+    try:
+        _mover_historico_para_backup(conn, dias_limite)
+        _aplicar_retencao_ofertas(conn, dias_limite)
+    except Exception as e:
+        print(f"[SQLITE] Erro ao aplicar retenção do histórico: {e}")
+    finally:
+        conn.close()
+
+
+# ============================================================
+# ROLLUP DIÁRIO DO HISTÓRICO
+# ============================================================
+# historico_diario: min/max/soma/quantidade/último preço por (sku, vendedor, dia)
+# historico_diario_buybox: vencedor do buybox (vendedor_1 da última coleta) por (sku, dia)
+# Atualizado a cada atualizar_historico com os agregados do lote (upsert),
+# então relatórios de períodos longos leem o rollup em vez do histórico bruto.
+
+COLUNAS_ROLLUP = ["codigo_produto", "coletado_em",
+                  "vendedor_1", "preco_1", "vendedor_2", "preco_2", "vendedor_3", "preco_3"]
+
+
+def _agregar_diario(df: pd.DataFrame, em_centavos: bool = True):
+    """
+    Reduz linhas do histórico (colunas do banco) aos agregados diários.
+    Retorna (ofertas, buybox) prontos para o upsert; o rollup fica em reais.
+    em_centavos=False lê preços em texto (histórico anterior à migração v6).
+    """
+    df = df[df["coletado_em"].notna() & df["codigo_produto"].notna()]
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    
+    # Uma linha por oferta: (sku, vendedor, preço, posição)
+    partes = []
+    for pos in (1, 2, 3):
+        v_col, p_col = f"vendedor_{pos}", f"preco_{pos}"
+        if v_col not in df.columns or p_col not in df.columns:
+            continue
+        parte = pd.DataFrame({
+            "codigo_produto": df["codigo_produto"].astype(str),
+            "vendedor": df[v_col],
+            "preco": pd.to_numeric(df[p_col], errors="coerce") / 100 if em_centavos else _para_preco(df[p_col]),
+            "coletado_em": df["coletado_em"],
+            "buybox": int(pos == 1),
+        })
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame(), pd.DataFrame()
+    
+    ofertas = pd.concat(partes, ignore_index=True)
+    ofertas = ofertas[ofertas["vendedor"].notna() & ~ofertas["vendedor"].isin(["-", ""]) & ofertas["preco"].notna()]
+    if ofertas.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    ofertas["dia"] = ofertas["coletado_em"].str[:10]
+    ofertas = ofertas.sort_values("coletado_em", kind="stable")
+    
+    grupos = ofertas.groupby(["codigo_produto", "vendedor", "dia"], sort=False)
+    agregado = grupos.agg(
+        preco_min=("preco", "min"),
+        preco_max=("preco", "max"),
+        preco_soma=("preco", "sum"),
+        ofertas=("preco", "size"),
+        vezes_buybox=("buybox", "sum"),
+        preco_ultimo=("preco", "last"),
+        coletado_em=("coletado_em", "last"),
+    ).reset_index()
+    
+    buybox = (ofertas[ofertas["buybox"] == 1]
+              .groupby(["codigo_produto", "dia"], sort=False)
+              .agg(vendedor=("vendedor", "last"), preco=("preco", "last"), coletado_em=("coletado_em", "last"))
+              .reset_index())
+    
+    return agregado, buybox
+
+
+def _atualizar_historico_diario(conn, df_envio: pd.DataFrame, em_centavos: bool = True):
+    """Soma os agregados do lote ao rollup (upsert por chave)"""
+    if not all(c in df_envio.columns for c in ("codigo_produto", "coletado_em")):
+        return
+    agregado, buybox = _agregar_diario(df_envio, em_centavos)
+    
+    if not agregado.empty:
+        conn.executemany("""
+            INSERT INTO historico_diario (codigo_produto, vendedor, dia, preco_min, preco_max,
+                                          preco_soma, ofertas, vezes_buybox, preco_ultimo, coletado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(codigo_produto, vendedor, dia) DO UPDATE SET
+                preco_min = MIN(preco_min, excluded.preco_min),
+                preco_max = MAX(preco_max, excluded.preco_max),
+                preco_soma = preco_soma + excluded.preco_soma,
+                ofertas = ofertas + excluded.ofertas,
+                vezes_buybox = vezes_buybox + excluded.vezes_buybox,
+                preco_ultimo = CASE WHEN excluded.coletado_em >= coletado_em
+                                    THEN excluded.preco_ultimo ELSE preco_ultimo END,
+                coletado_em = MAX(coletado_em, excluded.coletado_em)
+        """, _linhas_para_insert(agregado[["codigo_produto", "vendedor", "dia", "preco_min", "preco_max",
+                                           "preco_soma", "ofertas", "vezes_buybox", "preco_ultimo", "coletado_em"]]))
+    
+    if not buybox.empty:
+        conn.executemany("""
+            INSERT INTO historico_diario_buybox (codigo_produto, dia, vendedor, preco, coletado_em)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(codigo_produto, dia) DO UPDATE SET
+                vendedor = excluded.vendedor,
+                preco = excluded.preco,
+                coletado_em = excluded.coletado_em
+            WHERE excluded.coletado_em >= historico_diario_buybox.coletado_em
+        """, _linhas_para_insert(buybox[["codigo_produto", "dia", "vendedor", "preco", "coletado_em"]]))
+
+
+def _preencher_historico_diario(conn, tamanho_bloco: int = 50000):
+    """Migração: monta o rollup a partir do histórico já existente"""
+    cursor = conn.execute(f"SELECT {', '.join(COLUNAS_ROLLUP)} FROM historico")
+    total = 0
+    while True:
+        linhas = cursor.fetchmany(tamanho_bloco)
+        if not linhas:
+            break
+        _atualizar_historico_diario(conn, pd.DataFrame.from_records([tuple(l) for l in linhas], columns=COLUNAS_ROLLUP),
+                                    em_centavos=False)
+        total += len(linhas)
+    if total:
+        print(f"[MIGRACAO] Rollup diário montado a partir de {total} registros")
+
+
+def _filtro_dias(data_inicio: Optional[datetime], data_fim: Optional[datetime], skus: Optional[list]):
+    """WHERE (dia e sku) comum às leituras do rollup"""
+    filtros = []
+    params = []
+    if data_inicio is not None:
+        filtros.append("dia >= ?")
+        params.append(data_inicio.strftime("%Y-%m-%d"))
+    if data_fim is not None:
+        filtros.append("dia < ?")
+        params.append(data_fim.strftime("%Y-%m-%d"))
+    if skus:
+        skus = list(skus)
+        filtros.append(f"codigo_produto IN ({', '.join('?' * len(skus))})")
+        params += skus
+    where = f" WHERE {' AND '.join(filtros)}" if filtros else ""
+    return where, params
+
+
+def ler_historico_diario(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                         skus: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lê o rollup por (sku, vendedor, dia), com preco_medio calculado.
+    Período por dia: data_inicio <= dia < data_fim.
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        where, params = _filtro_dias(data_inicio, data_fim, skus)
+        return pd.read_sql_query(f"""
+            SELECT codigo_produto, vendedor, dia, preco_min, preco_max,
+                   preco_soma / ofertas AS preco_medio, preco_ultimo, ofertas, vezes_buybox
+            FROM historico_diario{where}
+            ORDER BY dia, codigo_produto, vendedor
+        """, conn, params=params)
+    except Exception as e:
+        print(f"[SQLITE] Erro ao ler rollup diário: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+def ler_buybox_diario(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                      skus: Optional[list] = None) -> pd.DataFrame:
+    """Lê o vencedor do buybox por (sku, dia)"""
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        where, params = _filtro_dias(data_inicio, data_fim, skus)
+        return pd.read_sql_query(f"""
+            SELECT codigo_produto, dia, vendedor, preco
+            FROM historico_diario_buybox{where}
+            ORDER BY dia, codigo_produto
+        """, conn, params=params)
+    except Exception as e:
+        print(f"[SQLITE] Erro ao ler buybox diário: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# ÚLTIMO REGISTRO POR SKU
+# ============================================================
+# historico_latest guarda a coleta mais recente de cada SKU e é atualizada
+# junto com cada escrita no histórico: consultas de "estado atual" custam
+# O(catálogo) em vez de MAX(id) ... GROUP BY sobre todo o histórico.
+
+def _criar_historico_latest(conn):
+    """Migração: cria historico_latest e preenche com o último registro de cada SKU"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS historico_latest (
+            codigo_produto TEXT PRIMARY KEY,
+            {esquema.ddl("historico", "sqlite", legado=True, sem=("codigo_produto",))}
+        )
+    """)
+    lista = ", ".join(COLUNAS_HISTORICO_TEXTO)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO historico_latest ({lista})
+        SELECT {lista} FROM historico
+        WHERE id IN (SELECT MAX(id) FROM historico WHERE codigo_produto IS NOT NULL GROUP BY codigo_produto)
+    """)
+
+
+def _atualizar_historico_latest(conn, df_envio: pd.DataFrame):
+    """Upsert do último registro de cada SKU do lote (só substitui coletas mais antigas)"""
+    if "codigo_produto" not in df_envio.columns:
+        return
+    df = df_envio[df_envio["codigo_produto"].notna()].drop_duplicates("codigo_produto", keep="last")
+    if df.empty:
+        return
+    
+    colunas = [c for c in COLUNAS_HISTORICO if c in df.columns]
+    atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in colunas if c != "codigo_produto")
+    conn.executemany(f"""
+        INSERT INTO historico_latest ({', '.join(colunas)})
+        VALUES ({', '.join('?' * len(colunas))})
+        ON CONFLICT(codigo_produto) DO UPDATE SET {atualizacoes}
+        WHERE historico_latest.coletado_em IS NULL OR excluded.coletado_em >= historico_latest.coletado_em
+    """, _linhas_para_insert(df[colunas]))
+
+
+def ler_historico_latest(limite: int = 0, precos_em_centavos: bool = False) -> pd.DataFrame:
+    """
+    Retorna o último registro de cada SKU (colunas do banco) com o
+    sku_seller do cadastro de produtos.
+    precos_em_centavos=True mantém preco_N/frete_N em centavos inteiros (e frete_tipo_N).
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        sql = """
+            SELECT l.*, p.sku_seller
+            FROM historico_latest l
+            LEFT JOIN produtos p ON l.codigo_produto = p.codigo_produto
+        """
+        if limite > 0:
+            sql += f" LIMIT {int(limite)}"
+        df = esquema.ler_cursor(conn.execute(sql), "historico")
+        return df if precos_em_centavos else _precos_para_exibicao(df)
+    except Exception as e:
+        print(f"[SQLITE] Erro ao ler último registro por SKU: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# OFERTAS NORMALIZADAS
+# ============================================================
+# Uma linha por (coleta, SKU, posição do vendedor), sem limite de vendedores.
+# O histórico continua guardando os 3 primeiros no formato largo; a view
+# ofertas_top3 monta esse mesmo formato a partir de ofertas.
+
+COLUNAS_OFERTAS = ["codigo_produto", "posicao", "vendedor_id", "vendedor",
+                   "preco_centavos", "frete_centavos", "frete_tipo"]
+
+
+def _id_coleta(momento: datetime) -> int:
+    """Identificador da execução da coleta (AAAAMMDDHHMMSS), comum a todas as páginas"""
+    return int(momento.strftime("%Y%m%d%H%M%S"))
+
+
+def _criar_tabela_ofertas(conn):
+    """Migração: tabela ofertas, índices e view de compatibilidade ofertas_top3"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS ofertas (
+            coleta_id INTEGER NOT NULL,
+            codigo_produto TEXT NOT NULL,
+            posicao INTEGER NOT NULL,
+            vendedor_id TEXT,
+            vendedor TEXT,
+            preco_centavos INTEGER,
+            frete_centavos INTEGER,
+            frete_tipo {TIPO_FRETE_SQL},
+            coletado_em TEXT NOT NULL,
+            PRIMARY KEY (coleta_id, codigo_produto, posicao)
+        )
+    """)
+    # Consultas por vendedor e por SKU em um período
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ofertas_vendedor_coletado_em ON ofertas(vendedor, coletado_em)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ofertas_codigo_coletado_em ON ofertas(codigo_produto, coletado_em)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ofertas_coletado_em ON ofertas(coletado_em)")
+    
+    colunas = ",\n               ".join(
+        f"MAX(CASE WHEN posicao = {pos} THEN {origem} END) AS {destino}_{pos}"
+        for pos in (1, 2, 3)
+        for origem, destino in (("vendedor", "vendedor"), ("preco_centavos", "preco"),
+                                ("frete_centavos", "frete"), ("frete_tipo", "frete_tipo"))
+    )
+    conn.execute("DROP VIEW IF EXISTS ofertas_top3")
+    conn.execute(f"""
+        CREATE VIEW ofertas_top3 AS
+        SELECT coleta_id, codigo_produto, MAX(coletado_em) AS coletado_em,
+               COUNT(*) AS total_ofertas,
+               {colunas}
+        FROM ofertas
+        GROUP BY coleta_id, codigo_produto
+    """)
+
+
+def _inserir_ofertas(conn, df_ofertas: pd.DataFrame, momento: datetime):
+    """Insere as ofertas da coleta (na transação corrente)"""
+    colunas = [c for c in COLUNAS_OFERTAS if c in df_ofertas.columns]
+    df = df_ofertas[df_ofertas["codigo_produto"].notna()][colunas]
+    # Um SKU repetido no cadastro é coletado duas vezes: fica a última
+    df = df.drop_duplicates(["codigo_produto", "posicao"], keep="last")
+    if df.empty:
+        return
+    coleta_id = _id_coleta(momento)
+    # O mesmo SKU em outra página da mesma coleta (mesmo coleta_id): fica a última também
+    skus = df["codigo_produto"].unique().tolist()
+    for inicio in range(0, len(skus), 500):
+        lote = skus[inicio:inicio + 500]
+        marcadores = ", ".join(["?"] * len(lote))
+        conn.execute(f"DELETE FROM ofertas WHERE coleta_id = ? AND codigo_produto IN ({marcadores})",
+                     [coleta_id] + lote)
+    df.insert(0, "coleta_id", coleta_id)
+    df["coletado_em"] = momento.strftime("%Y-%m-%d %H:%M:%S")
+    inserir_em_massa(conn, "ofertas", df)
+
+
+def _aplicar_retencao_ofertas(conn, dias_limite: int):
+    """Remove ofertas mais antigas que dias_limite (o histórico guarda os 3 primeiros)"""
+    limite = (datetime.now() - timedelta(days=dias_limite)).strftime("%Y-%m-%d %H:%M:%S")
+    removidas = conn.execute("DELETE FROM ofertas WHERE coletado_em < ?", (limite,)).rowcount
+    conn.commit()
+    if removidas:
+        print(f"[BACKUP] {removidas} ofertas removidas (> {dias_limite} dias)")
+
+
+def ler_ofertas(data_inicio: Optional[datetime] = None, data_fim: Optional[datetime] = None,
+                skus: Optional[list] = None, vendedores: Optional[list] = None,
+                limite: int = 0) -> pd.DataFrame:
+    """
+    Lê as ofertas normalizadas (todos os vendedores, preços/fretes em centavos Int64).
+    Período: data_inicio <= coletado_em < data_fim. skus: codigo_produto.
+    vendedores: nome do vendedor (usa o índice vendedor + coletado_em).
+    """
+    criar_tabelas()
+    conn = get_connection()
+    
+    try:
+        filtros = []
+        params = []
+        if data_inicio is not None:
+            filtros.append("coletado_em >= ?")
+            params.append(data_inicio.strftime("%Y-%m-%d %H:%M:%S"))
+        if data_fim is not None:
+            filtros.append("coletado_em < ?")
+            params.append(data_fim.strftime("%Y-%m-%d %H:%M:%S"))
+        if skus:
+            skus = list(skus)
+            filtros.append(f"codigo_produto IN ({', '.join('?' * len(skus))})")
+            params += skus
+        if vendedores:
+            vendedores = list(vendedores)
+            filtros.append(f"vendedor IN ({', '.join('?' * len(vendedores))})")
+            params += vendedores
         
-        if registros_backup:
-            # Mover para tabela de backup
-            for reg in registros_backup:
-                reg["data_backup"] = data_backup
-                reg.pop("id", None)  # Remover ID para gerar novo
-            
-            df_backup = pd.DataFrame(registros_backup)
-            df_backup.to_sql("historico_backup", conn, if_exists="append", index=False)
-            
-            # Remover do histórico principal
-            placeholders = ",".join(["?" for _ in ids_para_backup])
-            cursor.execute(f"DELETE FROM historico WHERE id IN ({placeholders})", ids_para_backup)
-            conn.commit()
-            print(f"[BACKUP] {len(registros_backup)} registros movidos para backup (> 6 meses)")
+        sql = "SELECT coleta_id, coletado_em, " + ", ".join(COLUNAS_OFERTAS) + " FROM ofertas"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY coletado_em, codigo_produto, posicao"
+        if limite > 0:
+            sql += f" LIMIT {int(limite)}"
         
+        df = pd.read_sql_query(sql, conn, params=params)
+        for coluna in ("preco_centavos", "frete_centavos"):
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype("Int64")
+        return df
     except Exception as e:
-        print(f"[SQLITE] Erro ao atualizar histórico: {e}")
+        print(f"[SQLITE] Erro ao ler ofertas: {e}")
+        return pd.DataFrame()
     finally:
         conn.close()
 
@@ -434,17 +1878,30 @@ def ler_usuarios() -> pd.DataFrame:
         conn.close()
 
 
-def verificar_usuario(usuario: str, senha: str):
-    """Verifica credenciais do usuário"""
-    criar_tabelas()
-    criar_usuario_padrao()
-    
+def _buscar_usuario(usuario: str):
+    """senha, status e role do usuário (busca pelo índice único de usuario), ou None"""
     conn = get_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("SELECT * FROM usuarios WHERE usuario = ?", (usuario,))
-        row = cursor.fetchone()
+        return conn.execute("SELECT senha, status, role FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+    finally:
+        conn.close()
+
+
+def verificar_usuario(usuario: str, senha: str):
+    """
+    Verifica credenciais do usuário: uma consulta na conexão já aberta da thread.
+    Tabelas e admin padrão só são conferidos quando o usuário não é encontrado
+    (ex.: primeiro login em um banco novo).
+    """
+    try:
+        try:
+            row = _buscar_usuario(usuario)
+        except sqlite3.OperationalError:
+            row = None  # Banco novo: tabela usuarios ainda não existe
+        if row is None:
+            criar_tabelas()
+            criar_usuario_padrao()
+            row = _buscar_usuario(usuario)
         
         if not row:
             return False, "Usuário inexistente. Crie uma nova conta.", None
@@ -459,8 +1916,6 @@ def verificar_usuario(usuario: str, senha: str):
         
     except Exception as e:
         return False, f"Erro: {e}", None
-    finally:
-        conn.close()
 
 
 def adicionar_usuario(usuario: str, senha: str, email: str):
@@ -515,6 +1970,35 @@ def atualizar_usuario(user_id, status=None, role=None):
         conn.close()
 
 
+def atualizar_usuarios_lote(alteracoes: dict):
+    """
+    Atualiza status e/ou cargo de vários usuários em uma única transação.
+    alteracoes: {user_id: {"status": ..., "role": ...}} (chave ausente ou vazia não muda).
+    Retorna as linhas alteradas (colunas de listar_usuarios), para a tela
+    redesenhar só elas, ou None se a transação falhar (nada é gravado).
+    """
+    ids = [int(user_id) for user_id in alteracoes]
+    if not ids:
+        return pd.DataFrame(columns=["id", "usuario", "email", "status", "role"])
+    
+    conn = get_connection()
+    try:
+        conn.executemany(
+            "UPDATE usuarios SET status = COALESCE(?, status), role = COALESCE(?, role) WHERE id = ?",
+            [(a.get("status") or None, a.get("role") or None, user_id) for user_id, a in zip(ids, alteracoes.values())]
+        )
+        conn.commit()
+        return pd.read_sql_query(
+            f"SELECT id, usuario, email, status, role FROM usuarios WHERE id IN ({', '.join('?' * len(ids))})",
+            conn, params=ids
+        )
+    except Exception as e:
+        print(f"Erro atualizar usuarios: {e}")
+        return None
+    finally:
+        conn.close()
+
+
 def excluir_usuario(user_id):
     """Remove um usuário"""
     conn = get_connection()
@@ -0,0 +1,16 @@
+# test_import_budget.py — Importar db_client continua barato (ver db_client.verificar_orcamento_importacao)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db_client
+
+
+def test_importacao_dentro_do_orcamento():
+    assert db_client.verificar_orcamento_importacao()
+
+
+def test_funcoes_backend_declaradas():
+    # Cada nome de FUNCOES_BACKEND tem o seu repasse declarado em db_client
+    assert all(callable(getattr(db_client, nome, None)) for nome in db_client.FUNCOES_BACKEND)
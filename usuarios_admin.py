@@ -1,13 +1,14 @@
 # usuarios_admin.py - Painel de Gestao de Usuarios
 """
 Tela para Admin/Master gerenciar usuarios:
-- Aprovar/Bloquear
+- Aprovar/Bloquear (um ou vários selecionados, em uma transação)
 - Mudar Cargo (User/Admin/Master)
 - Excluir usuarios
+- Após cada alteração só as linhas afetadas são redesenhadas
 - Master: Acesso total, não pode ser modificado por admins
 """
 import flet as ft
-from db_client import listar_usuarios, atualizar_usuario, excluir_usuario
+from db_client import listar_usuarios, atualizar_usuarios_lote, excluir_usuario
 
 def criar_tela_usuarios(page: ft.Page, is_dark: list, is_master: bool = False):
     """Cria a tela de gestao de usuarios"""
@@ -36,109 +37,177 @@ def criar_tela_usuarios(page: ft.Page, is_dark: list, is_master: bool = False):
         heading_row_color="#3B82F6",
         heading_row_height=40,
         data_row_min_height=40,
+        show_checkbox_column=True,
     )
     
+    # Linha da tabela e cargo de cada usuário exibido; ids marcados na caixa de seleção
+    linhas = {}
+    cargos = {}
+    selecionados = set()
+    
+    def pode_modificar(user_id) -> bool:
+        # Admin não pode modificar master
+        return is_master or cargos.get(user_id) != "master"
+    
+    def criar_linha(row) -> ft.DataRow:
+        user_id = int(row['id'])
+        status = row['status']
+        role = row['role']
+        
+        # Verificar se é usuário master (protegido)
+        is_user_master = role == "master"
+        
+        # Admin não pode modificar master
+        can_modify = is_master or not is_user_master
+        
+        # Dropdown de Cargo - Master só aparece se o usuário logado é master
+        role_options = [
+            ft.dropdown.Option("user", "Usuario"),
+            ft.dropdown.Option("admin", "Admin"),
+        ]
+        if is_master:  # Apenas master pode ver/atribuir cargo master
+            role_options.append(ft.dropdown.Option("master", "Master"))
+        
+        dd_role = ft.Dropdown(
+            value=role,
+            options=role_options,
+            width=100,
+            text_size=12,
+            content_padding=5,
+            on_change=lambda e, uid=user_id: mudar_cargo(uid, e.control.value),
+            disabled=not can_modify,  # Desabilitar se não pode modificar
+        )
+        
+        # Botao Aprovar/Bloquear
+        btn_status = ft.IconButton(
+            icon=ft.Icons.CHECK_CIRCLE if status != "aprovado" else ft.Icons.BLOCK,
+            icon_color="green" if status != "aprovado" else "red",
+            tooltip="Aprovar" if status != "aprovado" else "Bloquear",
+            on_click=lambda e, uid=user_id, s=status: alternar_status(uid, s),
+            disabled=not can_modify,  # Desabilitar se não pode modificar
+        )
+        
+        # Botao Excluir
+        btn_excluir = ft.IconButton(
+            icon=ft.Icons.DELETE,
+            icon_color="red" if can_modify else "grey",
+            tooltip="Excluir" if can_modify else "Protegido",
+            on_click=lambda e, uid=user_id, r=role: deletar_usuario_confirm(uid, r),
+            disabled=not can_modify,  # Desabilitar se não pode modificar
+        )
+        
+        # Adicionar badge de proteção para masters
+        cargo_cell = ft.Row([
+            dd_role,
+            ft.Icon(ft.Icons.SHIELD, color="#FFD700", size=16, tooltip="Protegido") if is_user_master else ft.Container()
+        ], spacing=5)
+        
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(str(user_id))),
+                ft.DataCell(ft.Text(str(row['usuario']))),
+                ft.DataCell(ft.Text(str(row['email']))),
+                ft.DataCell(ft.Container(
+                    content=ft.Text(status.upper(), size=10, color="white"),
+                    bgcolor="green" if status == "aprovado" else "orange",
+                    padding=5, border_radius=5
+                )),
+                ft.DataCell(cargo_cell),
+                ft.DataCell(ft.Row([btn_status, btn_excluir], spacing=0)),
+            ],
+            selected=user_id in selecionados,
+            on_select_changed=lambda e, uid=user_id: marcar(uid, e.data == "true"),
+        )
+    
     def carregar_dados():
         df = listar_usuarios()
         
         tabela.rows.clear()
+        linhas.clear()
+        cargos.clear()
+        selecionados.clear()
+        atualizar_botoes_lote()
         
         if df.empty:
             status_text.value = "Nenhum usuario encontrado."
             page.update()
             return
-
-        for idx, row in df.iterrows():
-            user_id = row['id']
-            status = row['status']
-            role = row['role']
-            
-            # Verificar se é usuário master (protegido)
-            is_user_master = role == "master"
-            
-            # Admin não pode modificar master
-            can_modify = is_master or not is_user_master
-            
-            # Dropdown de Cargo - Master só aparece se o usuário logado é master
-            role_options = [
-                ft.dropdown.Option("user", "Usuario"),
-                ft.dropdown.Option("admin", "Admin"),
-            ]
-            if is_master:  # Apenas master pode ver/atribuir cargo master
-                role_options.append(ft.dropdown.Option("master", "Master"))
-            
-            dd_role = ft.Dropdown(
-                value=role,
-                options=role_options,
-                width=100,
-                text_size=12,
-                content_padding=5,
-                on_change=lambda e, uid=user_id: mudar_cargo(uid, e.control.value),
-                disabled=not can_modify,  # Desabilitar se não pode modificar
-            )
-            
-            # Botao Aprovar/Bloquear
-            btn_status = ft.IconButton(
-                icon=ft.Icons.CHECK_CIRCLE if status != "aprovado" else ft.Icons.BLOCK,
-                icon_color="green" if status != "aprovado" else "red",
-                tooltip="Aprovar" if status != "aprovado" else "Bloquear",
-                on_click=lambda e, uid=user_id, s=status: alternar_status(uid, s),
-                disabled=not can_modify,  # Desabilitar se não pode modificar
-            )
-            
-            # Botao Excluir
-            btn_excluir = ft.IconButton(
-                icon=ft.Icons.DELETE,
-                icon_color="red" if can_modify else "grey",
-                tooltip="Excluir" if can_modify else "Protegido",
-                on_click=lambda e, uid=user_id, r=role: deletar_usuario_confirm(uid, r),
-                disabled=not can_modify,  # Desabilitar se não pode modificar
-            )
-            
-            # Adicionar badge de proteção para masters
-            cargo_cell = ft.Row([
-                dd_role,
-                ft.Icon(ft.Icons.SHIELD, color="#FFD700", size=16, tooltip="Protegido") if is_user_master else ft.Container()
-            ], spacing=5)
-            
-            tabela.rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(str(user_id))),
-                        ft.DataCell(ft.Text(str(row['usuario']))),
-                        ft.DataCell(ft.Text(str(row['email']))),
-                        ft.DataCell(ft.Container(
-                            content=ft.Text(status.upper(), size=10, color="white"),
-                            bgcolor="green" if status == "aprovado" else "orange",
-                            padding=5, border_radius=5
-                        )),
-                        ft.DataCell(cargo_cell),
-                        ft.DataCell(ft.Row([btn_status, btn_excluir], spacing=0)),
-                    ]
-                )
-            )
+        
+        for row in df.to_dict("records"):
+            user_id = int(row['id'])
+            cargos[user_id] = row['role']
+            linhas[user_id] = criar_linha(row)
+            tabela.rows.append(linhas[user_id])
         page.update()
-
-    def mudar_cargo(user_id, novo_cargo):
-        if atualizar_usuario(user_id, role=novo_cargo):
-            status_text.value = f"Cargo atualizado para {novo_cargo}"
-            status_text.color = "green"
-        else:
-            status_text.value = "Erro ao atualizar cargo"
+    
+    def redesenhar(df):
+        """Troca só as linhas dos usuários alterados"""
+        for row in df.to_dict("records"):
+            user_id = int(row['id'])
+            if user_id not in linhas:
+                continue
+            cargos[user_id] = row['role']
+            nova = criar_linha(row)
+            tabela.rows[tabela.rows.index(linhas[user_id])] = nova
+            linhas[user_id] = nova
+    
+    def aplicar(alteracoes: dict, mensagem: str, mensagem_erro: str) -> bool:
+        """Grava as alterações em uma transação e redesenha as linhas afetadas"""
+        df = atualizar_usuarios_lote(alteracoes)
+        if df is None:
+            status_text.value = mensagem_erro
             status_text.color = "red"
+            page.update()
+            return False
+        redesenhar(df)
+        status_text.value = mensagem
+        status_text.color = "green"
         page.update()
-
+        return True
+    
+    def mudar_cargo(user_id, novo_cargo):
+        if not aplicar({user_id: {"role": novo_cargo}}, f"Cargo atualizado para {novo_cargo}",
+                       "Erro ao atualizar cargo"):
+            carregar_dados()  # Voltar o dropdown ao valor gravado
+    
     def alternar_status(user_id, status_atual):
         novo_status = "aprovado" if status_atual != "aprovado" else "bloqueado"
-        if atualizar_usuario(user_id, status=novo_status):
-            carregar_dados() # Recarregar para atualizar icone
-            status_text.value = f"Status alterado para {novo_status}"
-            status_text.color = "green"
+        aplicar({user_id: {"status": novo_status}}, f"Status alterado para {novo_status}",
+                "Erro ao atualizar status")
+    
+    def marcar(user_id, marcado: bool):
+        if marcado and pode_modificar(user_id):
+            selecionados.add(user_id)
         else:
-            status_text.value = "Erro ao atualizar status"
-            status_text.color = "red"
+            selecionados.discard(user_id)
+        linhas[user_id].selected = user_id in selecionados
+        atualizar_botoes_lote()
         page.update()
-
+    
+    def status_em_lote(novo_status: str):
+        ids = sorted(uid for uid in selecionados if pode_modificar(uid))
+        if not ids:
+            return
+        if aplicar({uid: {"status": novo_status} for uid in ids},
+                   f"Status alterado para {novo_status} em {len(ids)} usuario(s)", "Erro ao atualizar status"):
+            selecionados.clear()
+            for uid in ids:
+                linhas[uid].selected = False
+            atualizar_botoes_lote()
+            page.update()
+    
+    btn_aprovar_lote = ft.ElevatedButton(
+        "Aprovar selecionados", icon=ft.Icons.CHECK_CIRCLE,
+        on_click=lambda e: status_em_lote("aprovado"), disabled=True,
+    )
+    btn_bloquear_lote = ft.ElevatedButton(
+        "Bloquear selecionados", icon=ft.Icons.BLOCK,
+        on_click=lambda e: status_em_lote("bloqueado"), disabled=True,
+    )
+    
+    def atualizar_botoes_lote():
+        btn_aprovar_lote.disabled = btn_bloquear_lote.disabled = not selecionados
+    
     def deletar_usuario_confirm(user_id, user_role):
         # Verificar proteção de master
         if user_role == "master" and not is_master:
@@ -153,7 +222,12 @@ def criar_tela_usuarios(page: ft.Page, is_dark: list, is_master: bool = False):
         def confirmar(e):
             page.close(dlg)
             if excluir_usuario(user_id):
-                carregar_dados()
+                # Tirar só a linha do usuário excluído
+                if user_id in linhas:
+                    tabela.rows.remove(linhas.pop(user_id))
+                cargos.pop(user_id, None)
+                selecionados.discard(user_id)
+                atualizar_botoes_lote()
                 status_text.value = "Usuario excluido com sucesso"
                 status_text.color = "green"
             else:
@@ -172,13 +246,15 @@ def criar_tela_usuarios(page: ft.Page, is_dark: list, is_master: bool = False):
             actions_alignment=ft.MainAxisAlignment.END,
         )
         page.open(dlg)
-
+    
     # Inicializar dados
     carregar_dados()
     
     header = ft.Row([
         ft.Text("Gestao de Usuarios", size=24, weight=ft.FontWeight.BOLD, color=get_text_color()),
         ft.Container(expand=True),
+        btn_aprovar_lote,
+        btn_bloquear_lote,
         ft.ElevatedButton("Atualizar Lista", icon=ft.Icons.REFRESH, on_click=lambda e: carregar_dados()),
     ])
     